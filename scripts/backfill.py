@@ -0,0 +1,219 @@
+"""
+Non-interactive backfill of a range of months for one or more customers.
+
+Raw GPS data is queried on a thread pool (database I/O) and every month is processed on a
+process pool as soon as its raw data is available. Geofences, spatial indexes and land geometry
+are loaded once in the parent process and inherited by the workers.
+
+Months whose raw data already exists are not queried again, and months already processed are
+skipped, unless --refetch / --reprocess are given.
+
+TO RUN:
+    python ./scripts/backfill.py --start 2024-01 --end 2024-12
+    python ./scripts/backfill.py --start 2024-06 --end 2025-03 --customers Zim --skip-query --process-workers 4
+"""
+from config import BASE_DIR, RAW_DATA_DIR, PROCESSED_DATA_DIR, DEFAULT_CUSTOMER
+from data_processing import (
+    get_processed_gpsData_and_polygons,
+    load_land_geometry,
+    load_shared_resources,
+    save_processed_data
+)
+from catalog import build_catalog_entry, update_catalog
+
+import os
+import time
+import argparse
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+# Resources shared with worker processes, per customer (set once per worker by _init_worker)
+_shared = {}
+
+def month_range(start: str, end: str) -> list:
+    """All months from start to end inclusive, as 'YYYY-MM'."""
+    start_date, end_date = datetime.strptime(start, "%Y-%m"), datetime.strptime(end, "%Y-%m")
+    if start_date > end_date:
+        raise ValueError(f"Start month {start} is after end month {end}")
+    months = []
+    year, month = start_date.year, start_date.month
+    while (year, month) <= (end_date.year, end_date.month):
+        months.append(f"{year}-{month:02d}")
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return months
+
+def get_raw_path(customer_name: str, year_month: str):
+    year, month = year_month.split('-')
+    return RAW_DATA_DIR / f"gps_data_{customer_name}_{year}_{month}.csv"
+
+def is_processed(customer_name: str, year_month: str) -> bool:
+    year, month = year_month.split('-')
+    return all((PROCESSED_DATA_DIR / f"{prefix}_{customer_name}_{year}_{month}.csv").exists()
+               for prefix in ['processed_gps_data', 'geofence_stats'])
+
+def query_month(customer_name: str, year_month: str) -> int:
+    """Fetch and save one month of raw GPS data. Returns the number of rows."""
+    # Database dependencies are only needed when querying
+    from data_query import get_gps_data, save_gps_data
+    df = get_gps_data(year_month, customer_name=customer_name)
+    if not df.empty:
+        save_gps_data(df, customer_name, year_month)
+    return len(df)
+
+def _init_worker(shared, customers, land_path, low_memory):
+    if shared is None:
+        # Start methods other than fork: load once per worker instead of inheriting
+        land_geometry = load_land_geometry(land_path)
+        shared = {customer: load_shared_resources(customer, land_geometry=land_geometry) for customer in customers}
+    _shared.update(resources=shared, low_memory=low_memory)
+
+def _worker_ready(_):
+    return os.getpid()
+
+def process_month(customer_name: str, year_month: str) -> dict:
+    """Process and save one month in a worker process. Returns its catalog entry."""
+    start = time.perf_counter()
+    processed_gps, polygon_stats, polygon_dict, device_sets = get_processed_gpsData_and_polygons(
+        year_month,
+        customer_name=customer_name,
+        low_memory=_shared['low_memory'],
+        shared=_shared['resources'][customer_name]
+    )
+    if processed_gps.empty:
+        return None
+    save_processed_data(processed_gps, polygon_stats, polygon_dict, customer_name, year_month,
+                        device_sets=device_sets, record_catalog=False)
+    entry = build_catalog_entry(customer_name, year_month, processed_gps, polygon_stats)
+    entry['processing_seconds'] = round(time.perf_counter() - start, 1)
+    return entry
+
+def run_backfill(months: list, customers: list, query_workers: int = 4, process_workers: int = None,
+                 refetch: bool = False, skip_query: bool = False, reprocess: bool = False,
+                 low_memory: bool = False, land_path=BASE_DIR / "data" / "ne_10m_land.shp") -> dict:
+    """
+    Query and process every customer month concurrently.
+    Returns {(customer, month): 'processed' | 'skipped' | 'no data' | 'failed: <error>'}.
+    """
+    results = {}
+    todo = []
+    for customer_name in customers:
+        for year_month in months:
+            if not reprocess and not refetch and is_processed(customer_name, year_month):
+                results[(customer_name, year_month)] = 'skipped'
+            elif skip_query and not get_raw_path(customer_name, year_month).exists():
+                # Nothing to process and not allowed to query it
+                print(f"No raw GPS data for {customer_name} in {year_month} (--skip-query)")
+                results[(customer_name, year_month)] = 'no data'
+            else:
+                todo.append((customer_name, year_month))
+    if not todo:
+        return results
+
+    process_workers = min(process_workers or os.cpu_count(), len(todo))
+    fork = 'fork' in multiprocessing.get_all_start_methods()
+
+    shared = None
+    if fork:
+        # Loaded once here; forked workers inherit them without pickling
+        land_geometry = load_land_geometry(land_path)
+        shared = {customer: load_shared_resources(customer, land_geometry=land_geometry)
+                  for customer in sorted({customer for customer, _ in todo})}
+
+    context = multiprocessing.get_context('fork') if fork else None
+    with ProcessPoolExecutor(max_workers=process_workers, mp_context=context, initializer=_init_worker,
+                             initargs=(shared, customers, land_path, low_memory)) as process_pool, \
+            ThreadPoolExecutor(max_workers=query_workers) as query_pool:
+        # Start the worker processes before any query thread exists (forking with live threads can deadlock)
+        list(process_pool.map(_worker_ready, range(process_workers)))
+
+        processing = {}
+        querying = {}
+        for customer_name, year_month in todo:
+            if skip_query or (get_raw_path(customer_name, year_month).exists() and not refetch):
+                processing[process_pool.submit(process_month, customer_name, year_month)] = (customer_name, year_month)
+            else:
+                querying[query_pool.submit(query_month, customer_name, year_month)] = (customer_name, year_month)
+
+        # Hand each month to processing as soon as its query finishes
+        for future in as_completed(querying):
+            key = querying[future]
+            try:
+                n_rows = future.result()
+            except Exception as e:
+                print(f"Query failed for {key[0]} {key[1]}: {e}")
+                results[key] = f"failed: {e}"
+                continue
+            if n_rows == 0:
+                print(f"No GPS data found for {key[0]} in {key[1]}")
+                results[key] = 'no data'
+                continue
+            processing[process_pool.submit(process_month, *key)] = key
+
+        for future in as_completed(processing):
+            key = processing[future]
+            try:
+                entry = future.result()
+            except Exception as e:
+                print(f"Processing failed for {key[0]} {key[1]}: {e}")
+                results[key] = f"failed: {e}"
+                continue
+            if entry is None:
+                results[key] = 'no data'
+                continue
+            # Catalog updates happen here, one at a time
+            update_catalog(entry)
+            results[key] = 'processed'
+            print(f"Processed {key[0]} {key[1]}: {entry['rows']:,} rows in {entry['processing_seconds']}s")
+
+    return results
+
+def main():
+    """Main function to backfill a range of months without prompts."""
+
+    print("\n=== Backfill GPS data ===")
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--start", required=True, help="First month [YYYY-MM]")
+    parser.add_argument("--end", required=True, help="Last month [YYYY-MM]")
+    parser.add_argument("--customers", nargs="+", default=[DEFAULT_CUSTOMER], help="Customer names (default: Zim)")
+    parser.add_argument("--query-workers", type=int, default=4, help="Concurrent database queries (default: 4)")
+    parser.add_argument("--process-workers", type=int, default=None,
+                        help="Months processed at once; each holds one month in memory (default: all cores)")
+    parser.add_argument("--skip-query", action="store_true", help="Only process raw data already on disk")
+    parser.add_argument("--refetch", action="store_true", help="Query months again even if raw data exists")
+    parser.add_argument("--reprocess", action="store_true", help="Process months again even if already processed")
+    parser.add_argument("--low-memory", action="store_true", help="Process in place with downcast columns")
+    parser.add_argument("--no-maps", action="store_true", help="Skip pre-rendering single-geofence maps")
+    parser.add_argument("--land-path", default=BASE_DIR / "data" / "ne_10m_land.shp", help="Land shapefile")
+
+    args = parser.parse_args()
+
+    try:
+        months = month_range(args.start, args.end)
+    except ValueError as e:
+        print(f"Error: {e}")
+        return 1
+
+    print(f"Backfilling {len(months)} months ({months[0]} to {months[-1]}) for {', '.join(args.customers)}...")
+    start = time.perf_counter()
+    results = run_backfill(months, args.customers, query_workers=args.query_workers,
+                           process_workers=args.process_workers, refetch=args.refetch,
+                           skip_query=args.skip_query, reprocess=args.reprocess,
+                           low_memory=args.low_memory, land_path=args.land_path)
+    elapsed = time.perf_counter() - start
+
+    # Maps render after processing; each month's rendering already uses all cores
+    if not args.no_maps:
+        from render_geofence_maps import render_geofence_maps
+        for (customer_name, year_month), status in sorted(results.items()):
+            if status == 'processed':
+                render_geofence_maps(year_month, customer_name)
+
+    print(f"\nBackfill finished in {elapsed:.1f}s:")
+    for (customer_name, year_month), status in sorted(results.items()):
+        print(f"  {customer_name} {year_month}: {status}")
+    return 0 if not any(status.startswith('failed') for status in results.values()) else 1
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,363 @@
+"""
+Benchmarks for the processing and map rendering stages on synthetic GPS months.
+
+Synthetic months are generated from the real customer geofences and the Natural Earth
+land file, so point-in-polygon and sea detection do the same amount of work as on real data.
+
+Import times of the entry points are measured in fresh interpreters with --imports.
+
+TO RUN:
+    python ./scripts/benchmark.py --sizes 100k 1M
+    python ./scripts/benchmark.py --sizes 100k --compare
+    python ./scripts/benchmark.py --imports --compare
+"""
+from config import BASE_DIR, BENCHMARKS_DIR, DEFAULT_CUSTOMER, LATENCY_THRESHOLD_HOURS, HEATMAP_BIN_ZOOM
+from data_processing import (
+    load_geofences,
+    load_land_geometry,
+    build_spatial_index,
+    load_or_build_geofence_grid,
+    process_gps_data,
+    get_geofence_stats
+)
+from latency_maps import plot_latency, plot_dual_gps_heatmap, plot_gps_per_polygon
+
+import sys
+import json
+import time
+import argparse
+import statistics
+import tracemalloc
+import subprocess
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from datetime import datetime
+
+HISTORY_PATH = BENCHMARKS_DIR / "benchmark_history.jsonl"
+STAGES = ['process_gps_data', 'get_geofence_stats', 'plot_latency', 'plot_dual_gps_heatmap', 'plot_gps_per_polygon']
+
+# Modules timed by --imports, and the heavy dependencies reported as loaded by each of them
+IMPORT_ENTRY_POINTS = ['streamlit_app', 'latency_maps', 'month_data', 'data_processing', 'data_query',
+                       'render_geofence_maps', 'heatmap_tiles', 'backfill', 'jobs', 'catalog']
+HEAVY_MODULES = ['streamlit', 'folium', 'matplotlib', 'geopandas', 'rtree', 'pycountry', 'shapely',
+                 'sqlalchemy', 'pyarrow.parquet', 'PIL.Image']
+
+# Share of synthetic reports landing in geofences, in yards next to them and at sea
+GEOFENCE_SHARE = 0.55
+YARD_SHARE = 0.20
+
+# Open-ocean boxes (min_lat, min_lon, max_lat, max_lon) along the main shipping lanes
+SEA_BOXES = [
+    (30.0, -45.0, 40.0, -30.0),    # North Atlantic
+    (-30.0, -25.0, -10.0, -10.0),  # South Atlantic
+    (-10.0, 65.0, 5.0, 85.0),      # Indian Ocean
+    (10.0, 140.0, 30.0, 170.0),    # North-West Pacific
+    (20.0, -150.0, 35.0, -130.0),  # North-East Pacific
+    (33.5, 18.0, 35.0, 24.0),      # Mediterranean
+]
+
+def parse_size(size: str) -> int:
+    """Parse sizes such as '100k', '1M' or '2500' into a row count."""
+    size = size.strip().lower()
+    multipliers = {'k': 1_000, 'm': 1_000_000}
+    if size[-1] in multipliers:
+        return int(float(size[:-1]) * multipliers[size[-1]])
+    return int(size)
+
+def generate_synthetic_gps(polygons_df: pd.DataFrame, n_rows: int, year_month: str = "2025-01",
+                           customer_name: str = DEFAULT_CUSTOMER, seed: int = 0) -> pd.DataFrame:
+    """
+    Generate a raw GPS month in the format returned by data_query.get_gps_data.
+
+    Reports cluster inside geofences (few busy terminals, long tail of quiet ones),
+    in yards just outside geofences and at sea. Latency is log-normal with a heavy tail
+    of store-and-forward reports beyond the latency threshold.
+    """
+    rng = np.random.default_rng(seed)
+
+    _, polygon_dict = build_spatial_index(polygons_df.copy())
+    bounds = np.array([poly.bounds for _, poly in polygon_dict.values()])  # (min_lat, min_lon, max_lat, max_lon)
+    centers = np.array([(poly.centroid.x, poly.centroid.y) for _, poly in polygon_dict.values()])
+
+    n_geofence = int(n_rows * GEOFENCE_SHARE)
+    n_yard = int(n_rows * YARD_SHARE)
+    n_sea = n_rows - n_geofence - n_yard
+
+    # Zipf-like popularity of geofences
+    popularity = 1.0 / np.arange(1, len(centers) + 1) ** 0.8
+    popularity = rng.permutation(popularity / popularity.sum())
+
+    # Inside geofences: shrink a uniform bbox sample towards the centroid to stay inside
+    poly_idx = rng.choice(len(centers), size=n_geofence, p=popularity)
+    u = rng.random((n_geofence, 2))
+    bbox_pts = bounds[poly_idx, :2] + u * (bounds[poly_idx, 2:] - bounds[poly_idx, :2])
+    geofence_pts = centers[poly_idx] + 0.5 * (bbox_pts - centers[poly_idx])
+
+    # Yards: within a few kilometers of a geofence, mostly outside of it
+    yard_idx = rng.choice(len(centers), size=n_yard, p=popularity)
+    yard_pts = centers[yard_idx] + rng.normal(0, 0.03, size=(n_yard, 2))
+
+    # At sea: uniform in open-ocean boxes
+    boxes = np.array(SEA_BOXES)
+    box_idx = rng.integers(0, len(boxes), size=n_sea)
+    u = rng.random((n_sea, 2))
+    sea_pts = boxes[box_idx, :2] + u * (boxes[box_idx, 2:] - boxes[box_idx, :2])
+
+    coords = np.vstack([geofence_pts, yard_pts, sea_pts])
+    coords = coords[rng.permutation(n_rows)]
+
+    # Devices report from their own area, roughly 300 reports per device per month
+    n_devices = max(1, n_rows // 300)
+    device_num = rng.integers(0, n_devices, size=n_rows)
+    device_ids = pd.Series(device_num).map(lambda d: f"A0{d:08X}")
+
+    # Event times uniform over the month, latency log-normal with a heavy tail
+    month_start = pd.Timestamp(f"{year_month}-01")
+    month_seconds = (month_start + pd.offsets.MonthBegin(1) - month_start).total_seconds()
+    event_offset = rng.random(n_rows) * month_seconds
+    latency_seconds = rng.lognormal(mean=np.log(600), sigma=1.5, size=n_rows)
+    backlog = rng.random(n_rows) < 0.08
+    latency_seconds[backlog] = rng.uniform(LATENCY_THRESHOLD_HOURS * 3600, 10 * 24 * 3600, size=backlog.sum())
+
+    event_time = month_start + pd.to_timedelta(event_offset, unit='s').round('us')
+    receive_time = event_time + pd.to_timedelta(latency_seconds, unit='s').round('us')
+
+    lat = pd.Series(coords[:, 0].round(6)).astype(str)
+    lon = pd.Series(coords[:, 1].round(6)).astype(str)
+
+    return pd.DataFrame({
+        'CustomerName': customer_name,
+        'DeviceID': device_ids,
+        'DeviceName': device_ids,
+        'ReceiveTimeUTC': pd.Series(receive_time).dt.strftime("%Y-%m-%d %H:%M:%S.%f"),
+        'EventTimeUTC': pd.Series(event_time).dt.strftime("%Y-%m-%d %H:%M:%S.%f"),
+        'FPort': 2,
+        'PayloadData': "GPS Data: " + lat + "," + lon,
+    })
+
+def time_stage(func, *args, **kwargs):
+    """Run a stage and return its result and wall time in seconds."""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def trace_stage(func, *args, **kwargs):
+    """Run a stage under tracemalloc and return its result, wall time and peak traced memory in MB."""
+    tracemalloc.start()
+    try:
+        result, seconds = time_stage(func, *args, **kwargs)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak / 1024**2
+
+def run_benchmark(n_rows: int, polygons_df: pd.DataFrame, land_geometry, stages=STAGES,
+                  customer_name: str = DEFAULT_CUSTOMER, seed: int = 0,
+                  low_memory: bool = False, trace_memory: bool = False) -> list:
+    """
+    Generate one synthetic month and time every requested stage on it.
+    With trace_memory the processing stage also records its peak traced memory (slower).
+    """
+    print(f"\n--- {n_rows:,} rows ---")
+    raw_gps, gen_seconds = time_stage(generate_synthetic_gps, polygons_df, n_rows,
+                                      customer_name=customer_name, seed=seed)
+    print(f"Generated synthetic month in {gen_seconds:.1f}s")
+
+    spatial_idx, polygon_dict = build_spatial_index(polygons_df)
+    grid_index = load_or_build_geofence_grid(polygons_df, polygon_dict, customer_name)
+    results = []
+
+    def record(stage, seconds, **extra):
+        extra_str = "".join(f"  {key}={value}" for key, value in extra.items())
+        print(f"  {stage:<24} {seconds:>9.2f}s{extra_str}")
+        results.append({'n_rows': n_rows, 'stage': stage, 'seconds': round(seconds, 4), **extra})
+
+    # Processing is needed by every later stage, so it always runs
+    raw_mb = round(raw_gps.memory_usage(deep=True).sum() / 1024**2, 1)
+    process_kwargs = dict(customer_name=customer_name, land_geometry=land_geometry,
+                          grid_index=grid_index, low_memory=low_memory)
+    if trace_memory:
+        processed_gps, seconds, peak_mb = trace_stage(process_gps_data, raw_gps, spatial_idx, polygon_dict,
+                                                      **process_kwargs)
+        memory = {'raw_mb': raw_mb, 'peak_mb': round(peak_mb, 1)}
+    else:
+        processed_gps, seconds = time_stage(process_gps_data, raw_gps, spatial_idx, polygon_dict,
+                                            **process_kwargs)
+        memory = {}
+    if 'process_gps_data' in stages:
+        record('process_gps_data', seconds, low_memory=low_memory, **memory,
+               result_mb=round(processed_gps.memory_usage(deep=True).sum() / 1024**2, 1))
+    del raw_gps
+
+    polygon_stats, seconds = time_stage(get_geofence_stats, polygons_df, processed_gps,
+                                        customer_name=customer_name, latency_threshold=LATENCY_THRESHOLD_HOURS)
+    if 'get_geofence_stats' in stages:
+        record('get_geofence_stats', seconds)
+
+    if 'plot_latency' in stages:
+        html, seconds = time_stage(lambda: plot_latency(polygon_dict, polygon_stats, severe_on_top=True).get_root().render())
+        record('plot_latency', seconds, html_mb=round(len(html) / 1024**2, 2))
+
+    if 'plot_dual_gps_heatmap' in stages:
+        land_gps = processed_gps[~processed_gps['in_Sea']]
+        html, seconds = time_stage(lambda: plot_dual_gps_heatmap(land_gps, month="benchmark",
+                                                                        bin_zoom=HEATMAP_BIN_ZOOM).get_root().render())
+        record('plot_dual_gps_heatmap', seconds, html_mb=round(len(html) / 1024**2, 2))
+
+    if 'plot_gps_per_polygon' in stages:
+        busiest = polygon_stats.loc[polygon_stats['total_messages'].idxmax(), 'LocationName']
+        html, seconds = time_stage(lambda: plot_gps_per_polygon(polygon_stats, busiest, processed_gps,
+                                                                customer_name=customer_name).get_root().render())
+        record('plot_gps_per_polygon', seconds, html_mb=round(len(html) / 1024**2, 2))
+
+    return results
+
+def time_import(module: str, repeats: int = 5) -> dict:
+    """
+    Median wall time of importing a module in a fresh interpreter (imports are cached per
+    process, so every repeat starts a new one), and the heavy modules it loaded.
+    """
+    code = (
+        "import sys, time, json\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "seconds = time.perf_counter() - start\n"
+        f"print(json.dumps({{'seconds': seconds, 'heavy': [m for m in {HEAVY_MODULES!r} if m in sys.modules]}}))"
+    )
+    timings, heavy = [], []
+    for _ in range(repeats):
+        result = subprocess.run([sys.executable, '-c', code], cwd=Path(__file__).parent,
+                                capture_output=True, text=True, check=True)
+        measured = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(measured['seconds'])
+        heavy = measured['heavy']
+    return {'seconds': round(statistics.median(timings), 3), 'heavy_modules': heavy}
+
+def run_import_benchmark(modules=IMPORT_ENTRY_POINTS, repeats: int = 5) -> list:
+    """Time the import of each entry point. Results use n_rows=0 so runs can be compared."""
+    results = []
+    for module in modules:
+        measured = time_import(module, repeats)
+        results.append({'n_rows': 0, 'stage': f'import {module}', **measured})
+        print(f"  import {module:<22} {measured['seconds']:>6.2f}s  loads: {', '.join(measured['heavy_modules']) or '-'}")
+    return results
+
+def get_git_commit():
+    """Return the short hash of the current commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def load_history(history_path=HISTORY_PATH) -> list:
+    """Load all recorded benchmark runs, oldest first."""
+    if not history_path.exists():
+        return []
+    with open(history_path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def save_run(run: dict, history_path=HISTORY_PATH):
+    """Append a benchmark run to the history file."""
+    with open(history_path, 'a') as f:
+        f.write(json.dumps(run) + "\n")
+    print(f"\nSaved benchmark run {run['run_id']} to {history_path}")
+
+def compare_runs(current: dict, baseline: dict, tolerance: float = 0.2) -> list:
+    """
+    Compare stage timings of two runs and return the regressions.
+
+    A stage regresses when it is slower than the baseline by more than `tolerance`
+    (relative). Stages taking less than 50 ms in the baseline are ignored as noise.
+    """
+    baseline_times = {(r['n_rows'], r['stage']): r['seconds'] for r in baseline['results']}
+    regressions = []
+
+    print(f"\nComparing run {current['run_id']} against baseline {baseline['run_id']} ({baseline.get('commit')})")
+    for r in current['results']:
+        key = (r['n_rows'], r['stage'])
+        if key not in baseline_times:
+            continue
+        base = baseline_times[key]
+        change = (r['seconds'] - base) / base if base > 0 else 0.0
+        flag = ""
+        if base >= 0.05 and change > tolerance:
+            flag = "  <-- REGRESSION"
+            regressions.append({**r, 'baseline_seconds': base, 'change': round(change, 3)})
+        print(f"  {r['n_rows']:>11,} {r['stage']:<24} {base:>9.2f}s -> {r['seconds']:>9.2f}s ({change:+.0%}){flag}")
+
+    return regressions
+
+def main():
+    """Main function to run benchmarks and record them to the history file."""
+
+    print("\n=== Benchmark processing and map rendering ===")
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", nargs="+", default=["100k", "1M", "10M"],
+                        help="Synthetic month sizes (default: 100k 1M 10M)")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES,
+                        help="Stages to time (default: all)")
+    parser.add_argument("--customer", default=DEFAULT_CUSTOMER,
+                        help="Customer whose geofences are used (default: Zim)")
+    parser.add_argument("--land-path", default=BASE_DIR / "data" / "ne_10m_land.shp",
+                        help="Natural Earth land file")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for synthetic data")
+    parser.add_argument("--low-memory", action="store_true", help="Run process_gps_data in low-memory mode")
+    parser.add_argument("--memory", action="store_true",
+                        help="Record peak traced memory of process_gps_data (slower)")
+    parser.add_argument("--label", default=None, help="Free-text label stored with the run")
+    parser.add_argument("--compare", action="store_true",
+                        help="Compare against the previous run in the history and flag regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Relative slowdown treated as a regression (default: 0.2)")
+    parser.add_argument("--no-save", action="store_true", help="Do not append this run to the history")
+    parser.add_argument("--imports", action="store_true",
+                        help="Time the import of each entry point in fresh interpreters instead of the stages")
+    parser.add_argument("--import-repeats", type=int, default=5, help="Interpreters started per import (default: 5)")
+
+    args = parser.parse_args()
+
+    results = []
+    if args.imports:
+        print(f"Median import times over {args.import_repeats} fresh interpreters:")
+        results.extend(run_import_benchmark(repeats=args.import_repeats))
+    else:
+        polygons_df = load_geofences(args.customer)
+        land_geometry = load_land_geometry(args.land_path)
+
+        for size in args.sizes:
+            results.extend(run_benchmark(parse_size(size), polygons_df, land_geometry,
+                                         stages=args.stages, customer_name=args.customer, seed=args.seed,
+                                         low_memory=args.low_memory, trace_memory=args.memory))
+
+    run = {
+        'run_id': datetime.now().strftime("%Y%m%d-%H%M%S"),
+        'commit': get_git_commit(),
+        'label': args.label,
+        'results': results,
+    }
+
+    exit_code = 0
+    if args.compare:
+        # Latest run that timed any of the same stages (import and stage runs share the history)
+        keys = {(r['n_rows'], r['stage']) for r in results}
+        history = [past for past in load_history() if keys & {(r['n_rows'], r['stage']) for r in past['results']}]
+        if history:
+            regressions = compare_runs(run, history[-1], tolerance=args.tolerance)
+            if regressions:
+                print(f"\n{len(regressions)} stage(s) regressed by more than {args.tolerance:.0%}.")
+                exit_code = 1
+            else:
+                print("\nNo regressions.")
+        else:
+            print("\nNo previous run in the history to compare against.")
+
+    if not args.no_save:
+        save_run(run)
+
+    return exit_code
+
+if __name__ == "__main__":
+    exit(main())
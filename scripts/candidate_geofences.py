@@ -0,0 +1,202 @@
+"""
+Candidate geofences: clusters of land reports outside every customer geofence (often depots
+or yards the customer has not fenced yet).
+
+Points are bucketed into a grid of CANDIDATE_CELL_DEGREES cells; cells with at least
+CANDIDATE_MIN_CELL_REPORTS reports are dense, and neighbouring dense cells (8-connected) form
+one cluster. Both passes are linear in the number of points (one sort of cell keys, then
+label propagation over the dense cells only). Each cluster becomes a candidate polygon (the
+convex hull of its reports) ranked by distinct devices and reports, with its latency counts
+and the nearest existing geofence.
+
+data_processing.py saves them as data/processed/candidate_geofences_<customer>_<year>_<month>.csv,
+with polygons in the geofence file format (lat,lon,lat,lon,...).
+
+TO RUN (months processed before candidates existed):
+    python ./scripts/candidate_geofences.py --manual
+"""
+from utils import get_default_month, prompt_for_month
+from config import (
+    PROCESSED_DATA_DIR,
+    DEFAULT_CUSTOMER,
+    LATENCY_THRESHOLD_HOURS,
+    CANDIDATE_CELL_DEGREES,
+    CANDIDATE_MIN_CELL_REPORTS,
+    CANDIDATE_MIN_DEVICES
+)
+
+import argparse
+import numpy as np
+import pandas as pd
+
+KM_PER_DEGREE = 111.32
+NEIGHBOUR_OFFSETS = [(0, 1), (1, -1), (1, 0), (1, 1)]  # each undirected neighbour pair once
+
+def get_candidates_path(customer_name: str, year_month: str):
+    year, month = year_month.split('-')
+    return PROCESSED_DATA_DIR / f"candidate_geofences_{customer_name}_{year}_{month}.csv"
+
+def _cell_key(row: np.ndarray, col: np.ndarray) -> np.ndarray:
+    # Rows and columns of a 0.0001-degree or coarser grid fit in 32 bits each; keys sort by (row, col)
+    return (row.astype(np.int64) << 32) | (col.astype(np.int64) + 2**31)
+
+def _cell_row_col(key: np.ndarray):
+    return key >> 32, (key & 0xFFFFFFFF) - 2**31
+
+def _connected_components(n: int, edges_a: np.ndarray, edges_b: np.ndarray) -> np.ndarray:
+    """Component label (smallest member index) of n nodes, by min-label propagation with pointer jumping."""
+    labels = np.arange(n)
+    while True:
+        previous = labels.copy()
+        low = np.minimum(labels[edges_a], labels[edges_b])
+        np.minimum.at(labels, edges_a, low)
+        np.minimum.at(labels, edges_b, low)
+        labels = labels[labels]
+        if np.array_equal(labels, previous):
+            return labels
+
+def cluster_points(lat: np.ndarray, lon: np.ndarray, cell_degrees: float = CANDIDATE_CELL_DEGREES,
+                   min_cell_reports: int = CANDIDATE_MIN_CELL_REPORTS) -> np.ndarray:
+    """Cluster id per point (-1 for points in sparse cells)."""
+    row = np.floor(lat / cell_degrees).astype(np.int64)
+    col = np.floor(lon / cell_degrees).astype(np.int64)
+    cells, point_cell, counts = np.unique(_cell_key(row, col), return_inverse=True, return_counts=True)
+
+    dense = np.flatnonzero(counts >= min_cell_reports)
+    dense_keys = cells[dense]
+    dense_row, dense_col = _cell_row_col(dense_keys)
+
+    # Edges between dense cells that are grid neighbours (lookups in the sorted dense keys)
+    edges_a, edges_b = [], []
+    for d_row, d_col in NEIGHBOUR_OFFSETS:
+        neighbour = _cell_key(dense_row + d_row, dense_col + d_col)
+        pos = np.minimum(np.searchsorted(dense_keys, neighbour), max(len(dense_keys) - 1, 0))
+        found = dense_keys[pos] == neighbour if len(dense_keys) else np.zeros(0, dtype=bool)
+        edges_a.append(np.flatnonzero(found))
+        edges_b.append(pos[found])
+    labels = _connected_components(len(dense), np.concatenate(edges_a), np.concatenate(edges_b))
+
+    # Number clusters 0..k-1 and map every point through its cell
+    _, cluster_of_dense = np.unique(labels, return_inverse=True)
+    cluster_of_cell = np.full(len(cells), -1, dtype=np.int64)
+    cluster_of_cell[dense] = cluster_of_dense
+    return cluster_of_cell[point_cell]
+
+def _nearest_geofences(center_lat: np.ndarray, center_lon: np.ndarray, polygon_dict: dict):
+    """Name of and distance in km to the nearest geofence of each center."""
+    import shapely
+    names = np.array([name for name, _ in polygon_dict.values()], dtype=object)
+    tree = shapely.STRtree([polygon for _, polygon in polygon_dict.values()])
+    centers = shapely.points(center_lat, center_lon)  # polygons are (lat, lon)
+    (center_idx, polygon_idx), distance = tree.query_nearest(centers, return_distance=True, all_matches=False)
+    nearest = np.empty(len(centers), dtype=object)
+    distance_km = np.full(len(centers), np.nan)
+    nearest[center_idx] = names[polygon_idx]
+    distance_km[center_idx] = distance * KM_PER_DEGREE  # approximate, degrees to km
+    return nearest, distance_km
+
+def find_candidate_geofences(processed_gps: pd.DataFrame, polygon_dict: dict = None,
+                             customer_name: str = DEFAULT_CUSTOMER,
+                             latency_threshold: int = LATENCY_THRESHOLD_HOURS,
+                             cell_degrees: float = CANDIDATE_CELL_DEGREES,
+                             min_cell_reports: int = CANDIDATE_MIN_CELL_REPORTS,
+                             min_devices: int = CANDIDATE_MIN_DEVICES) -> pd.DataFrame:
+    """Ranked candidate geofences from the land reports outside all geofences of a processed month."""
+    import shapely
+
+    outside = processed_gps[f'in_{customer_name}_polygon'].isna().values & ~processed_gps['in_Sea'].values.astype(bool)
+    lat = processed_gps['Lat'].values[outside].astype(np.float64)
+    lon = processed_gps['Lon'].values[outside].astype(np.float64)
+    cluster = cluster_points(lat, lon, cell_degrees, min_cell_reports)
+
+    clustered = cluster >= 0
+    points = pd.DataFrame({
+        'cluster': cluster[clustered],
+        'lat': lat[clustered],
+        'lon': lon[clustered],
+        'DeviceID': processed_gps['DeviceID'].values[outside][clustered],
+        'late': (processed_gps['t_diff'].values[outside][clustered] >= np.timedelta64(latency_threshold, 'h')),
+    })
+    candidates = points.groupby('cluster').agg(
+        reports=('lat', 'size'),
+        devices=('DeviceID', 'nunique'),
+        latency_reports=('late', 'sum'),
+        center_lat=('lat', 'mean'),
+        center_lon=('lon', 'mean'),
+    )
+    candidates = candidates[candidates['devices'] >= min_devices]
+    if candidates.empty:
+        return pd.DataFrame(columns=['LocationName', 'Polygon', 'reports', 'devices', 'latency_reports',
+                                     'latency_messages_ratio', 'center_lat', 'center_lon', 'area_km2',
+                                     'nearest_geofence', 'nearest_geofence_km'])
+
+    # Convex hull of each cluster's reports, at least one grid cell wide
+    points = points[points['cluster'].isin(candidates.index)].sort_values('cluster', kind='stable')
+    hull_index = np.searchsorted(candidates.index.values, points['cluster'].values)  # 0..k-1, in candidates order
+    hulls = shapely.convex_hull(shapely.multipoints(points[['lat', 'lon']].values, indices=hull_index))
+    hulls = shapely.buffer(hulls, cell_degrees / 2, quad_segs=2)
+    candidates['Polygon'] = [",".join(f"{x:.6f},{y:.6f}" for x, y in hull.exterior.coords[:-1]) for hull in hulls]
+    candidates['area_km2'] = (shapely.area(hulls) * KM_PER_DEGREE**2
+                              * np.cos(np.radians(candidates['center_lat'].values))).round(3)
+
+    candidates['latency_messages_ratio'] = (candidates['latency_reports'] / candidates['reports'] * 100).round(1)
+    if polygon_dict:
+        candidates['nearest_geofence'], distance_km = _nearest_geofences(
+            candidates['center_lat'].values, candidates['center_lon'].values, polygon_dict)
+        candidates['nearest_geofence_km'] = distance_km.round(2)
+    else:
+        candidates['nearest_geofence'], candidates['nearest_geofence_km'] = None, np.nan
+
+    candidates = candidates.sort_values(['devices', 'reports'], ascending=False).reset_index(drop=True)
+    candidates.insert(0, 'LocationName', [f"CANDIDATE-{i + 1:04d}" for i in range(len(candidates))])
+    candidates[['center_lat', 'center_lon']] = candidates[['center_lat', 'center_lon']].round(6)
+    return candidates[['LocationName', 'Polygon', 'reports', 'devices', 'latency_reports', 'latency_messages_ratio',
+                       'center_lat', 'center_lon', 'area_km2', 'nearest_geofence', 'nearest_geofence_km']]
+
+def save_candidate_geofences(candidates: pd.DataFrame, customer_name: str, year_month: str):
+    filepath = get_candidates_path(customer_name, year_month)
+    candidates.to_csv(filepath, index=False)
+    return filepath
+
+def load_candidate_geofences(year_month: str, customer_name: str = DEFAULT_CUSTOMER):
+    """Candidate geofences of a month, or None if they were not computed."""
+    filepath = get_candidates_path(customer_name, year_month)
+    if not filepath.exists():
+        return None
+    return pd.read_csv(filepath)
+
+def main():
+    """Main function to find candidate geofences in a processed month."""
+    from month_data import load_month_data
+
+    print("\n=== Candidate geofences ===")
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--manual", action="store_true", help="Manually select month")
+    parser.add_argument("--customer", default=DEFAULT_CUSTOMER, help="Customer name (default: Zim)")
+    parser.add_argument("--cell-degrees", type=float, default=CANDIDATE_CELL_DEGREES,
+                        help=f"Grid cell size in degrees (default: {CANDIDATE_CELL_DEGREES})")
+    parser.add_argument("--min-cell-reports", type=int, default=CANDIDATE_MIN_CELL_REPORTS,
+                        help=f"Reports for a cell to be dense (default: {CANDIDATE_MIN_CELL_REPORTS})")
+    parser.add_argument("--min-devices", type=int, default=CANDIDATE_MIN_DEVICES,
+                        help=f"Distinct devices for a candidate (default: {CANDIDATE_MIN_DEVICES})")
+    parser.add_argument("--top", type=int, default=20, help="Candidates to print (default: 20)")
+
+    args = parser.parse_args()
+
+    year_month = prompt_for_month() if args.manual else get_default_month()
+    data = load_month_data(year_month, args.customer, columns=['DeviceID', 'Lat', 'Lon', 't_diff', 'in_Sea',
+                                                               f'in_{args.customer}_polygon'])
+    if data is None:
+        return 1
+    gps_df, _, polygon_dict = data
+
+    candidates = find_candidate_geofences(gps_df, polygon_dict, args.customer, cell_degrees=args.cell_degrees,
+                                          min_cell_reports=args.min_cell_reports, min_devices=args.min_devices)
+    filepath = save_candidate_geofences(candidates, args.customer, year_month)
+    print(f"Found {len(candidates)} candidate geofences, saved to {filepath}\n")
+    print(candidates.drop(columns='Polygon').head(args.top).to_string(index=False))
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,134 @@
+"""
+Catalog of processed customer months (data/processed/catalog.json).
+
+data_processing.py records every month it saves: row counts, event date coverage, geofence
+version, and the size and checksum of each file. The dashboard reads the catalog to fill its
+selectors and show month metadata without loading any data.
+
+TO RUN (rebuild the catalog from the processed files already on disk):
+    python ./scripts/catalog.py --rebuild
+"""
+from config import PROCESSED_DATA_DIR
+from month_data import iter_processed_months, read_processed_month
+from utils import file_lock
+
+import os
+import json
+import hashlib
+import argparse
+import pandas as pd
+from datetime import datetime
+
+CATALOG_PATH = PROCESSED_DATA_DIR / "catalog.json"
+CATALOG_LOCK_PATH = PROCESSED_DATA_DIR / "catalog.json.lock"
+
+def file_checksum(path, chunk_size: int = 1024**2) -> str:
+    """SHA-256 of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_month_files(customer_name: str, year_month: str) -> list:
+    """Processed files belonging to one customer month."""
+    year, month = year_month.split('-')
+    return sorted(PROCESSED_DATA_DIR.glob(f"*_{customer_name}_{year}_{month}.*"))
+
+def build_catalog_entry(customer_name: str, year_month: str, processed_gps: pd.DataFrame = None,
+                        polygon_stats: pd.DataFrame = None) -> dict:
+    """
+    Catalog entry of a processed month. Metrics come from the given frames, or are read
+    back from the processed files when they are not passed (catalog rebuild).
+    """
+    # Avoid a circular import: data_processing records catalog entries when saving
+    from data_processing import get_geofence_version
+
+    year, month = year_month.split('-')
+    col = f'in_{customer_name}_polygon'
+    if processed_gps is None:
+        processed_gps = read_processed_month(customer_name, year_month, ['EventTimeUTC', 'in_Sea', col])
+    if polygon_stats is None:
+        polygon_stats = pd.read_csv(PROCESSED_DATA_DIR / f"geofence_stats_{customer_name}_{year}_{month}.csv")
+
+    event_time = pd.to_datetime(processed_gps['EventTimeUTC'])
+    files = {path.name: {'size': path.stat().st_size, 'sha256': file_checksum(path)}
+             for path in get_month_files(customer_name, year_month)}
+
+    return {
+        'customer': customer_name,
+        'month': year_month,
+        'rows': int(len(processed_gps)),
+        'sea_rows': int(processed_gps['in_Sea'].sum()),
+        'geofence_rows': int(processed_gps[col].notna().sum()),
+        'geofences_with_data': int((polygon_stats['total_messages'] > 0).sum()),
+        'first_event': str(event_time.min()),
+        'last_event': str(event_time.max()),
+        'geofence_version': get_geofence_version(polygon_stats),
+        'files': files,
+        'total_bytes': sum(f['size'] for f in files.values()),
+        'processed_at': datetime.now().isoformat(timespec='seconds'),
+    }
+
+def load_catalog() -> dict:
+    """Catalog entries keyed by '<customer>/<YYYY-MM>' (empty if no catalog exists)."""
+    if not CATALOG_PATH.exists():
+        return {}
+    with open(CATALOG_PATH, 'r') as f:
+        return json.load(f)
+
+def save_catalog(catalog: dict):
+    tmp_path = CATALOG_PATH.with_name(f"{CATALOG_PATH.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(catalog, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, CATALOG_PATH)
+
+def update_catalog(entry: dict):
+    """Add or replace the entry of one customer month (locked: months are saved by several processes)."""
+    PROCESSED_DATA_DIR.mkdir(parents=True, exist_ok=True)
+    with file_lock(CATALOG_LOCK_PATH):
+        catalog = load_catalog()
+        catalog[f"{entry['customer']}/{entry['month']}"] = entry
+        save_catalog(catalog)
+
+def get_catalog_customers(catalog: dict) -> list:
+    return sorted({entry['customer'] for entry in catalog.values()})
+
+def get_catalog_months(catalog: dict, customer_name: str) -> list:
+    """Processed months of a customer, most recent first."""
+    return sorted((entry['month'] for entry in catalog.values() if entry['customer'] == customer_name), reverse=True)
+
+def rebuild_catalog() -> dict:
+    """Recreate the catalog from every processed GPS file in PROCESSED_DATA_DIR."""
+    catalog = {}
+    for customer_name, year_month, _ in iter_processed_months():
+        print(f"Cataloging {customer_name} {year_month}...")
+        entry = build_catalog_entry(customer_name, year_month)
+        catalog[f"{customer_name}/{year_month}"] = entry
+    with file_lock(CATALOG_LOCK_PATH):
+        save_catalog(catalog)
+    return catalog
+
+def main():
+    """Main function to rebuild or print the processed month catalog."""
+
+    print("\n=== Processed month catalog ===")
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the catalog from the processed files")
+
+    args = parser.parse_args()
+
+    catalog = rebuild_catalog() if args.rebuild else load_catalog()
+    if not catalog:
+        print(f"No processed months found in {PROCESSED_DATA_DIR}")
+        return 1
+
+    for key in sorted(catalog):
+        entry = catalog[key]
+        print(f"{key}: {entry['rows']:,} rows, {entry['first_event']} to {entry['last_event']}, "
+              f"{entry['total_bytes'] / 1024**2:.1f} MB, geofences {entry['geofence_version']}")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -4,12 +4,68 @@ BASE_DIR = Path(__file__).parent.parent.absolute()
 RAW_DATA_DIR = BASE_DIR / "data" / "raw"
 PROCESSED_DATA_DIR = BASE_DIR / "data" / "processed"
 MAPS_DIR = BASE_DIR / "maps"
+TILES_DIR = MAPS_DIR / "tiles"
+MAP_CACHE_DIR = MAPS_DIR / "cache"
+BENCHMARKS_DIR = BASE_DIR / "benchmarks"
+JOBS_DIR = BASE_DIR / "jobs"
 
 # Ensure directories exist
 RAW_DATA_DIR.mkdir(parents=True, exist_ok=True)
 PROCESSED_DATA_DIR.mkdir(parents=True, exist_ok=True)
 MAPS_DIR.mkdir(parents=True, exist_ok=True)
+TILES_DIR.mkdir(parents=True, exist_ok=True)
+MAP_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+BENCHMARKS_DIR.mkdir(parents=True, exist_ok=True)
+JOBS_DIR.mkdir(parents=True, exist_ok=True)
 
 # Default settings
 DEFAULT_CUSTOMER = "Zim"
-LATENCY_THRESHOLD_HOURS = 24
\ No newline at end of file
+LATENCY_THRESHOLD_HOURS = 24
+
+# Zoom level whose pixel size sets the heatmap binning grid (cells of ~4 px, ~2.5 km at zoom 8)
+HEATMAP_BIN_ZOOM = 8
+
+# Local HTTP port serving the pre-rendered heatmap tiles (heatmap_tiles.py)
+TILE_SERVER_PORT = 8765
+
+# Rendered map cache limits (map_cache.py): total size and days since last use
+MAP_CACHE_MAX_MB = 500
+MAP_CACHE_MAX_AGE_DAYS = 30
+
+# Memory budget of months held in memory by the dashboard (month_cache.py)
+MONTH_CACHE_MAX_MB = 2048
+
+# Background jobs started from the dashboard (jobs.py) running at the same time
+JOB_WORKERS = 2
+
+# Reports of a device in the same geofence more than this many hours apart start a new visit (visits.py)
+VISIT_MAX_GAP_HOURS = 48
+
+# Duplicate reports dropped at ingest (dedup.py): same DeviceID and PayloadData with event times at
+# most this many seconds apart (0 = exact duplicates only), and rows per streamed query chunk
+DEDUP_TOLERANCE_SECONDS = 0
+QUERY_CHUNK_ROWS = 500_000
+
+# Local read-only JSON API over the processed stats (stats_api.py): port and months kept in memory
+STATS_API_PORT = 8766
+STATS_API_MAX_MONTHS = 24
+
+# Candidate geofences (candidate_geofences.py): grid cell size (~550 m), reports in a month for a
+# cell to count as dense, and distinct devices for a cluster of dense cells to be a candidate
+CANDIDATE_CELL_DEGREES = 0.005
+CANDIDATE_MIN_CELL_REPORTS = 20
+CANDIDATE_MIN_DEVICES = 3
+
+# Backlog flushes (flushes.py): reports of a device received at most this many seconds apart form a
+# burst; bursts with this many reports spanning this many hours of event time are flushes
+FLUSH_RECEIVE_GAP_SECONDS = 60
+FLUSH_MIN_REPORTS = 3
+FLUSH_MIN_EVENT_SPAN_HOURS = 1
+
+# Preview sample (sampling.py): about this many reports per month, stratified by geofence, land/sea
+# and late/normal with at least this many reports per stratum
+SAMPLE_ROWS = 200_000
+SAMPLE_MIN_STRATUM_ROWS = 20
+
+# The dashboard opens months with at least this many reports in preview mode
+PREVIEW_DEFAULT_MIN_ROWS = 5_000_000
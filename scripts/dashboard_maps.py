@@ -0,0 +1,92 @@
+"""
+Dashboard map views rendered into the map cache.
+
+One place defines the cache key of each view and how it is rendered, so the dashboard, the
+background jobs (jobs.py) and the batch geofence renderer all produce and find the same maps.
+"""
+from config import LATENCY_THRESHOLD_HOURS, HEATMAP_BIN_ZOOM
+from month_data import HEATMAP_COLUMNS, load_month_data, load_geofence_points
+from map_cache import map_cache_key, put_cached_map
+from sampling import load_gps_sample
+
+from datetime import datetime
+
+MAP_TYPES = ['global_latency', 'dual_heatmap', 'geofence']
+
+def get_map_key(map_type: str, customer_name: str, year_month: str, geofence: str = None,
+                threshold: int = LATENCY_THRESHOLD_HOURS, preview: bool = False) -> str:
+    """
+    Map cache key of a dashboard view. Preview maps (drawn from the month's sample) have their
+    own keys; the global latency map is drawn from the geofence stats in both modes.
+    """
+    sample = {'sample': True} if preview else {}
+    if map_type == 'global_latency':
+        return map_cache_key(map_type, customer_name, year_month, severe_on_top=True)
+    if map_type == 'dual_heatmap':
+        return map_cache_key(map_type, customer_name, year_month, threshold=threshold, bin_zoom=HEATMAP_BIN_ZOOM,
+                             **sample)
+    if map_type == 'geofence':
+        return map_cache_key(map_type, customer_name, year_month, geofence=geofence, threshold=threshold, **sample)
+    raise ValueError(f"Unknown map type: {map_type}")
+
+def render_map(map_type: str, customer_name: str, year_month: str, geofence: str = None,
+               threshold: int = LATENCY_THRESHOLD_HOURS, preview: bool = False):
+    """
+    Render a dashboard view from the processed month (from its stratified sample if preview)
+    and store it in the map cache. Returns the cache path, or None if the month's data is missing.
+    """
+    # Plotting (folium) is only needed to render, not to look maps up by key
+    from latency_maps import plot_latency, plot_dual_gps_heatmap, plot_gps_per_polygon
+
+    year, month = year_month.split('-')
+    month_name = datetime.strptime(month, "%m").strftime("%B")
+
+    data = load_month_data(year_month, customer_name, load_gps=(map_type == 'dual_heatmap' and not preview),
+                           columns=HEATMAP_COLUMNS)
+    if data is None:
+        return None
+    gps_df, polygons_df, polygon_dict = data
+    
+    # The global latency map is drawn from the geofence stats in both modes
+    preview = preview and map_type != 'global_latency'
+    if preview:
+        sample = load_gps_sample(year_month, customer_name)
+        if sample is None:
+            return None
+
+    if map_type == 'global_latency':
+        map = plot_latency(
+            polygon_dict=polygon_dict,
+            polygons_df=polygons_df,
+            severe_on_top=True
+        )
+    elif map_type == 'dual_heatmap':
+        land = sample[~sample['in_Sea']] if preview else gps_df[~gps_df['in_Sea']]
+        map = plot_dual_gps_heatmap(
+            df=land,
+            month=f"{month_name} {year}" + (" (preview)" if preview else ""),
+            latency_H=threshold,
+            zoom_start=2,
+            bin_zoom=HEATMAP_BIN_ZOOM,
+            weight_col='weight' if preview else None
+        )
+    elif map_type == 'geofence':
+        geofence_points = sample if preview else load_geofence_points(year_month, geofence, customer_name)
+        if geofence_points is None:
+            # Months processed before the per-geofence store existed
+            geofence_points, _, _ = load_month_data(year_month, customer_name,
+                                                    columns=['Lat', 'Lon', 't_diff', f'in_{customer_name}_polygon'])
+        map = plot_gps_per_polygon(
+            polygons_df=polygons_df,
+            geofence_name=geofence,
+            gps_df=geofence_points,
+            customer_name=customer_name,
+            base_zoom=16,
+            late_H=threshold,
+            polygon_dict=polygon_dict
+        )
+    else:
+        raise ValueError(f"Unknown map type: {map_type}")
+
+    return put_cached_map(get_map_key(map_type, customer_name, year_month, geofence, threshold, preview),
+                          map.get_root().render())
@@ -1,24 +1,41 @@
+from __future__ import annotations  # type hints name lazily imported modules (rtree, geopandas)
+
 from utils import get_default_month, prompt_for_month
 from config import BASE_DIR,RAW_DATA_DIR,PROCESSED_DATA_DIR,DEFAULT_CUSTOMER
+from catalog import CATALOG_PATH, build_catalog_entry, update_catalog
+from device_stats import compute_device_stats, save_device_stats
+from visits import compute_geofence_visits, save_geofence_visits
+from device_sets import compute_geofence_device_sets, count_devices, save_geofence_device_sets
+from dedup import new_dedup_state, deduplicate_gps, describe_dedup, format_dedup, load_ingest_counts, merge_dedup_counts
+from candidate_geofences import find_candidate_geofences, save_candidate_geofences
+from flushes import detect_backlog_flushes, add_flush_breakdown, summarize_flushes, save_backlog_flushes
+from month_data import save_month_arrow
+from sampling import stratified_sample, save_gps_sample
 
 # Essential libraries
 import pandas as pd
 import numpy as np
 import datetime
+import json
 import pickle
 import argparse
 from datetime import datetime
 import warnings
-import pycountry
+import hashlib
 
 # Spatial analysis
+import shapely
 from shapely.geometry import Point, Polygon
-from rtree import index
-
-import geopandas as gpd
 
 # Utilities
-from typing import List, Tuple, Dict, Optional
+from typing import List, Tuple, Dict, Optional, TYPE_CHECKING
+
+# Heavy dependencies are imported where they are used (rtree: spatial index, geopandas: sea
+# detection, pycountry: country names, pyarrow: per-geofence store) so that importing this
+# module for its lighter helpers stays fast
+if TYPE_CHECKING:
+    import geopandas as gpd
+    from rtree import index
 
 # from global_land_mask import globe
 
@@ -46,6 +63,7 @@ def convert_to_polygon(polygon_str: str) -> List[List[float]]:
     return [[coords[i], coords[i+1]] for i in range(0, len(coords), 2)]
 
 def build_spatial_index(polygons_df: pd.DataFrame) -> Tuple[index.Index, Dict]:
+    from rtree import index
     idx = index.Index()
     polygon_dict = {}
     
@@ -127,7 +145,115 @@ def build_spatial_index(polygons_df: pd.DataFrame) -> Tuple[index.Index, Dict]:
 #     # print(f"Loaded persistent spatial index for {customer_name}")
 #     return spatial_idx, polygon_dict
 
-def find_containing_polygon(points: np.ndarray, idx: index.Index, polygon_dict: Dict) -> List[Optional[str]]:
+# Grid pre-index labels for cells that are not fully inside a single geofence
+GRID_OUTSIDE = -1
+GRID_BOUNDARY = -2
+GRID_CELL_DEGREES = 0.0005  # ~55m, median geofence spans ~12x14 cells
+
+def get_geofence_version(polygons_df: pd.DataFrame) -> str:
+    """
+    Short content hash of the geofences. Changes whenever a geofence is added, removed or redrawn.
+    """
+    content = "\n".join(polygons_df['LocationName'].astype(str) + ";" + polygons_df['Polygon'].astype(str))
+    return hashlib.sha1(content.encode()).hexdigest()[:12]
+
+def _grid_cell_keys(lat: np.ndarray, lon: np.ndarray, cell_size: float) -> np.ndarray:
+    with np.errstate(invalid='ignore'):  # NaN coordinates are routed to exact tests by the caller
+        rows = np.floor((lat + 90.0) / cell_size).astype(np.int64)
+        cols = np.floor((lon + 180.0) / cell_size).astype(np.int64)
+    return rows * int(round(360.0 / cell_size)) + cols
+
+def build_geofence_grid(polygon_dict: Dict, cell_size: float = GRID_CELL_DEGREES) -> Dict:
+    """
+    Label every grid cell touched by a geofence as fully inside one geofence (its polygon_dict key)
+    or boundary (GRID_BOUNDARY). Cells not stored are outside every geofence.
+    Only cells in geofence bounding boxes are enumerated, so the grid is sparse.
+    """
+    n_cols = int(round(360.0 / cell_size))
+    all_keys, all_owners, all_inside = [], [], []
+    
+    for poly_key, (_, poly) in polygon_dict.items():
+        min_lat, min_lon, max_lat, max_lon = poly.bounds  # polygons are stored as (lat, lon)
+        row0, row1 = int(np.floor((min_lat + 90.0) / cell_size)), int(np.floor((max_lat + 90.0) / cell_size))
+        col0, col1 = int(np.floor((min_lon + 180.0) / cell_size)), int(np.floor((max_lon + 180.0) / cell_size))
+        rows, cols = np.meshgrid(np.arange(row0, row1 + 1), np.arange(col0, col1 + 1), indexing='ij')
+        rows, cols = rows.ravel(), cols.ravel()
+        
+        cell_lat = rows * cell_size - 90.0
+        cell_lon = cols * cell_size - 180.0
+        cells = shapely.box(cell_lat, cell_lon, cell_lat + cell_size, cell_lon + cell_size)
+        
+        touched = shapely.intersects(poly, cells)
+        inside = shapely.contains_properly(poly, cells[touched])
+        all_keys.append(rows[touched] * n_cols + cols[touched])
+        all_owners.append(np.full(touched.sum(), poly_key, dtype=np.int64))
+        all_inside.append(inside)
+    
+    keys = np.concatenate(all_keys)
+    owners = np.concatenate(all_owners)
+    inside = np.concatenate(all_inside)
+    
+    # A cell resolves to a geofence only if it is the single geofence touching it and covers it fully
+    order = np.argsort(keys, kind='stable')
+    keys, owners, inside = keys[order], owners[order], inside[order]
+    unique_keys, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+    labels = np.where((counts == 1) & inside[starts], owners[starts], GRID_BOUNDARY)
+    
+    return {'cell_size': cell_size, 'keys': unique_keys, 'labels': labels}
+
+def load_or_build_geofence_grid(polygons_df: pd.DataFrame, polygon_dict: Dict,
+                                customer_name: str = DEFAULT_CUSTOMER,
+                                cell_size: float = GRID_CELL_DEGREES) -> Dict:
+    """
+    Load the grid pre-index for the current geofence version, building and saving it on first use.
+    """
+    version = get_geofence_version(polygons_df)
+    grid_path = PROCESSED_DATA_DIR / f"geofence_grid_{customer_name}_{version}.npz"
+    
+    if grid_path.exists():
+        with np.load(grid_path) as data:
+            if float(data['cell_size']) == cell_size:
+                print(f"Loaded geofence grid index (version {version}) from: {grid_path}")
+                return {'cell_size': cell_size, 'keys': data['keys'], 'labels': data['labels']}
+    
+    print(f"Building geofence grid index (version {version})...")
+    grid = build_geofence_grid(polygon_dict, cell_size=cell_size)
+    np.savez(grid_path, cell_size=cell_size, keys=grid['keys'], labels=grid['labels'])
+    
+    n_inside = (grid['labels'] >= 0).sum()
+    print(f"Saved geofence grid index to: {grid_path} ({n_inside} inside / {len(grid['labels']) - n_inside} boundary cells)")
+    return grid
+
+def lookup_geofence_grid(points: np.ndarray, grid: Dict) -> np.ndarray:
+    """
+    Vectorized cell lookup. Returns the polygon_dict key for points in fully-inside cells,
+    GRID_OUTSIDE or GRID_BOUNDARY otherwise.
+    """
+    cell_keys = _grid_cell_keys(points[:, 0], points[:, 1], grid['cell_size'])
+    pos = np.searchsorted(grid['keys'], cell_keys)
+    pos = np.minimum(pos, len(grid['keys']) - 1)
+    found = grid['keys'][pos] == cell_keys
+    return np.where(found, grid['labels'][pos], GRID_OUTSIDE)
+
+def find_containing_polygon(points: np.ndarray, idx: index.Index, polygon_dict: Dict,
+                            grid: Optional[Dict] = None) -> List[Optional[str]]:
+    """
+    Name of the geofence containing each (lat, lon) point, or None.
+    With a grid pre-index only points in boundary cells (or NaN coordinates) get exact polygon tests.
+    """
+    if grid is not None:
+        labels = lookup_geofence_grid(points, grid)
+        labels[np.isnan(points).any(axis=1)] = GRID_BOUNDARY
+        
+        results = np.full(len(points), None, dtype=object)
+        inside = labels >= 0
+        names = {key: name for key, (name, _) in polygon_dict.items()}
+        results[inside] = pd.Series(labels[inside]).map(names).values
+        
+        boundary = np.flatnonzero(labels == GRID_BOUNDARY)
+        results[boundary] = find_containing_polygon(points[boundary], idx, polygon_dict)
+        return results.tolist()
+    
     results = []
     batch_size = 10000
     
@@ -146,13 +272,22 @@ def find_containing_polygon(points: np.ndarray, idx: index.Index, polygon_dict:
     
     return results
 
+LOW_MEMORY_CHUNK_ROWS = 500_000
+
 def process_gps_data(gps_data: pd.DataFrame, spatial_idx: index.Index, polygon_dict: Dict,
                      customer_name=DEFAULT_CUSTOMER,  
-                     land_geometry=None, buffer_degrees=0.1) -> pd.DataFrame:
+                     land_geometry=None, buffer_degrees=0.1,
+                     grid_index: Optional[Dict] = None,
+                     low_memory: bool = False) -> pd.DataFrame:
     """
     Process GPS data and create two columns -- if GPS-coordinate is in customer geofence and if at sea.
+    
+    With low_memory=True gps_data is modified in place instead of copied, PayloadData and the
+    sea join are processed in chunks, PayloadData is dropped once parsed, and the result is
+    downcast (float32 Lat/Lon, categorical names, int8 FPort). Polygon and sea tests still run
+    on float64 coordinates. Peak memory figures are in readME (`benchmark.py --memory`).
     """
-    df = gps_data.copy()
+    df = gps_data if low_memory else gps_data.copy()
     
     # Process timestamps
     receive_fmt = detect_date_format(df['ReceiveTimeUTC'])
@@ -162,36 +297,53 @@ def process_gps_data(gps_data: pd.DataFrame, spatial_idx: index.Index, polygon_d
     df['t_diff'] = df['ReceiveTimeUTC'] - df['EventTimeUTC']
     
     # Extract GPS coordinates
-    df['Lat'], df['Lon'] = extract_GPS(df['PayloadData'])
+    if low_memory:
+        # Parse in chunks so the intermediate string frame of str.extract stays small
+        lat = np.empty(len(df), dtype=np.float64)
+        lon = np.empty(len(df), dtype=np.float64)
+        for i in range(0, len(df), LOW_MEMORY_CHUNK_ROWS):
+            lat[i:i + LOW_MEMORY_CHUNK_ROWS], lon[i:i + LOW_MEMORY_CHUNK_ROWS] = extract_GPS(
+                df['PayloadData'].iloc[i:i + LOW_MEMORY_CHUNK_ROWS])
+        df.drop(columns=['PayloadData'], inplace=True)
+        df['Lat'], df['Lon'] = lat, lon
+    else:
+        df['Lat'], df['Lon'] = extract_GPS(df['PayloadData'])
     
     # Find containing polygons
     points = df[['Lat', 'Lon']].values
-    df[f'in_{customer_name}_polygon'] = find_containing_polygon(points, spatial_idx, polygon_dict)
+    df[f'in_{customer_name}_polygon'] = find_containing_polygon(points, spatial_idx, polygon_dict, grid=grid_index)
+    del points
     
     # If land geometry is provided, determine if points are in sea
     if land_geometry is not None:
-        # Convert points to GeoDataFrame for spatial join
-        points_gdf = gpd.GeoDataFrame(
-            geometry=gpd.points_from_xy(df['Lon'], df['Lat']),
-            crs=land_geometry.crs
-        )
-        points_gdf['original_idx'] = df.index
-        
+        import geopandas as gpd
         # Create buffered land
         buffered_land = gpd.GeoDataFrame(
             geometry=land_geometry.buffer(buffer_degrees),
             crs=land_geometry.crs
         )
         
-        # Spatial join
-        joined = gpd.sjoin(points_gdf, buffered_land, how='left', predicate='within')
-        
-        # Create a dictionary mapping from original index to sea status
-        is_sea_dict = {idx: pd.isna(land_idx) for idx, land_idx in 
-                       zip(joined['original_idx'], joined.index_right)}
-        
-        # Apply the dictionary to create the new column
-        df['in_Sea'] = df.index.map(lambda i: is_sea_dict.get(i, True))
+        # Spatial join in chunks (single chunk unless low_memory) -- points matching any land polygon
+        # are on land, the rest at sea
+        chunk_rows = LOW_MEMORY_CHUNK_ROWS if low_memory else max(len(df), 1)
+        on_land = np.zeros(len(df), dtype=bool)
+        for i in range(0, len(df), chunk_rows):
+            points_gdf = gpd.GeoDataFrame(
+                geometry=gpd.points_from_xy(df['Lon'].values[i:i + chunk_rows], df['Lat'].values[i:i + chunk_rows]),
+                crs=land_geometry.crs
+            )
+            joined = gpd.sjoin(points_gdf, buffered_land, how='inner', predicate='within')
+            on_land[i + joined.index.values] = True
+        df['in_Sea'] = ~on_land
+    
+    if low_memory:
+        df['Lat'] = df['Lat'].astype(np.float32)
+        df['Lon'] = df['Lon'].astype(np.float32)
+        for col in ['CustomerName', 'DeviceID', 'DeviceName', f'in_{customer_name}_polygon']:
+            if col in df.columns:
+                df[col] = df[col].astype('category')
+        if 'FPort' in df.columns:
+            df['FPort'] = pd.to_numeric(df['FPort'], downcast='integer')
     
     return df
 
@@ -205,33 +357,33 @@ def calculate_severity(latency_msg_ratio: float, total_messages: int, max_messag
 
 def get_geofence_stats(polygons_df: pd.DataFrame, gps_data: pd.DataFrame, 
                        customer_name=DEFAULT_CUSTOMER,
-                       latency_threshold: int = 24) -> pd.DataFrame:
+                       latency_threshold: int = 24,
+                       device_sets: Optional[Dict] = None) -> pd.DataFrame:
+    """
+    Report and device counts, latency ratios and severity per geofence. The devices themselves
+    are kept as integer-coded sets per month (device_sets.py), not in the stats; device_sets
+    are the month's sets at the same latency threshold (computed if not given).
+    """
     result_df = polygons_df.copy()
-    stats = []
-    
-    for polygon_name in polygons_df['LocationName']:
-        gps_in_polygon = gps_data[gps_data[f'in_{customer_name}_polygon'] == polygon_name]
-        polygon_latency = gps_in_polygon['t_diff'] >= pd.Timedelta(hours=latency_threshold)
-        
-        all_devices = gps_in_polygon['DeviceID'].unique()
-        latency_devices = gps_in_polygon.loc[polygon_latency, 'DeviceID'].unique()
-        
-        total_msgs = len(gps_in_polygon)
-        latency_msgs = polygon_latency.sum()
-        
-        stats.append({
-            'total_messages': total_msgs,
-            'total_devices': len(all_devices),
-            'latency_messages': latency_msgs,
-            'latency_devices': len(latency_devices),
-            'latency_messages_ratio': round(latency_msgs / total_msgs * 100 if total_msgs > 0 else 0, 1),
-            'latency_device_ratio': round(len(latency_devices) / len(all_devices) * 100 if len(all_devices) > 0 else 0, 1),
-            'device_ids': list(all_devices) if len(all_devices) > 0 else None,
-            'latency_device_ids': list(latency_devices) if len(latency_devices) > 0 else None
-        })
-    
-    for col in stats[0].keys():
-        result_df[col] = [stat[col] for stat in stats]
+    col = f'in_{customer_name}_polygon'
+    
+    in_geofence = gps_data[col].notna().values
+    latency = (gps_data['t_diff'] >= pd.Timedelta(hours=latency_threshold)).values[in_geofence]
+    messages = pd.Series(latency).groupby(gps_data[col].values[in_geofence].astype(str)).agg(['size', 'sum'])
+    messages = messages.reindex(result_df['LocationName'].astype(str)).fillna(0).astype(int)
+    if device_sets is None:
+        device_sets = compute_geofence_device_sets(gps_data, customer_name, latency_threshold)
+    total_devices, latency_devices = count_devices(device_sets, result_df['LocationName'].values.astype(str))
+    
+    result_df['total_messages'] = messages['size'].values
+    result_df['total_devices'] = total_devices
+    result_df['latency_messages'] = messages['sum'].values
+    result_df['latency_devices'] = latency_devices
+    with np.errstate(invalid='ignore', divide='ignore'):
+        result_df['latency_messages_ratio'] = np.where(
+            result_df['total_messages'] > 0, (result_df['latency_messages'] / result_df['total_messages'] * 100).round(1), 0.0)
+        result_df['latency_device_ratio'] = np.where(
+            result_df['total_devices'] > 0, (result_df['latency_devices'] / result_df['total_devices'] * 100).round(1), 0.0)
     
     max_messages = result_df['total_messages'].max()
     max_devices = result_df['total_devices'].max()
@@ -249,21 +401,69 @@ def get_country_name(country_code):
     """
     Convert a country code to a country name using pycountry.
     """
+    import pycountry
     try:
         country = pycountry.countries.get(alpha_2=country_code)
         return country.name if country else np.nan
     except:
         return np.nan
 
+def load_geofences(customer_name: str = DEFAULT_CUSTOMER) -> pd.DataFrame:
+    """
+    Load customer geofences from the raw data folder with country names attached.
+    """
+    filename = f"geofences_{customer_name}.csv"
+    filepath = RAW_DATA_DIR / filename
+    # print(f"Loading {customer_name} geofences data from: {filepath}")
+    if not filepath.exists():
+        raise FileNotFoundError(f"{customer_name} geofences data file not found: {filepath}")
+    polygons_df = pd.read_csv(filepath, usecols=['LocationName','CountryCode','Polygon'])
+    polygons_df['Country'] = polygons_df['CountryCode'].apply(get_country_name)
+    polygons_df = polygons_df[['LocationName', 'CountryCode', 'Country', 'Polygon']]
+    print(f"Loaded {len(polygons_df)} geofences for {customer_name} from {filepath}")
+    return polygons_df
+
+def load_land_geometry(land_path=BASE_DIR / "data" / "ne_10m_land.shp") -> gpd.GeoSeries:
+    """
+    Load Natural Earth land geometry used for sea detection.
+    """
+    import geopandas as gpd
+    print(f"Loaded land geometry from: {land_path}")
+    with warnings.catch_warnings():
+        warnings.filterwarnings('ignore', 'Geometry is in a geographic CRS')
+        land_geometry = gpd.read_file(land_path).geometry
+    return land_geometry
+
+def load_shared_resources(customer_name: str = DEFAULT_CUSTOMER,
+                          land_path: str = BASE_DIR / "data" / "ne_10m_land.shp",
+                          land_geometry=None) -> Dict:
+    """
+    Load the geofences, their spatial index and grid, and the land geometry once, for
+    processing several months (see get_processed_gpsData_and_polygons(shared=...)).
+    """
+    polygons_df = load_geofences(customer_name)
+    spatial_idx, polygon_dict = build_spatial_index(polygons_df)
+    return {
+        'polygons_df': polygons_df,
+        'spatial_idx': spatial_idx,
+        'polygon_dict': polygon_dict,
+        'grid_index': load_or_build_geofence_grid(polygons_df, polygon_dict, customer_name),
+        'land_geometry': land_geometry if land_geometry is not None else load_land_geometry(land_path),
+    }
+
 def get_processed_gpsData_and_polygons(
     year_month: str,
     customer_name: str = "Zim",
     land_path: str = BASE_DIR / "data" / "ne_10m_land.shp",
     buffer_degrees: float = 0.1,
-    latency_threshold: int = 24
-) -> Tuple[pd.DataFrame, pd.DataFrame, Dict]:
+    latency_threshold: int = 24,
+    low_memory: bool = False,
+    shared: Optional[Dict] = None
+) -> Tuple[pd.DataFrame, pd.DataFrame, Dict, Dict]:
     """
     Process GPS data with both polygon containment and sea detection in one call.
+    Returns the processed GPS data, geofence stats, polygon dict and geofence device sets.
+    shared: resources from load_shared_resources, to skip reloading them for every month.
     """
 
     year, month = year_month.split('-')
@@ -280,29 +480,33 @@ def get_processed_gpsData_and_polygons(
     gps_data = pd.read_csv(filepath)
     print(f"Loaded {len(gps_data)} GPS records for {customer_name} for {month_name} {year} from: {filepath}")
     
-    # Load polygons data
-    filename = f"geofences_{customer_name}.csv"
-    filepath = RAW_DATA_DIR / filename
-    # print(f"Loading {customer_name} geofences data from: {filepath}")
-    if not filepath.exists():
-        raise FileNotFoundError(f"{customer_name} geofences data file not found: {filepath}")
-    polygons_df = pd.read_csv(filepath, usecols=['LocationName','CountryCode','Polygon'])
-    polygons_df['Country'] = polygons_df['CountryCode'].apply(get_country_name)
-    polygons_df = polygons_df[['LocationName', 'CountryCode', 'Country', 'Polygon']]
-    print(f"Loaded {len(polygons_df)} geofences for {customer_name} from {filepath}")
-
-    print(f"Processing GPS data...")
-    
-    # Initialize spatial indexing for polygons
-    print(f"Building spatial index for geofences...")
-    # spatial_idx, polygon_dict = load_persistent_spatial_index(customer_name)
-    spatial_idx, polygon_dict = build_spatial_index(polygons_df)
+    # Raw files saved before ingest deduplication can still contain retransmitted duplicates
+    dedup_state = new_dedup_state()
+    gps_data = deduplicate_gps(gps_data, state=dedup_state)
+    dedup_counts = describe_dedup(dedup_state)
+    if dedup_counts['rows_out'] < dedup_counts['rows_in']:
+        print(format_dedup(dedup_counts))
+    # Month totals include the rows dropped when the raw file was queried
+    dedup_counts = merge_dedup_counts(load_ingest_counts(filepath), dedup_counts)
+    
+    if shared is not None:
+        # Geofences, indexes and land geometry loaded once for several months
+        polygons_df, spatial_idx, polygon_dict = shared['polygons_df'], shared['spatial_idx'], shared['polygon_dict']
+        grid_index, land_geometry = shared['grid_index'], shared['land_geometry']
+    else:
+        # Load polygons data
+        polygons_df = load_geofences(customer_name)
+
+        print(f"Processing GPS data...")
+        
+        # Initialize spatial indexing for polygons
+        print(f"Building spatial index for geofences...")
+        # spatial_idx, polygon_dict = load_persistent_spatial_index(customer_name)
+        spatial_idx, polygon_dict = build_spatial_index(polygons_df)
+        grid_index = load_or_build_geofence_grid(polygons_df, polygon_dict, customer_name)
 
-    # Load land geometry
-    print(f"Loaded land geometry from: {land_path}")
-    with warnings.catch_warnings():
-        warnings.filterwarnings('ignore', 'Geometry is in a geographic CRS')
-        land_geometry = gpd.read_file(land_path).geometry
+        # Load land geometry
+        land_geometry = load_land_geometry(land_path)
     
     # Process GPS data with both polygon and sea detection
     print("For each GPS-coordinate checking containing geofences and if at sea...")
@@ -311,16 +515,29 @@ def get_processed_gpsData_and_polygons(
         spatial_idx, 
         polygon_dict,
         land_geometry=land_geometry,
-        buffer_degrees=buffer_degrees
+        buffer_degrees=buffer_degrees,
+        grid_index=grid_index,
+        low_memory=low_memory
     )
     
-    # Calculate polygon statistics
+    # Flag reports that arrived in backlog flushes (buffered reports sent at once)
+    print("Detecting backlog flushes...")
+    processed_gps['flush_id'] = detect_backlog_flushes(processed_gps)
+    
+    # Calculate polygon statistics (device counts from the device sets saved with the month)
     print("Calculating geofence statistics...")
+    device_sets = compute_geofence_device_sets(processed_gps, customer_name, latency_threshold)
     polygon_stats = get_geofence_stats(
         polygons_df, 
         processed_gps,
-        latency_threshold=latency_threshold
+        customer_name=customer_name,
+        latency_threshold=latency_threshold,
+        device_sets=device_sets
     )
+    polygon_stats = add_flush_breakdown(polygon_stats, processed_gps, customer_name, latency_threshold)
+    
+    # Rows dropped at ingest and at load time, recorded in the month summary
+    processed_gps.attrs['deduplication'] = dedup_counts
     
     print("\nProcessing complete.\n================================\n")
     print(f"Total {len(processed_gps)} GPS records processed.")
@@ -332,9 +549,95 @@ def get_processed_gpsData_and_polygons(
     print(f"GPS-coordinated in {customer_name} geofences: {sum(cond_polygon)} ({round(sum(cond_polygon)/len(processed_gps)*100,2)})%.")
     print(f"In sea AND in {customer_name} geofences: {sum(cond_sea & cond_polygon)}. If not zero -- check.",end='\n\n')
 
-    return processed_gps, polygon_stats, polygon_dict
+    return processed_gps, polygon_stats, polygon_dict, device_sets
 
-def save_processed_data(processed_gps, polygon_stats, polygon_dict, customer_name, year_month):
+def save_geofence_points(processed_gps: pd.DataFrame, customer_name: str, year_month: str):
+    """
+    Save the points inside geofences as a Parquet file sorted by geofence, with one row group
+    per geofence, so a single geofence's rows can be read without loading the month.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    year, month = year_month.split('-')
+    col = f'in_{customer_name}_polygon'
+    
+    in_geofence = processed_gps.loc[processed_gps[col].notna()].drop(columns=['PayloadData'], errors='ignore')
+    in_geofence[col] = in_geofence[col].astype(str)
+    in_geofence = in_geofence.sort_values(col, kind='stable')
+    
+    table = pa.Table.from_pandas(in_geofence, preserve_index=False)
+    _, starts, counts = np.unique(in_geofence[col].values, return_index=True, return_counts=True)
+    
+    filepath = PROCESSED_DATA_DIR / f"geofence_points_{customer_name}_{year}_{month}.parquet"
+    with pq.ParquetWriter(filepath, table.schema) as writer:
+        for start, count in zip(starts, counts):
+            writer.write_table(table.slice(start, count))
+    
+    return filepath
+
+def _report_counts(gps_data: pd.DataFrame, latency: pd.Series) -> dict:
+    return {
+        'reports': int(len(gps_data)),
+        'devices': int(gps_data['DeviceID'].nunique()),
+        'latency_reports': int(latency.sum()),
+    }
+
+def _flush_counts(gps_data: pd.DataFrame, latency: pd.Series) -> dict:
+    flush = gps_data['flush_id'].values >= 0
+    return {
+        'flushes': int(gps_data.loc[flush, 'flush_id'].nunique()),
+        'reports': int(flush.sum()),
+        'latency_reports': int((latency.values & flush).sum()),
+    }
+
+def compute_month_summary(processed_gps: pd.DataFrame, polygon_stats: pd.DataFrame,
+                          customer_name: str = DEFAULT_CUSTOMER, latency_threshold: int = 24) -> dict:
+    """
+    Headline metrics of a processed month for the dashboard statistics cards: totals,
+    land/sea and per-country breakdowns, and latency percentiles of reports on land.
+    """
+    col = f'in_{customer_name}_polygon'
+    in_sea = processed_gps['in_Sea'].values.astype(bool)
+    latency = processed_gps['t_diff'] >= pd.Timedelta(hours=latency_threshold)
+    
+    land_hours = processed_gps.loc[~in_sea, 't_diff'].dt.total_seconds().dropna().values / 3600
+    percentiles = [50, 75, 90, 95, 99]
+    land_percentiles = np.percentile(land_hours, percentiles) if len(land_hours) else [np.nan] * len(percentiles)
+    
+    # Countries are known for reports inside geofences, via the geofence they fall in
+    in_geofence = processed_gps[col].notna()
+    geofence_country = polygon_stats.drop_duplicates('LocationName').set_index('LocationName')['Country']
+    countries = processed_gps.loc[in_geofence, col].astype(str).map(geofence_country).fillna('Unknown')
+    by_country = {
+        country: _report_counts(group, latency[group.index])
+        for country, group in processed_gps.loc[in_geofence].groupby(countries.values, sort=True)
+    }
+    
+    return {
+        'customer': customer_name,
+        'latency_threshold_hours': latency_threshold,
+        'total': _report_counts(processed_gps, latency),
+        'land': _report_counts(processed_gps[~in_sea], latency[~in_sea]),
+        'sea': _report_counts(processed_gps[in_sea], latency[in_sea]),
+        'in_geofences': _report_counts(processed_gps[in_geofence], latency[in_geofence]),
+        'total_geofences': int(len(polygon_stats)),
+        'geofences_with_data': int((polygon_stats['total_messages'] > 0).sum()),
+        'land_latency_percentiles_hours': {f"p{p}": round(float(v), 2) for p, v in zip(percentiles, land_percentiles)},
+        'by_country': by_country,
+        'deduplication': processed_gps.attrs.get('deduplication'),
+        'backlog_flushes': _flush_counts(processed_gps, latency) if 'flush_id' in processed_gps.columns else None,
+    }
+
+def save_month_summary(summary: dict, customer_name: str, year_month: str):
+    """Save the month summary next to the processed data as JSON."""
+    year, month = year_month.split('-')
+    filepath = PROCESSED_DATA_DIR / f"month_summary_{customer_name}_{year}_{month}.json"
+    with open(filepath, 'w') as f:
+        json.dump(summary, f, indent=2)
+    return filepath
+
+def save_processed_data(processed_gps, polygon_stats, polygon_dict, customer_name, year_month,
+                        device_sets=None, record_catalog=True):
     year, month = year_month.split('-')
     
     # Create processed directory if it doesn't exist
@@ -345,22 +648,87 @@ def save_processed_data(processed_gps, polygon_stats, polygon_dict, customer_nam
     gps_filepath = PROCESSED_DATA_DIR / gps_filename
     processed_gps.to_csv(gps_filepath, index=False)
     
+    # Save the same data typed and memory-mappable, the copy the dashboard and maps load
+    arrow_filepath = save_month_arrow(processed_gps, customer_name, year_month)
+    
     # Save geofence statistics as CSV
     stats_filename = f"geofence_stats_{customer_name}_{year}_{month}.csv"
     stats_filepath = PROCESSED_DATA_DIR / stats_filename
     polygon_stats.to_csv(stats_filepath, index=False)
     
+    # Save points partitioned by geofence for single-geofence views
+    points_filepath = save_geofence_points(processed_gps, customer_name, year_month)
+    
     # Save polygon dictionary
     dict_filename = f"polygon_dict_{customer_name}.pkl"
     dict_filepath = PROCESSED_DATA_DIR / dict_filename
     with open(dict_filepath, 'wb') as f:
         pickle.dump(polygon_dict, f)
     
+    # Save headline metrics so the dashboard statistics render without the GPS data
+    summary_filepath = save_month_summary(
+        compute_month_summary(processed_gps, polygon_stats, customer_name),
+        customer_name, 
+        year_month
+    )
+    
+    # Save geofence visits (arrival, departure, dwell and latency per device visit)
+    visits_filepath = save_geofence_visits(
+        compute_geofence_visits(processed_gps, customer_name),
+        customer_name,
+        year_month
+    )
+    
+    # Save clusters of land reports outside all geofences, as candidate new geofences
+    candidates_filepath = save_candidate_geofences(
+        find_candidate_geofences(processed_gps, polygon_dict, customer_name),
+        customer_name,
+        year_month
+    )
+    
+    # Save backlog flushes (months processed before flush detection have no flush_id)
+    flushes_filepath = None
+    if 'flush_id' in processed_gps.columns:
+        flushes_filepath = save_backlog_flushes(summarize_flushes(processed_gps, customer_name), customer_name, year_month)
+    
+    # Save the devices of each geofence as integer-coded sets against the month's device dictionary
+    # (the sets the geofence stats were counted from, computed here if not given)
+    if device_sets is None:
+        device_sets = compute_geofence_device_sets(processed_gps, customer_name)
+    device_sets_filepath = save_geofence_device_sets(device_sets, customer_name, year_month)
+    
+    # Save the stratified sample the dashboard preview mode draws from
+    sample_filepath = save_gps_sample(stratified_sample(processed_gps, customer_name), customer_name, year_month)
+    
+    # Save per-device aggregates, merged across months for the worst-device ranking
+    device_stats_filepath = save_device_stats(
+        compute_device_stats(processed_gps, year_month, customer_name),
+        customer_name,
+        year_month
+    )
+    
+    # Record the month in the catalog read by the dashboard (update_catalog locks it against
+    # other processes saving months; backfill.py records its months in the parent instead)
+    if record_catalog:
+        update_catalog(build_catalog_entry(customer_name, year_month, processed_gps, polygon_stats))
+    
     month_name = datetime.strptime(month, "%m").strftime("%B")
     print(f"Saved {month_name}'s processed data for {customer_name}:")
     print(f"  - GPS data: {gps_filepath} ({processed_gps.memory_usage(deep=True).sum() / (1024**2):.1f} MB)")
+    print(f"  - GPS data (Arrow): {arrow_filepath}")
     print(f"  - Geofence stats: {stats_filepath}")
+    print(f"  - Geofence device sets: {device_sets_filepath}")
+    print(f"  - GPS data by geofence: {points_filepath}")
     print(f"  - Polygon dict: {dict_filepath}")
+    print(f"  - Month summary: {summary_filepath}")
+    print(f"  - Geofence visits: {visits_filepath}")
+    print(f"  - Device aggregates: {device_stats_filepath}")
+    print(f"  - Preview sample: {sample_filepath}")
+    print(f"  - Candidate geofences: {candidates_filepath}")
+    if flushes_filepath:
+        print(f"  - Backlog flushes: {flushes_filepath}")
+    if record_catalog:
+        print(f"  - Catalog: {CATALOG_PATH}")
     
     return gps_filepath, stats_filepath, dict_filepath
 
@@ -380,6 +748,16 @@ def main():
        default="Zim",
        help="Customer name (default: Zim)"
    )
+   parser.add_argument(
+       "--no-maps", 
+       action="store_true",
+       help="Skip pre-rendering single-geofence maps after processing"
+   )
+   parser.add_argument(
+       "--low-memory", 
+       action="store_true",
+       help="Process in place with downcast columns to reduce peak memory"
+   )
    
    args = parser.parse_args()
 
@@ -393,9 +771,10 @@ def main():
    
    try:
        # Get and process the data
-       processed_gps, polygon_stats, polygon_dict = get_processed_gpsData_and_polygons(
+       processed_gps, polygon_stats, polygon_dict, device_sets = get_processed_gpsData_and_polygons(
            year_month, 
-           customer_name=args.customer
+           customer_name=args.customer,
+           low_memory=args.low_memory
        )
        
        # Save the processed data
@@ -405,8 +784,14 @@ def main():
                polygon_stats, 
                polygon_dict, 
                args.customer, 
-               year_month
+               year_month,
+               device_sets=device_sets
            )
+           
+           # Pre-render every single-geofence map for the dashboard
+           if not args.no_maps:
+               from render_geofence_maps import render_geofence_maps
+               render_geofence_maps(year_month, args.customer)
        else:
            print(f"No processed GPS data generated for {args.customer} in {year_month}")
            
@@ -6,8 +6,8 @@ TO ADD in the future
     3. Future-future: deal with increasing number of trackers (increased size of GPS data)
 """
 from utils import prompt_for_month, get_default_month
-from config import RAW_DATA_DIR
-from credentials import DB_NEW_CONFIG
+from config import RAW_DATA_DIR, QUERY_CHUNK_ROWS
+from dedup import new_dedup_state, deduplicate_gps, describe_dedup, format_dedup, save_ingest_counts
 
 # Essetial libraries
 import pandas as pd
@@ -15,9 +15,8 @@ import time
 import argparse
 from datetime import datetime
 
-# Database connectivity
-from sqlalchemy import create_engine
-from sqlalchemy.exc import OperationalError, SQLAlchemyError
+# Database connectivity (SQLAlchemy and credentials) is imported in the functions that
+# query, so importing this module for its helpers does not load the database stack
 
 # # Set up paths for the project
 # BASE_DIR = Path(__file__).parent.parent.absolute()
@@ -28,6 +27,7 @@ from sqlalchemy.exc import OperationalError, SQLAlchemyError
 
 def get_db_connection(config):
     """Creates and returns a SQLAlchemy database engine."""
+    from sqlalchemy import create_engine
     return create_engine(
         f"mssql+pyodbc://{config['username']}:{config['password']}@"
         f"{config['server']}/{config['database']}?"
@@ -35,9 +35,10 @@ def get_db_connection(config):
         f"&connection_timeout=30"
     )
 
-def get_gps_data(year_month, max_retries=3, retry_delay=5, customer_name="Zim"):
+def get_gps_data(year_month, max_retries=3, retry_delay=5, customer_name="Zim", chunk_rows=QUERY_CHUNK_ROWS):
     """
     Retrieves GPS data from the database for a specific month with retry logic.
+    Rows are streamed in chunks of chunk_rows and retransmitted duplicates dropped as they arrive (dedup.py).
     """
     # Parse year and month
     try:
@@ -81,6 +82,9 @@ def get_gps_data(year_month, max_retries=3, retry_delay=5, customer_name="Zim"):
     
     params = (f"{date_from} 00:00:00", f"{date_to} 00:00:00", customer_name)
     
+    from credentials import DB_NEW_CONFIG
+    from sqlalchemy.exc import OperationalError, SQLAlchemyError
+    
     # Initialize retry counter
     retry_count = 0
     last_error = None
@@ -94,8 +98,15 @@ def get_gps_data(year_month, max_retries=3, retry_delay=5, customer_name="Zim"):
             # Try to establish connection
             with engine.connect() as connection:
                 print(f"Fetching GPS data for {customer_name} from {date_from} to {date_to}...")
-                # Execute query and return results
-                return pd.read_sql(query, connection, params=params)
+                # Execute query and deduplicate each chunk against everything received before it
+                state = new_dedup_state()
+                chunks = [deduplicate_gps(chunk, state=state)
+                          for chunk in pd.read_sql(query, connection, params=params, chunksize=chunk_rows)]
+                print(format_dedup(describe_dedup(state)))
+                df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+                # Saved with the raw file by save_gps_data, for the month summary
+                df.attrs['deduplication'] = describe_dedup(state)
+                return df
                 
         except (OperationalError, SQLAlchemyError) as e:
             last_error = e
@@ -130,6 +141,7 @@ def save_gps_data(df, customer_name, year_month):
     filepath = RAW_DATA_DIR / filename
     
     df.to_csv(filepath, index=False)
+    save_ingest_counts(df.attrs.get('deduplication'), filepath)
 
     month_name = datetime.strptime(month, "%m").strftime("%B") # Convert month number to month name
     print(f"Saved {month_name}'s GPS data to {filepath}")
@@ -0,0 +1,159 @@
+"""
+Removal of retransmitted duplicate GPS reports at ingest.
+
+The Bursts table can return the same report several times (same DeviceID, EventTimeUTC and
+PayloadData). Rows are keyed by a vectorized hash of DeviceID and PayloadData; a row is a
+duplicate when another row with the same key has the same event time or, with a tolerance,
+when it is within DEDUP_TOLERANCE_SECONDS after the last kept report of the key
+(near-duplicates: the same position reported again a few seconds apart). Matches do not chain:
+a stationary device reporting every few seconds keeps one report per tolerance window.
+
+A state carries the (key, event time) pairs seen and the kept event times from one chunk to
+the next, so data streamed in chunks (data_query.py) is deduplicated across chunk and day
+boundaries.
+
+Counts dropped at ingest are saved next to the raw file (gps_data_<customer>_<year>_<month>.dedup.json)
+and merged with those dropped at processing into the month summary.
+"""
+from config import DEDUP_TOLERANCE_SECONDS
+
+import json
+import numpy as np
+import pandas as pd
+
+KEY_COLUMNS = ['DeviceID', 'PayloadData']
+
+def new_dedup_state() -> dict:
+    """
+    Empty state: sorted hashes of the (key, event time) pairs seen so far, the min/max kept event
+    time per key and tolerance-wide time bucket, and row counters.
+    """
+    return {'pairs': np.empty(0, dtype=np.uint64), 'buckets': pd.DataFrame(columns=['min', 'max'], dtype=np.int64),
+            'rows': 0, 'exact': 0, 'near': 0}
+
+def _hash_columns(**columns) -> np.ndarray:
+    return pd.util.hash_pandas_object(pd.DataFrame(columns), index=False).values
+
+def _event_times(df: pd.DataFrame, tolerance_seconds: float) -> np.ndarray:
+    if tolerance_seconds == 0 and not pd.api.types.is_datetime64_any_dtype(df['EventTimeUTC']):
+        # Exact matching only needs equal values: hash the strings instead of parsing them
+        return pd.util.hash_pandas_object(df['EventTimeUTC'], index=False).values.view(np.int64)
+    return pd.to_datetime(df['EventTimeUTC']).values.astype('datetime64[ns]').view(np.int64)
+
+def _in_sorted(values: np.ndarray, sorted_values: np.ndarray) -> np.ndarray:
+    pos = np.searchsorted(sorted_values, values)
+    return sorted_values[np.minimum(pos, len(sorted_values) - 1)] == values if len(sorted_values) \
+        else np.zeros(len(values), dtype=bool)
+
+def _near_duplicates(keys: np.ndarray, times: np.ndarray, tolerance_ns: int) -> np.ndarray:
+    """
+    Rows within tolerance_ns after the last kept row of their key (the first row of a key is kept).
+    Runs of rows at most tolerance_ns apart are cut where they exceed it from the kept row.
+    """
+    order = np.lexsort((times, keys))
+    sorted_keys, sorted_times = keys[order], times[order]
+    starts = np.ones(len(order), dtype=bool)
+    starts[1:] = (sorted_keys[1:] != sorted_keys[:-1]) | (np.diff(sorted_times) > tolerance_ns)
+    duplicate = ~starts
+
+    # Runs spanning more than the tolerance keep a row each time it is exceeded from the kept one
+    run_bounds = np.append(np.flatnonzero(starts), len(order))
+    long_runs = np.flatnonzero(sorted_times[run_bounds[1:] - 1] - sorted_times[run_bounds[:-1]] > tolerance_ns)
+    for run in long_runs:
+        run_times = sorted_times[run_bounds[run]:run_bounds[run + 1]]
+        kept = 0
+        while kept < len(run_times):
+            duplicate[run_bounds[run] + kept] = False
+            kept = np.searchsorted(run_times, run_times[kept] + tolerance_ns, side='right')
+
+    result = np.empty(len(order), dtype=bool)
+    result[order] = duplicate
+    return result
+
+def deduplicate_gps(df: pd.DataFrame, tolerance_seconds: float = DEDUP_TOLERANCE_SECONDS,
+                    state: dict = None) -> pd.DataFrame:
+    """
+    Drop duplicate reports, keeping the first of each. Pass the same state (new_dedup_state)
+    for consecutive chunks of one stream; the state also counts the rows dropped.
+    """
+    state = new_dedup_state() if state is None else state
+    state['rows'] += len(df)
+    if df.empty:
+        return df
+
+    keys = pd.util.hash_pandas_object(df[KEY_COLUMNS], index=False).values
+    times = _event_times(df, tolerance_seconds)
+
+    # Exact duplicates: (key, event time) hash already seen in this chunk or an earlier one
+    pairs = _hash_columns(key=keys, time=times)
+    seen_before = _in_sorted(pairs, state['pairs'])
+    exact = pd.Series(pairs).duplicated().values | seen_before
+    # Merge the chunk's new pairs into the sorted array (no re-sort of everything seen)
+    new_pairs = np.unique(pairs[~seen_before])
+    state['pairs'] = np.insert(state['pairs'], np.searchsorted(state['pairs'], new_pairs), new_pairs)
+    duplicate = exact.copy()
+
+    tolerance_ns = int(tolerance_seconds * 10**9)
+    if tolerance_ns:
+        # Across chunks: kept times of the key in the same or a neighbouring tolerance-wide bucket
+        bucket = times // tolerance_ns
+        seen = state['buckets']
+        for offset in (-1, 0, 1):
+            found = seen.reindex(_hash_columns(key=keys, bucket=bucket + offset))
+            distance = np.minimum(np.abs(times - found['min'].values), np.abs(times - found['max'].values))
+            duplicate |= found['min'].notna().values & (distance <= tolerance_ns)
+
+        # Within the chunk: close after the last kept report of the key
+        rows = np.flatnonzero(~duplicate)
+        duplicate[rows[_near_duplicates(keys[rows], times[rows], tolerance_ns)]] = True
+
+        kept = ~duplicate
+        chunk_buckets = pd.DataFrame({'min': times[kept], 'max': times[kept]},
+                                     index=_hash_columns(key=keys[kept], bucket=bucket[kept]))
+        if len(seen):
+            chunk_buckets = pd.concat([seen, chunk_buckets])
+        state['buckets'] = chunk_buckets.groupby(level=0).agg({'min': 'min', 'max': 'max'})
+
+    state['exact'] += int(exact.sum())
+    state['near'] += int((duplicate & ~exact).sum())
+    return df[~duplicate] if duplicate.any() else df
+
+def describe_dedup(state: dict) -> dict:
+    """Row counters of a dedup state, for reports and the month summary."""
+    dropped = state['exact'] + state['near']
+    return {'rows_in': state['rows'], 'rows_out': state['rows'] - dropped, 'exact_duplicates': state['exact'],
+            'near_duplicates': state['near']}
+
+def format_dedup(counts: dict) -> str:
+    return (f"Dropped {counts['exact_duplicates']:,} duplicate and {counts['near_duplicates']:,} near-duplicate "
+            f"reports of {counts['rows_in']:,} ({counts['rows_out']:,} unique)")
+
+def get_ingest_counts_path(raw_filepath):
+    return raw_filepath.with_suffix('.dedup.json')
+
+def save_ingest_counts(counts: dict, raw_filepath):
+    """Save the counts dropped at ingest next to the raw file (removed if counts is None)."""
+    filepath = get_ingest_counts_path(raw_filepath)
+    if counts is None:
+        filepath.unlink(missing_ok=True)
+        return None
+    with open(filepath, 'w') as f:
+        json.dump(counts, f, indent=2)
+    return filepath
+
+def load_ingest_counts(raw_filepath):
+    """Counts dropped at ingest of a raw file, or None for raw files saved without them."""
+    filepath = get_ingest_counts_path(raw_filepath)
+    if not filepath.exists():
+        return None
+    with open(filepath, 'r') as f:
+        return json.load(f)
+
+def merge_dedup_counts(ingest: dict, processing: dict) -> dict:
+    """Counts of a month over ingest (None if unknown) and processing, with both breakdowns."""
+    if ingest is None:
+        return {**processing, 'ingest': None, 'processing': processing}
+    return {'rows_in': ingest['rows_in'], 'rows_out': processing['rows_out'],
+            'exact_duplicates': ingest['exact_duplicates'] + processing['exact_duplicates'],
+            'near_duplicates': ingest['near_duplicates'] + processing['near_duplicates'],
+            'ingest': ingest, 'processing': processing}
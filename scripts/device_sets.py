@@ -0,0 +1,187 @@
+"""
+Devices reporting from each geofence, and the late ones among them, as compact integer sets.
+
+Each month has a device dictionary (its sorted DeviceIDs) and, per geofence, the sorted codes
+(positions in the dictionary) of the devices that reported from it and of those with a late
+report, stored back to back with offsets (CSR layout). data_processing.py saves them as
+data/processed/geofence_devices_<customer>_<year>_<month>.npz; geofence stats only keep the
+counts. Set operations work on the integer codes: unions across geofences, and devices in
+several months (codes translated through the months' dictionaries).
+
+TO RUN:
+    python ./scripts/device_sets.py --start 2024-01 --end 2024-03              # devices late in every month
+    python ./scripts/device_sets.py --start 2024-01 --end 2024-03 --geofence NLRTM-TDT
+    python ./scripts/device_sets.py --rebuild   # sets of months processed before they existed
+"""
+from config import PROCESSED_DATA_DIR, DEFAULT_CUSTOMER, LATENCY_THRESHOLD_HOURS
+from month_data import iter_processed_months, read_processed_month
+from catalog import build_catalog_entry, update_catalog
+
+import re
+import argparse
+import numpy as np
+import pandas as pd
+
+# Columns of the geofence stats written by months processed before device sets existed
+DEVICE_LIST_COLUMNS = ['device_ids', 'latency_device_ids']
+
+def get_device_sets_path(customer_name: str, year_month: str):
+    year, month = year_month.split('-')
+    return PROCESSED_DATA_DIR / f"geofence_devices_{customer_name}_{year}_{month}.npz"
+
+def _csr(group_codes: np.ndarray, device_codes: np.ndarray, n_groups: int, n_devices: int):
+    """Offsets and sorted distinct device codes per group (unique (group, device) pairs)."""
+    pairs = np.unique(group_codes.astype(np.int64) * n_devices + device_codes)
+    offsets = np.zeros(n_groups + 1, dtype=np.int64)
+    np.cumsum(np.bincount(pairs // n_devices, minlength=n_groups), out=offsets[1:])
+    code_dtype = np.uint16 if n_devices <= 2**16 else np.uint32
+    return offsets, (pairs % n_devices).astype(code_dtype)
+
+def compute_geofence_device_sets(processed_gps: pd.DataFrame, customer_name: str = DEFAULT_CUSTOMER,
+                                 latency_threshold: int = LATENCY_THRESHOLD_HOURS) -> dict:
+    """
+    Device dictionary and per-geofence device sets of a processed month: arrays 'devices'
+    (sorted DeviceIDs), 'geofences' (sorted names with reports), 'offsets'/'codes' (devices
+    per geofence) and 'latency_offsets'/'latency_codes' (devices with a late report there).
+    """
+    device_codes, devices = pd.factorize(processed_gps['DeviceID'].astype(str), sort=True)
+    col = f'in_{customer_name}_polygon'
+    in_geofence = processed_gps[col].notna().values
+    geofence_codes, geofences = pd.factorize(processed_gps[col].values[in_geofence].astype(str), sort=True)
+    device_codes = device_codes[in_geofence]
+    late = (processed_gps['t_diff'] >= pd.Timedelta(hours=latency_threshold)).values[in_geofence]
+
+    n_devices = max(len(devices), 1)
+    offsets, codes = _csr(geofence_codes, device_codes, len(geofences), n_devices)
+    latency_offsets, latency_codes = _csr(geofence_codes[late], device_codes[late], len(geofences), n_devices)
+    return {'devices': np.asarray(devices, dtype=str), 'geofences': np.asarray(geofences, dtype=str),
+            'offsets': offsets, 'codes': codes, 'latency_offsets': latency_offsets, 'latency_codes': latency_codes}
+
+def count_devices(device_sets: dict, geofence_names) -> tuple:
+    """Distinct devices and devices with late reports of each geofence (0 for geofences without reports)."""
+    geofences = device_sets['geofences']
+    pos = np.minimum(np.searchsorted(geofences, geofence_names), max(len(geofences) - 1, 0))
+    found = geofences[pos] == np.asarray(geofence_names, dtype=str) if len(geofences) else \
+        np.zeros(len(geofence_names), dtype=bool)
+    counts = []
+    for offsets in (device_sets['offsets'], device_sets['latency_offsets']):
+        counts.append(np.where(found, np.diff(offsets)[pos] if len(geofences) else 0, 0))
+    return tuple(counts)
+
+def save_geofence_device_sets(device_sets: dict, customer_name: str, year_month: str):
+    filepath = get_device_sets_path(customer_name, year_month)
+    np.savez_compressed(filepath, **device_sets)
+    return filepath
+
+def load_geofence_device_sets(year_month: str, customer_name: str = DEFAULT_CUSTOMER):
+    """Device sets of a month, or None if they were not computed."""
+    filepath = get_device_sets_path(customer_name, year_month)
+    if not filepath.exists():
+        return None
+    with np.load(filepath) as data:
+        return {key: data[key] for key in data.files}
+
+def get_device_sets_months(customer_name: str = DEFAULT_CUSTOMER) -> list:
+    """Months with saved device sets, oldest first."""
+    months = []
+    for path in PROCESSED_DATA_DIR.glob(f"geofence_devices_{customer_name}_*.npz"):
+        match = re.fullmatch(rf"geofence_devices_{re.escape(customer_name)}_(\d{{4}})_(\d{{2}})\.npz", path.name)
+        if match:
+            months.append(f"{match.group(1)}-{match.group(2)}")
+    return sorted(months)
+
+def device_codes(device_sets: dict, geofence_names=None, late: bool = False) -> np.ndarray:
+    """Sorted codes of the devices (late devices if late) of the given geofences, all geofences by default."""
+    offsets = device_sets['latency_offsets' if late else 'offsets']
+    codes = device_sets['latency_codes' if late else 'codes']
+    if geofence_names is None:
+        return np.unique(codes)
+    geofences = device_sets['geofences']
+    names = np.atleast_1d(np.asarray(geofence_names, dtype=str))
+    pos = np.searchsorted(geofences, names)
+    pos = pos[(pos < len(geofences)) & (geofences[np.minimum(pos, max(len(geofences) - 1, 0))] == names)]
+    if len(pos) == 1:
+        return codes[offsets[pos[0]]:offsets[pos[0] + 1]]
+    return np.unique(np.concatenate([codes[offsets[i]:offsets[i + 1]] for i in pos] or [codes[:0]]))
+
+def devices_in_all_months(customer_name: str, months: list, geofence_names=None, late: bool = True) -> np.ndarray:
+    """
+    DeviceIDs (sorted) in the sets of every given month: with late, devices late in the given
+    geofences (any geofence by default) in each of the months.
+    """
+    common = None
+    for year_month in months:
+        device_sets = load_geofence_device_sets(year_month, customer_name)
+        if device_sets is None:
+            raise FileNotFoundError(f"No device sets for {customer_name} {year_month} (run device_sets.py --rebuild)")
+        codes = device_codes(device_sets, geofence_names, late)
+        if common is None:
+            common = device_sets['devices'][codes]
+            continue
+        # Translate the devices so far into this month's codes and intersect the integer sets
+        dictionary = device_sets['devices']
+        pos = np.minimum(np.searchsorted(dictionary, common), max(len(dictionary) - 1, 0))
+        known = dictionary[pos] == common if len(dictionary) else np.zeros(len(common), dtype=bool)
+        common = dictionary[np.intersect1d(pos[known], codes, assume_unique=True)]
+    return common if common is not None else np.array([], dtype=str)
+
+def rebuild_geofence_device_sets(customer_name: str = None,
+                                 latency_threshold: int = LATENCY_THRESHOLD_HOURS) -> list:
+    """
+    Compute the device sets of every processed month from its processed GPS data, and drop the
+    device list columns from geofence stats saved before device sets existed (refreshing the
+    month's catalog entry).
+    """
+    saved = []
+    for customer, year_month, _ in iter_processed_months(customer_name):
+        print(f"Encoding geofence devices of {customer} {year_month}...")
+        processed_gps = read_processed_month(customer, year_month, ['DeviceID', 't_diff', f'in_{customer}_polygon'])
+        device_sets = compute_geofence_device_sets(processed_gps, customer, latency_threshold)
+        saved.append(save_geofence_device_sets(device_sets, customer, year_month))
+
+        year, month = year_month.split('-')
+        stats_path = PROCESSED_DATA_DIR / f"geofence_stats_{customer}_{year}_{month}.csv"
+        if stats_path.exists():
+            polygon_stats = pd.read_csv(stats_path)
+            if any(col in polygon_stats.columns for col in DEVICE_LIST_COLUMNS):
+                polygon_stats = polygon_stats.drop(columns=DEVICE_LIST_COLUMNS, errors='ignore')
+                polygon_stats.to_csv(stats_path, index=False)
+                update_catalog(build_catalog_entry(customer, year_month, polygon_stats=polygon_stats))
+    return saved
+
+def main():
+    """Main function to list the devices late in every month of a range."""
+
+    print("\n=== Geofence device sets ===")
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--customer", default=DEFAULT_CUSTOMER, help="Customer name (default: Zim)")
+    parser.add_argument("--start", help="First month [YYYY-MM] (default: first month with device sets)")
+    parser.add_argument("--end", help="Last month [YYYY-MM] (default: last month with device sets)")
+    parser.add_argument("--geofence", action="append", help="Only these geofences (repeatable, default: all)")
+    parser.add_argument("--all-reports", action="store_true", help="Devices reporting in every month, late or not")
+    parser.add_argument("--rebuild", action="store_true", help="Encode the device sets of every processed month")
+
+    args = parser.parse_args()
+
+    if args.rebuild:
+        saved = rebuild_geofence_device_sets(args.customer)
+        print(f"Saved device sets of {len(saved)} months")
+        return 0
+
+    months = [m for m in get_device_sets_months(args.customer)
+              if (not args.start or m >= args.start) and (not args.end or m <= args.end)]
+    if not months:
+        print(f"No device sets found for {args.customer} (run with --rebuild for older months)")
+        return 1
+
+    devices = devices_in_all_months(args.customer, months, args.geofence, late=not args.all_reports)
+    where = ", ".join(args.geofence) if args.geofence else "any geofence"
+    kind = "reporting" if args.all_reports else "late"
+    print(f"{len(devices)} devices {kind} in {where} in each of {len(months)} months ({months[0]} to {months[-1]}):")
+    for device_id in devices:
+        print(f"  {device_id}")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
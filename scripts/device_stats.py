@@ -0,0 +1,198 @@
+"""
+Device-level latency aggregates across months: which trackers are chronically late.
+
+When a month is saved, data_processing.py also saves one row per device with mergeable
+aggregates (report and late counts, latency sum/count/max, geofences reported from).
+A ranking over any range of months merges those rows (sums, maxima, set unions) without
+reading the GPS data again.
+
+TO RUN:
+    python ./scripts/device_stats.py --start 2024-01 --end 2024-12 --top 20
+    python ./scripts/device_stats.py --start 2024-01 --end 2024-12 --sort-by late_ratio --min-reports 100
+    python ./scripts/device_stats.py --rebuild   # aggregates of months processed before they existed
+"""
+from config import PROCESSED_DATA_DIR, DEFAULT_CUSTOMER, LATENCY_THRESHOLD_HOURS
+from month_data import iter_processed_months, read_processed_month
+
+import re
+import argparse
+import numpy as np
+import pandas as pd
+
+SORT_COLUMNS = {
+    'late_reports': "Late reports",
+    'late_ratio': "Late reports (%)",
+    'late_months': "Months with late reports",
+    'mean_latency_hours': "Mean latency (hours)",
+    'max_latency_hours': "Max latency (hours)",
+}
+GEOFENCE_COLUMNS = ['geofences', 'late_geofences']
+
+def get_device_stats_path(customer_name: str, year_month: str):
+    year, month = year_month.split('-')
+    return PROCESSED_DATA_DIR / f"device_stats_{customer_name}_{year}_{month}.parquet"
+
+def _geofence_sets(device_ids: np.ndarray, geofences: pd.Series) -> pd.Series:
+    """Sorted list of distinct geofences per device (only devices with any)."""
+    known = geofences.notna().values
+    pairs = pd.DataFrame({'DeviceID': device_ids[known], 'geofence': geofences.values[known].astype(str)})
+    pairs = pairs.drop_duplicates().sort_values(['DeviceID', 'geofence'])
+    return pairs.groupby('DeviceID', sort=False)['geofence'].agg(list)
+
+def compute_device_stats(processed_gps: pd.DataFrame, year_month: str, customer_name: str = DEFAULT_CUSTOMER,
+                         latency_threshold: int = LATENCY_THRESHOLD_HOURS) -> pd.DataFrame:
+    """Per-device aggregates of one processed month (one row per DeviceID)."""
+    col = f'in_{customer_name}_polygon'
+    device_ids = processed_gps['DeviceID'].astype(str).values
+    hours = processed_gps['t_diff'].dt.total_seconds().values / 3600
+    late = hours >= latency_threshold  # NaN latencies are never late
+
+    reports = pd.DataFrame({'DeviceID': device_ids, 'hours': hours, 'late': late})
+    grouped = reports.groupby('DeviceID', sort=True)
+    stats = pd.DataFrame({
+        'reports': grouped.size(),
+        'late_reports': grouped['late'].sum(),
+        'latency_count': grouped['hours'].count(),
+        'latency_sum_hours': grouped['hours'].sum(),
+        'max_latency_hours': grouped['hours'].max(),
+    })
+    if 'DeviceName' in processed_gps.columns:
+        names = pd.Series(processed_gps['DeviceName'].astype(str).values, index=device_ids)
+        stats.insert(0, 'DeviceName', names[~names.index.duplicated(keep='last')].reindex(stats.index))
+    stats['months'] = 1
+    stats['late_months'] = (stats['late_reports'] > 0).astype(int)
+    stats['first_month'] = stats['last_month'] = year_month
+    stats['latency_threshold_hours'] = latency_threshold
+
+    stats['geofences'] = _geofence_sets(device_ids, processed_gps[col])
+    stats['late_geofences'] = _geofence_sets(device_ids[late], processed_gps[col][late])
+    for column in GEOFENCE_COLUMNS:
+        stats[column] = [value if isinstance(value, list) else [] for value in stats[column]]
+
+    return stats.reset_index()
+
+def save_device_stats(device_stats: pd.DataFrame, customer_name: str, year_month: str):
+    filepath = get_device_stats_path(customer_name, year_month)
+    device_stats.to_parquet(filepath, index=False)
+    return filepath
+
+def get_device_stats_months(customer_name: str) -> list:
+    """Months with saved device aggregates, oldest first."""
+    months = []
+    for path in sorted(PROCESSED_DATA_DIR.glob(f"device_stats_{customer_name}_*.parquet")):
+        match = re.fullmatch(rf"device_stats_{re.escape(customer_name)}_(\d{{4}})_(\d{{2}})\.parquet", path.name)
+        if match:
+            months.append(f"{match.group(1)}-{match.group(2)}")
+    return months
+
+def load_device_stats(customer_name: str, months: list) -> list:
+    """Device aggregates of the given months (months without aggregates are skipped)."""
+    frames = []
+    for year_month in months:
+        filepath = get_device_stats_path(customer_name, year_month)
+        if filepath.exists():
+            frames.append(pd.read_parquet(filepath))
+    return frames
+
+def merge_device_stats(frames: list) -> pd.DataFrame:
+    """
+    Merge per-device aggregates of several months (or of already merged ranges) into one row
+    per device, with the derived late ratio and mean latency.
+    """
+    df = pd.concat(frames, ignore_index=True)
+    thresholds = df['latency_threshold_hours'].unique()
+    if len(thresholds) > 1:
+        raise ValueError(f"Device aggregates use different latency thresholds: {sorted(thresholds)}")
+
+    aggregations = {
+        'reports': ('reports', 'sum'),
+        'late_reports': ('late_reports', 'sum'),
+        'latency_count': ('latency_count', 'sum'),
+        'latency_sum_hours': ('latency_sum_hours', 'sum'),
+        'max_latency_hours': ('max_latency_hours', 'max'),
+        'months': ('months', 'sum'),
+        'late_months': ('late_months', 'sum'),
+        'first_month': ('first_month', 'min'),
+        'last_month': ('last_month', 'max'),
+        'latency_threshold_hours': ('latency_threshold_hours', 'first'),
+    }
+    if 'DeviceName' in df.columns:
+        # Frames are in month order, so the latest name wins
+        aggregations = {'DeviceName': ('DeviceName', 'last'), **aggregations}
+    merged = df.groupby('DeviceID', sort=True).agg(**aggregations)
+
+    for column in GEOFENCE_COLUMNS:
+        exploded = df[['DeviceID', column]].explode(column).dropna()
+        merged[column] = _geofence_sets(exploded['DeviceID'].values, exploded[column])
+        merged[column] = [value if isinstance(value, list) else [] for value in merged[column]]
+
+    merged['late_ratio'] = (merged['late_reports'] / merged['reports'] * 100).round(2)
+    merged['mean_latency_hours'] = (merged['latency_sum_hours'] / merged['latency_count']).round(2)
+    return merged.reset_index()
+
+def top_devices(customer_name: str, months: list, n: int = 20, sort_by: str = 'late_reports',
+                min_reports: int = 1) -> pd.DataFrame:
+    """
+    The n devices with the worst latency over the given months, from the saved aggregates.
+    Devices with fewer than min_reports reports are left out (ratios of a few reports are noise).
+    """
+    if sort_by not in SORT_COLUMNS:
+        raise ValueError(f"Unknown sort column: {sort_by} (one of {', '.join(SORT_COLUMNS)})")
+    frames = load_device_stats(customer_name, months)
+    if not frames:
+        return pd.DataFrame()
+
+    merged = merge_device_stats(frames)
+    merged = merged[merged['reports'] >= min_reports].assign(
+        geofence_count=lambda df: df['geofences'].str.len(),
+        late_geofence_count=lambda df: df['late_geofences'].str.len()
+    )
+    return merged.sort_values([sort_by, 'late_reports', 'DeviceID'], ascending=[False, False, True]).head(n)
+
+def rebuild_device_stats(customer_name: str = None, latency_threshold: int = LATENCY_THRESHOLD_HOURS) -> list:
+    """Compute the aggregates of every processed month from its processed GPS file."""
+    saved = []
+    for customer, year_month, _ in iter_processed_months(customer_name):
+        print(f"Aggregating devices of {customer} {year_month}...")
+        processed_gps = read_processed_month(customer, year_month,
+                                             ['DeviceID', 'DeviceName', 't_diff', f'in_{customer}_polygon'])
+        device_stats = compute_device_stats(processed_gps, year_month, customer, latency_threshold)
+        saved.append(save_device_stats(device_stats, customer, year_month))
+    return saved
+
+def main():
+    """Main function to rank the devices with the worst latency over a range of months."""
+
+    print("\n=== Worst-latency devices ===")
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--customer", default=DEFAULT_CUSTOMER, help="Customer name (default: Zim)")
+    parser.add_argument("--start", help="First month [YYYY-MM] (default: first processed month)")
+    parser.add_argument("--end", help="Last month [YYYY-MM] (default: last processed month)")
+    parser.add_argument("--top", type=int, default=20, help="Number of devices to show (default: 20)")
+    parser.add_argument("--sort-by", choices=list(SORT_COLUMNS), default='late_reports', help="Ranking column")
+    parser.add_argument("--min-reports", type=int, default=1, help="Leave out devices with fewer reports")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the aggregates of every processed month")
+
+    args = parser.parse_args()
+
+    if args.rebuild:
+        saved = rebuild_device_stats(args.customer)
+        print(f"Saved device aggregates of {len(saved)} months")
+        return 0
+
+    months = [m for m in get_device_stats_months(args.customer)
+              if (not args.start or m >= args.start) and (not args.end or m <= args.end)]
+    if not months:
+        print(f"No device aggregates found for {args.customer} (run with --rebuild for older months)")
+        return 1
+
+    ranking = top_devices(args.customer, months, n=args.top, sort_by=args.sort_by, min_reports=args.min_reports)
+    print(f"{args.customer}, {months[0]} to {months[-1]} ({len(months)} months), sorted by {SORT_COLUMNS[args.sort_by]}:\n")
+    columns = ['DeviceID', 'reports', 'late_reports', 'late_ratio', 'late_months', 'mean_latency_hours',
+               'max_latency_hours', 'late_geofence_count']
+    print(ranking[columns].round(2).to_string(index=False))
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,123 @@
+"""
+Backlog flushes: a device that was out of coverage dumps its buffered reports at once, so many
+reports with different event times arrive within moments of each other. Their latency comes
+from the outage, not from slow delivery.
+
+Reports are sorted by device and receive time; consecutive reports received at most
+FLUSH_RECEIVE_GAP_SECONDS apart form a receive burst, and a burst of at least FLUSH_MIN_REPORTS
+reports whose event times span at least FLUSH_MIN_EVENT_SPAN_HOURS is a flush.
+
+Processing stores the flush of each report in the flush_id column (-1 for steady reports),
+splits the late reports of every geofence into flush and steady ones in the geofence stats,
+and saves the flushes as data/processed/backlog_flushes_<customer>_<year>_<month>.parquet.
+"""
+from config import (
+    PROCESSED_DATA_DIR,
+    DEFAULT_CUSTOMER,
+    LATENCY_THRESHOLD_HOURS,
+    FLUSH_RECEIVE_GAP_SECONDS,
+    FLUSH_MIN_REPORTS,
+    FLUSH_MIN_EVENT_SPAN_HOURS
+)
+
+import numpy as np
+import pandas as pd
+
+def get_flushes_path(customer_name: str, year_month: str):
+    year, month = year_month.split('-')
+    return PROCESSED_DATA_DIR / f"backlog_flushes_{customer_name}_{year}_{month}.parquet"
+
+def detect_backlog_flushes(processed_gps: pd.DataFrame, receive_gap_seconds: float = FLUSH_RECEIVE_GAP_SECONDS,
+                           min_reports: int = FLUSH_MIN_REPORTS,
+                           min_event_span_hours: float = FLUSH_MIN_EVENT_SPAN_HOURS) -> np.ndarray:
+    """Flush id of every report (numbered 0..k-1 by device and receive time), -1 for steady reports."""
+    flush_id = np.full(len(processed_gps), -1, dtype=np.int32)
+    if processed_gps.empty:
+        return flush_id
+
+    device_codes, _ = pd.factorize(processed_gps['DeviceID'])
+    receive_ns = processed_gps['ReceiveTimeUTC'].values.astype('datetime64[ns]').view(np.int64)
+    event_ns = processed_gps['EventTimeUTC'].values.astype('datetime64[ns]').view(np.int64)
+
+    # Receive bursts: same device, received within the gap of the previous report
+    order = np.lexsort((receive_ns, device_codes))
+    sorted_receive = receive_ns[order]
+    new_burst = np.ones(len(order), dtype=bool)
+    new_burst[1:] = ((device_codes[order][1:] != device_codes[order][:-1])
+                     | (np.diff(sorted_receive) > receive_gap_seconds * 10**9))
+    starts = np.flatnonzero(new_burst)
+    burst = np.cumsum(new_burst) - 1
+
+    # Flushes: bursts with enough reports covering a long enough stretch of event time
+    sorted_event = event_ns[order]
+    size = np.diff(np.append(starts, len(order)))
+    span = np.maximum.reduceat(sorted_event, starts) - np.minimum.reduceat(sorted_event, starts)
+    is_flush = (size >= min_reports) & (span >= min_event_span_hours * 3600 * 10**9)
+
+    burst_flush_id = np.full(len(starts), -1, dtype=np.int32)
+    burst_flush_id[is_flush] = np.arange(is_flush.sum(), dtype=np.int32)
+    flush_id[order] = burst_flush_id[burst]
+    return flush_id
+
+def summarize_flushes(processed_gps: pd.DataFrame, customer_name: str = DEFAULT_CUSTOMER,
+                      latency_threshold: int = LATENCY_THRESHOLD_HOURS) -> pd.DataFrame:
+    """One row per flush: device, size, receive window, event time span and latency."""
+    flushed = processed_gps[processed_gps['flush_id'] >= 0]
+    hours = flushed['t_diff'].dt.total_seconds() / 3600
+    flushes = pd.DataFrame({
+        'flush_id': flushed['flush_id'].values,
+        'DeviceID': flushed['DeviceID'].astype(str).values,
+        'ReceiveTimeUTC': flushed['ReceiveTimeUTC'].values,
+        'EventTimeUTC': flushed['EventTimeUTC'].values,
+        'hours': hours.values,
+        'late': (hours >= latency_threshold).values,
+        'in_geofence': flushed[f'in_{customer_name}_polygon'].notna().values,
+    }).groupby('flush_id', sort=True).agg(
+        DeviceID=('DeviceID', 'first'),
+        reports=('hours', 'size'),
+        late_reports=('late', 'sum'),
+        geofence_reports=('in_geofence', 'sum'),
+        receive_start=('ReceiveTimeUTC', 'min'),
+        receive_end=('ReceiveTimeUTC', 'max'),
+        event_start=('EventTimeUTC', 'min'),
+        event_end=('EventTimeUTC', 'max'),
+        max_latency_hours=('hours', 'max'),
+    )
+    flushes['receive_seconds'] = (flushes['receive_end'] - flushes['receive_start']).dt.total_seconds()
+    flushes['event_span_hours'] = (flushes['event_end'] - flushes['event_start']).dt.total_seconds() / 3600
+    return flushes.reset_index()
+
+def add_flush_breakdown(polygon_stats: pd.DataFrame, processed_gps: pd.DataFrame,
+                        customer_name: str = DEFAULT_CUSTOMER,
+                        latency_threshold: int = LATENCY_THRESHOLD_HOURS) -> pd.DataFrame:
+    """
+    Geofence stats with the reports and late reports of each geofence that arrived in backlog
+    flushes or steadily, and the share of late reports due to flushes.
+    """
+    col = f'in_{customer_name}_polygon'
+    in_geofence = processed_gps[col].notna().values
+    late = (processed_gps['t_diff'] >= pd.Timedelta(hours=latency_threshold)).values[in_geofence]
+    flush = (processed_gps['flush_id'].values >= 0)[in_geofence]
+    counts = pd.DataFrame({
+        'LocationName': processed_gps[col].values[in_geofence].astype(str),
+        'flush_messages': flush,
+        'flush_latency_messages': late & flush,
+        'steady_latency_messages': late & ~flush,
+    }).groupby('LocationName').sum()
+
+    result_df = polygon_stats.join(counts, on='LocationName')
+    result_df[counts.columns] = result_df[counts.columns].fillna(0).astype(int)
+    latency_messages = result_df['flush_latency_messages'] + result_df['steady_latency_messages']
+    result_df['flush_latency_share'] = (result_df['flush_latency_messages'] * 100
+                                        / latency_messages.where(latency_messages > 0)).round(1).fillna(0)
+    return result_df
+
+def save_backlog_flushes(flushes: pd.DataFrame, customer_name: str, year_month: str):
+    filepath = get_flushes_path(customer_name, year_month)
+    flushes.to_parquet(filepath, index=False)
+    return filepath
+
+def load_backlog_flushes(year_month: str, customer_name: str = DEFAULT_CUSTOMER):
+    """Backlog flushes of a month, or None if they were not computed."""
+    filepath = get_flushes_path(customer_name, year_month)
+    return pd.read_parquet(filepath) if filepath.exists() else None
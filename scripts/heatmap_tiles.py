@@ -0,0 +1,249 @@
+"""
+Pre-rendered raster tile pyramid (z/x/y PNG) for the dual latency/normal heatmap.
+
+Tiles are rendered from the processed month data with NumPy (histogram per tile, separable
+Gaussian blur, gradient lookup table) in a process pool, and served from disk by a small
+local HTTP server so the browser never holds raw points.
+
+TO RUN:
+    python ./scripts/heatmap_tiles.py --manual --max-zoom 14
+"""
+from utils import get_default_month, prompt_for_month
+from config import TILES_DIR, TILE_SERVER_PORT, DEFAULT_CUSTOMER, LATENCY_THRESHOLD_HOURS
+
+import os
+import json
+import shutil
+import argparse
+import threading
+import numpy as np
+import pandas as pd
+from itertools import islice
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+TILE_SIZE = 256
+BLUR_SIGMA = 6   # pixels, close to the radius=15/blur=15 look of the embedded HeatMap
+TILE_PAD = 3 * BLUR_SIGMA
+MIN_OPACITY = 0.3
+TILE_BATCH = 32          # tiles rendered per worker call
+PENDING_BATCHES = 2      # batches in flight per worker (bounds the points held in memory)
+
+LAYER_GRADIENTS = {
+    'latency': {0.4: '#DC143C', 0.65: '#FF4500', 0.85: '#FFD700'},
+    'normal': {0.4: '#4169E1', 0.65: '#20B2AA', 0.85: '#00FF00'},
+}
+
+def get_tiles_dir(customer_name: str, year_month: str):
+    """Directory holding the tile pyramid of one customer month."""
+    year, month = year_month.split('-')
+    return TILES_DIR / f"{customer_name}_{year}_{month}"
+
+def gradient_lut(gradient: dict) -> np.ndarray:
+    """256-entry RGB lookup table interpolated from a {stop: '#RRGGBB'} gradient."""
+    stops = sorted(gradient)
+    rgb = np.array([[int(gradient[s][i:i + 2], 16) for i in (1, 3, 5)] for s in stops], dtype=np.float64)
+    x = np.linspace(0, 1, 256)
+    return np.column_stack([np.interp(x, stops, rgb[:, c]) for c in range(3)]).astype(np.uint8)
+
+def to_global_pixels(lat: np.ndarray, lon: np.ndarray, zoom: int):
+    """Web Mercator global pixel coordinates at the given zoom level."""
+    lat = np.clip(lat, -85.0511, 85.0511)
+    scale = TILE_SIZE * 2 ** zoom
+    px = (lon + 180.0) / 360.0 * scale
+    lat_rad = np.radians(lat)
+    py = (1.0 - np.log(np.tan(lat_rad) + 1.0 / np.cos(lat_rad)) / np.pi) / 2.0 * scale
+    return px, py
+
+def gaussian_blur_matrix(sigma: float = BLUR_SIGMA) -> np.ndarray:
+    """
+    Banded (TILE_SIZE, TILE_SIZE + 2 * TILE_PAD) matrix B such that B @ counts @ B.T is the
+    separable Gaussian blur of a padded tile histogram, cropped to the tile.
+    """
+    out = np.arange(TILE_SIZE)[:, None] + TILE_PAD
+    src = np.arange(TILE_SIZE + 2 * TILE_PAD)[None, :]
+    dist = src - out
+    return np.where(np.abs(dist) <= TILE_PAD, np.exp(-dist ** 2 / (2 * sigma ** 2)), 0.0)
+
+def _render_tile(task, lut: np.ndarray, blur: np.ndarray):
+    """Render one tile from its points (tile-local pixel coords including the padding margin)."""
+    px, py, norm, out_path = task
+    size = TILE_SIZE + 2 * TILE_PAD
+    cols = np.clip(px.astype(np.int64), 0, size - 1)
+    rows = np.clip(py.astype(np.int64), 0, size - 1)
+    counts = np.bincount(rows * size + cols, minlength=size * size).reshape(size, size).astype(np.float64)
+
+    blurred = blur @ counts @ blur.T
+
+    value = np.clip(np.log1p(blurred) / norm, 0, 1)
+    visible = value > 0.02
+    if not visible.any():
+        return False
+
+    rgba = np.zeros((TILE_SIZE, TILE_SIZE, 4), dtype=np.uint8)
+    rgba[..., :3] = lut[(value * 255).astype(np.uint8)]
+    rgba[..., 3] = np.where(visible, (MIN_OPACITY + (1 - MIN_OPACITY) * value) * 255, 0).astype(np.uint8)
+
+    from PIL import Image
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    Image.fromarray(rgba).save(out_path, compress_level=1)
+    return True
+
+def _render_tiles(batch: list, lut: np.ndarray, blur: np.ndarray) -> int:
+    """Render a batch of tiles, returns the number written."""
+    return sum(_render_tile(task, lut, blur) for task in batch)
+
+def render_zoom_tasks(executor, render, tasks, max_pending: int) -> int:
+    """
+    Render tasks in batches of TILE_BATCH, keeping at most max_pending batches submitted, so
+    the tasks of a zoom level are generated as workers free up instead of all at once.
+    """
+    written, pending = 0, set()
+    while batch := list(islice(tasks, TILE_BATCH)):
+        if len(pending) >= max_pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            written += sum(future.result() for future in done)
+        pending.add(executor.submit(render, batch))
+    return written + sum(future.result() for future in pending)
+
+def iter_zoom_tasks(lat: np.ndarray, lon: np.ndarray, zoom: int, layer_dir):
+    """
+    Yield one render task per occupied tile at a zoom level. Each task carries the points of
+    the tile and of the padding margin around it (from neighbour tiles) so blur has no seams.
+    """
+    px, py = to_global_pixels(lat, lon, zoom)
+    n_tiles = 2 ** zoom
+    tx = np.floor(px / TILE_SIZE).astype(np.int64).clip(0, n_tiles - 1)
+    ty = np.floor(py / TILE_SIZE).astype(np.int64).clip(0, n_tiles - 1)
+
+    # Normalize intensity per zoom by the busiest blur-radius block
+    block_keys = np.floor(px / BLUR_SIGMA).astype(np.int64) * (n_tiles * TILE_SIZE) + np.floor(py / BLUR_SIGMA).astype(np.int64)
+    norm = np.log1p(np.unique(block_keys, return_counts=True)[1].max() * 2)
+
+    order = np.lexsort((ty, tx))
+    px, py, tx, ty = px[order], py[order], tx[order], ty[order]
+    keys = tx * n_tiles + ty
+    occupied, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+    span = dict(zip(occupied.tolist(), zip(starts.tolist(), (starts + counts).tolist())))
+
+    for key in occupied.tolist():
+        x, y = divmod(key, n_tiles)
+        x0, y0 = x * TILE_SIZE - TILE_PAD, y * TILE_SIZE - TILE_PAD
+        parts_x, parts_y = [], []
+        for nx in (x - 1, x, x + 1):
+            for ny in (y - 1, y, y + 1):
+                if not (0 <= nx < n_tiles and 0 <= ny < n_tiles) or (nx * n_tiles + ny) not in span:
+                    continue
+                a, b = span[nx * n_tiles + ny]
+                lx, ly = px[a:b] - x0, py[a:b] - y0
+                inside = (lx >= 0) & (lx < TILE_SIZE + 2 * TILE_PAD) & (ly >= 0) & (ly < TILE_SIZE + 2 * TILE_PAD)
+                parts_x.append(lx[inside])
+                parts_y.append(ly[inside])
+        yield np.concatenate(parts_x), np.concatenate(parts_y), norm, layer_dir / str(zoom) / str(x) / f"{y}.png"
+
+def render_heatmap_tiles(gps_df: pd.DataFrame, out_dir, min_zoom: int = 0, max_zoom: int = 14,
+                         latency_H: int = LATENCY_THRESHOLD_HOURS, lat_col='Lat', lon_col='Lon',
+                         workers: int = None) -> dict:
+    """
+    Render 'latency' and 'normal' heat layers into out_dir/{layer}/{z}/{x}/{y}.png.
+    Returns the number of tiles written per layer.
+    The pyramid is rendered into a temporary sibling directory and swapped in when complete,
+    so the tile server keeps serving the previous tiles during a rebuild.
+    """
+    workers = workers or os.cpu_count()
+    final_dir = out_dir
+    out_dir = final_dir.with_name(f".{final_dir.name}.{os.getpid()}.tmp")
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    out_dir.mkdir(parents=True)
+
+    latency_condition = (gps_df['t_diff'] >= pd.Timedelta(hours=latency_H)).values
+    lat_all = gps_df[lat_col].values.astype(np.float64)
+    lon_all = gps_df[lon_col].values.astype(np.float64)
+    valid = ~(np.isnan(lat_all) | np.isnan(lon_all))
+    blur = gaussian_blur_matrix()
+
+    written = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for layer, mask in [('normal', ~latency_condition), ('latency', latency_condition)]:
+            lat, lon = lat_all[mask & valid], lon_all[mask & valid]
+            render = partial(_render_tiles, lut=gradient_lut(LAYER_GRADIENTS[layer]), blur=blur)
+            written[layer] = 0
+            if len(lat) == 0:
+                continue
+            for zoom in range(min_zoom, max_zoom + 1):
+                tasks = iter_zoom_tasks(lat, lon, zoom, out_dir / layer)
+                n_written = render_zoom_tasks(executor, render, tasks, PENDING_BATCHES * workers)
+                written[layer] += n_written
+                print(f"  {layer:<8} zoom {zoom:>2}: {n_written} tiles")
+
+    with open(out_dir / "tiles.json", 'w') as f:
+        json.dump({'min_zoom': min_zoom, 'max_zoom': max_zoom, 'latency_H': latency_H, 'tiles': written}, f)
+
+    # A directory can only be renamed onto an empty one: move the old pyramid aside first
+    old_dir = final_dir.with_name(f".{final_dir.name}.{os.getpid()}.old")
+    if final_dir.exists():
+        os.replace(final_dir, old_dir)
+    os.replace(out_dir, final_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return written
+
+def load_tiles_info(customer_name: str, year_month: str):
+    """Zoom range and tile counts of a rendered month, or None if it has not been rendered."""
+    info_path = get_tiles_dir(customer_name, year_month) / "tiles.json"
+    if not info_path.exists():
+        return None
+    with open(info_path, 'r') as f:
+        return json.load(f)
+
+def tile_url(customer_name: str, year_month: str, layer: str, port: int = TILE_SERVER_PORT) -> str:
+    """Leaflet URL template of a layer served by the local tile server."""
+    return f"http://localhost:{port}/{get_tiles_dir(customer_name, year_month).name}/{layer}/{{z}}/{{x}}/{{y}}.png"
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+def start_tile_server(port: int = TILE_SERVER_PORT) -> ThreadingHTTPServer:
+    """Serve TILES_DIR over HTTP from a daemon thread."""
+    handler = partial(_QuietHandler, directory=str(TILES_DIR))
+    server = ThreadingHTTPServer(("localhost", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving heatmap tiles from {TILES_DIR} on http://localhost:{port}")
+    return server
+
+def main():
+    """Main function to render the heatmap tile pyramid for a processed month."""
+    from month_data import HEATMAP_COLUMNS, load_month_data
+
+    print("\n=== Render heatmap tiles ===")
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--manual", action="store_true", help="Manually select month")
+    parser.add_argument("--customer", default=DEFAULT_CUSTOMER, help="Customer name (default: Zim)")
+    parser.add_argument("--min-zoom", type=int, default=0, help="Lowest zoom level (default: 0)")
+    parser.add_argument("--max-zoom", type=int, default=14, help="Highest zoom level (default: 14)")
+    parser.add_argument("--include-sea", action="store_true", help="Also render points at sea")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+
+    args = parser.parse_args()
+
+    year_month = prompt_for_month() if args.manual else get_default_month()
+
+    data = load_month_data(year_month, args.customer, columns=HEATMAP_COLUMNS)
+    if data is None:
+        return 1
+    gps_df, _, _ = data
+    if not args.include_sea:
+        gps_df = gps_df[~gps_df['in_Sea']]
+
+    out_dir = get_tiles_dir(args.customer, year_month)
+    print(f"Rendering {len(gps_df)} GPS reports into {out_dir}...")
+    written = render_heatmap_tiles(gps_df, out_dir, min_zoom=args.min_zoom, max_zoom=args.max_zoom,
+                                   workers=args.workers)
+    print(f"Done: {written['normal']} normal and {written['latency']} latency tiles.")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
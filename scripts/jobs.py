@@ -0,0 +1,255 @@
+"""
+Local background jobs for the dashboard: pipeline runs (query, process, map pre-rendering),
+heatmap tiles and single map renders, outside the Streamlit request path.
+
+Jobs are queued on a small thread pool in the app process (JOB_WORKERS at a time) and each one
+runs as a subprocess of this script, so heavy work never blocks the app. Job state is kept in
+JOBS_DIR/<job id>.json and the job output in JOBS_DIR/<job id>.log, so all sessions see the
+same jobs and artifacts are picked up from disk once a job is done. Job files are written under
+a file lock, since several app processes and job subprocesses update them. Each job records the
+app process that queued it and the subprocess running it: a job still queued or running whose
+processes are gone (app restarted) is marked failed, jobs of other live app processes are left alone.
+
+TO RUN (jobs are normally started from the dashboard):
+    python ./scripts/jobs.py --run <job id>
+"""
+from config import BASE_DIR, JOBS_DIR, JOB_WORKERS, LATENCY_THRESHOLD_HOURS
+from utils import file_lock
+
+import os
+import sys
+import json
+import uuid
+import argparse
+import threading
+import traceback
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+STEP_NAMES = {
+    'query': "Query GPS data",
+    'process': "Process GPS data",
+    'render_maps': "Pre-render maps",
+    'tiles': "Render heatmap tiles",
+    'map': "Render map",
+}
+ACTIVE_STATUSES = ('queued', 'running')
+JOB_HISTORY = 100  # finished jobs kept in JOBS_DIR
+JOBS_LOCK_PATH = JOBS_DIR / "jobs.lock"
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _job_path(job_id: str):
+    return JOBS_DIR / f"{job_id}.json"
+
+def get_job_log_path(job_id: str):
+    return JOBS_DIR / f"{job_id}.log"
+
+def get_job(job_id: str):
+    """Job state, or None if the job does not exist."""
+    try:
+        with open(_job_path(job_id), 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def _write_job(job_id: str, **fields) -> dict:
+    job = get_job(job_id) or {}
+    job.update(fields)
+    tmp_path = _job_path(job_id).with_name(f"{job_id}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(job, f, indent=2)
+    os.replace(tmp_path, _job_path(job_id))
+    return job
+
+def _update_job(job_id: str, **fields) -> dict:
+    with file_lock(JOBS_LOCK_PATH):
+        return _write_job(job_id, **fields)
+
+def _process_start(pid: int):
+    """Start time of a running process (clock ticks since boot), or None if it is gone."""
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            return int(f.read().rsplit(')', 1)[1].split()[19])
+    except FileNotFoundError:
+        if os.path.isdir("/proc"):
+            return None
+    # No /proc (macOS): only check that the pid is alive, start time 0
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return None
+    except PermissionError:
+        pass
+    return 0
+
+def _process_alive(pid, started) -> bool:
+    """Whether the process is still the one recorded (a reused pid has another start time)."""
+    return pid is not None and _process_start(pid) == started
+
+def list_jobs(limit: int = 20) -> list:
+    """Most recent jobs first."""
+    jobs = [get_job(path.stem) for path in sorted(JOBS_DIR.glob("*.json"), reverse=True)[:limit]]
+    return [job for job in jobs if job is not None]
+
+def find_job(steps: list, customer_name: str, year_month: str, **params):
+    """Most recent job with the same steps, month and parameters, or None."""
+    for path in sorted(JOBS_DIR.glob("*.json"), reverse=True):
+        job = get_job(path.stem)
+        if job and job['steps'] == list(steps) and job['customer'] == customer_name \
+                and job['month'] == year_month and job['params'] == params:
+            return job
+    return None
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # Jobs left queued or running by an app process that is gone will never finish
+            # (a running job whose subprocess outlived the app still finishes on its own)
+            with file_lock(JOBS_LOCK_PATH):
+                for job in list_jobs(limit=None):
+                    if job['status'] in ACTIVE_STATUSES \
+                            and not _process_alive(job.get('owner_pid'), job.get('owner_started')) \
+                            and not _process_alive(job.get('pid'), job.get('pid_started')):
+                        _write_job(job['id'], status='failed', error="Interrupted (the app was restarted)")
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+        return _executor
+
+def _run_subprocess(job_id: str):
+    with open(get_job_log_path(job_id), 'w') as log:
+        result = subprocess.run([sys.executable, __file__, '--run', job_id],
+                                stdout=log, stderr=subprocess.STDOUT, cwd=BASE_DIR)
+    job = get_job(job_id)
+    if result.returncode != 0 and job['status'] != 'failed':
+        _update_job(job_id, status='failed', error=f"Job process exited with code {result.returncode}",
+                    finished_at=datetime.now().isoformat(timespec='seconds'))
+
+def _prune_jobs(keep: int = JOB_HISTORY):
+    """Remove the state and log files of the oldest finished jobs beyond keep."""
+    finished = [job for job in list_jobs(limit=None) if job['status'] not in ACTIVE_STATUSES]
+    for job in finished[keep:]:
+        _job_path(job['id']).unlink(missing_ok=True)
+        get_job_log_path(job['id']).unlink(missing_ok=True)
+
+def submit_job(steps: list, customer_name: str, year_month: str, **params) -> str:
+    """
+    Queue a job running the given steps for a customer month. A job with the same steps and
+    parameters that is still queued or running is reused. Returns the job id.
+    """
+    executor = _get_executor()
+    with file_lock(JOBS_LOCK_PATH):
+        existing = find_job(steps, customer_name, year_month, **params)
+        if existing is not None and existing['status'] in ACTIVE_STATUSES:
+            return existing['id']
+
+        job_id = f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        _write_job(job_id, id=job_id, steps=list(steps), customer=customer_name, month=year_month, params=params,
+                   status='queued', step=None, progress=0.0, message="Queued", error=None,
+                   owner_pid=os.getpid(), owner_started=_process_start(os.getpid()),
+                   created_at=datetime.now().isoformat(timespec='seconds'), started_at=None, finished_at=None)
+    executor.submit(_run_subprocess, job_id)
+    _prune_jobs()
+    return job_id
+
+def describe_job(job: dict) -> str:
+    """Short human-readable description of a job."""
+    what = ", ".join(STEP_NAMES[step] for step in job['steps'])
+    details = ", ".join(str(value) for key, value in job['params'].items() if key != 'data_version')
+    return f"{what} ({job['customer']} {job['month']}{', ' + details if details else ''})"
+
+# Steps, run inside the job subprocess. progress(fraction, message) reports progress within the step.
+
+def _step_query(job, progress):
+    from data_query import get_gps_data, save_gps_data
+    df = get_gps_data(job['month'], customer_name=job['customer'])
+    if df.empty:
+        raise ValueError(f"No GPS data found for {job['customer']} in {job['month']}")
+    save_gps_data(df, job['customer'], job['month'])
+
+def _step_process(job, progress):
+    from data_processing import get_processed_gpsData_and_polygons, save_processed_data
+    processed_gps, polygon_stats, polygon_dict, device_sets = get_processed_gpsData_and_polygons(
+        job['month'],
+        customer_name=job['customer'],
+        low_memory=job['params'].get('low_memory', False)
+    )
+    if processed_gps.empty:
+        raise ValueError(f"No processed GPS data generated for {job['customer']} in {job['month']}")
+    progress(0.9, "Saving processed data")
+    save_processed_data(processed_gps, polygon_stats, polygon_dict, job['customer'], job['month'],
+                        device_sets=device_sets)
+
+def _step_render_maps(job, progress):
+    from dashboard_maps import render_map
+    from render_geofence_maps import render_geofence_maps
+    progress(0.0, "Global latency map")
+    render_map('global_latency', job['customer'], job['month'])
+    progress(0.05, "Dual heatmap")
+    render_map('dual_heatmap', job['customer'], job['month'])
+    render_geofence_maps(job['month'], job['customer'], progress_callback=lambda done, total: progress(
+        0.1 + 0.9 * done / total, f"{done}/{total} geofence maps"))
+
+def _step_tiles(job, progress):
+    from month_data import HEATMAP_COLUMNS, load_month_data
+    from heatmap_tiles import get_tiles_dir, render_heatmap_tiles
+    data = load_month_data(job['month'], job['customer'], columns=HEATMAP_COLUMNS)
+    if data is None:
+        raise FileNotFoundError(f"Processed data for {job['customer']} in {job['month']} is missing")
+    gps_df = data[0]
+    progress(0.2, "Rendering tiles")
+    render_heatmap_tiles(gps_df[~gps_df['in_Sea']], get_tiles_dir(job['customer'], job['month']),
+                         latency_H=job['params'].get('latency_H', LATENCY_THRESHOLD_HOURS))
+
+def _step_map(job, progress):
+    from dashboard_maps import render_map
+    params = job['params']
+    if render_map(params['map_type'], job['customer'], job['month'], geofence=params.get('geofence')) is None:
+        raise FileNotFoundError(f"Processed data for {job['customer']} in {job['month']} is missing")
+
+STEPS = {
+    'query': _step_query,
+    'process': _step_process,
+    'render_maps': _step_render_maps,
+    'tiles': _step_tiles,
+    'map': _step_map,
+}
+
+def run_job(job_id: str) -> int:
+    """Run the steps of a queued job, recording progress in its state file."""
+    job = _update_job(job_id, status='running', pid=os.getpid(), pid_started=_process_start(os.getpid()),
+                      started_at=datetime.now().isoformat(timespec='seconds'))
+    steps = job['steps']
+    try:
+        for i, step in enumerate(steps):
+            def progress(fraction, message, i=i, step=step):
+                _update_job(job_id, progress=round((i + fraction) / len(steps), 3),
+                            message=f"{STEP_NAMES[step]}: {message}")
+            _update_job(job_id, step=step, progress=round(i / len(steps), 3), message=STEP_NAMES[step])
+            print(f"=== {STEP_NAMES[step]} ===", flush=True)
+            STEPS[step](job, progress)
+    except Exception as e:
+        traceback.print_exc()
+        _update_job(job_id, status='failed', error=str(e), finished_at=datetime.now().isoformat(timespec='seconds'))
+        return 1
+
+    _update_job(job_id, status='done', progress=1.0, message="Done",
+                finished_at=datetime.now().isoformat(timespec='seconds'))
+    return 0
+
+def main():
+    """Main function to run one queued job (started by the dashboard)."""
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--run", required=True, help="Id of the queued job to run")
+
+    args = parser.parse_args()
+
+    if get_job(args.run) is None:
+        print(f"Job {args.run} not found in {JOBS_DIR}")
+        return 1
+    return run_job(args.run)
+
+if __name__ == "__main__":
+    exit(main())
@@ -1,13 +1,15 @@
-from data_processing import build_spatial_index
-from data_query import prompt_for_month
+from utils import prompt_for_month
+# Month loaders live in month_data (no map dependencies); re-exported here for existing callers
+from month_data import load_month_data, load_month_summary, load_geofence_points
 
 import folium
 import numpy as np
 import pandas as pd
-from folium.plugins import HeatMap, MarkerCluster
-from matplotlib import colors as mcolors
-import matplotlib.pyplot as plt
-import pickle
+from folium.plugins import HeatMap, FastMarkerCluster
+import json
+from functools import lru_cache
+from branca.element import MacroElement
+from folium.template import Template
 import sys
 from pathlib import Path
 from datetime import datetime
@@ -16,10 +18,98 @@ BASE_DIR = Path(__file__).parent.parent.absolute()
 PROCESSED_DATA_DIR = BASE_DIR / "data" / "processed"
 MAPS_DIR = BASE_DIR / "maps"
 
+# Heatmap binning: cell edge in screen pixels at the binning zoom level
+HEATMAP_BIN_PIXELS = 4
+
+def bin_points(lat, lon, zoom: int, weights=None):
+    """
+    Bin points into grid cells sized to a few pixels at the given zoom level.
+    Returns [[lat, lon, weight], ...] with one entry per occupied cell: the cell's mean
+    position weighted by its number of points (or the sum of the points' weights), ready
+    to pass to HeatMap.
+    """
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    weights = np.ones(len(lat)) if weights is None else np.asarray(weights, dtype=np.float64)
+    valid = ~(np.isnan(lat) | np.isnan(lon))
+    lat, lon, weights = lat[valid], lon[valid], weights[valid]
+    if len(lat) == 0:
+        return []
+    
+    cell_size = 360.0 / (256 * 2 ** zoom) * HEATMAP_BIN_PIXELS
+    rows = np.floor((lat + 90.0) / cell_size).astype(np.int64)
+    cols = np.floor((lon + 180.0) / cell_size).astype(np.int64)
+    keys = rows * (int(360.0 / cell_size) + 1) + cols
+    
+    _, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse, weights=weights)
+    cell_lat = np.bincount(inverse, weights=lat * weights) / counts
+    cell_lon = np.bincount(inverse, weights=lon * weights) / counts
+    return np.column_stack([cell_lat.round(5), cell_lon.round(5), counts.round(2)]).tolist()
+
+def get_heat_data(df, lat_col='Lat', lon_col='Lon', bin_zoom=None, weight_col=None):
+    """
+    Heatmap input: every point, or weighted grid cells when bin_zoom is set.
+    weight_col weighs the points (e.g. the weights of a stratified sample).
+    """
+    columns = [lat_col, lon_col] + ([weight_col] if weight_col else [])
+    if bin_zoom is None:
+        return df[columns].values.tolist()
+    return bin_points(df[lat_col].values, df[lon_col].values, bin_zoom,
+                      weights=df[weight_col].values if weight_col else None)
+
+# Client-side marker factory for point layers: rows are [lat, lon] or [lat, lon, t_diff seconds].
+# Markers share one canvas renderer and popups are only built when opened.
+POINT_MARKER_CALLBACK = """(function () {
+    var renderer = L.canvas({padding: 0.5});
+    var pad = function (n) { return (n < 10 ? '0' : '') + n; };
+    var formatTimeDiff = function (seconds) {
+        var sign = seconds < 0 ? '-' : '';
+        seconds = Math.abs(seconds);
+        var days = Math.floor(seconds / 86400);
+        seconds -= days * 86400;
+        return sign + days + ' days ' + pad(Math.floor(seconds / 3600)) + ':' +
+            pad(Math.floor(seconds %% 3600 / 60)) + ':' + pad(Math.floor(seconds %% 60));
+    };
+    return function (row) {
+        var marker = L.circleMarker(new L.LatLng(row[0], row[1]),
+            {renderer: renderer, radius: 3, weight: %(weight)d, color: %(color)s, fill: true});
+        marker.bindPopup(function () {
+            return row.length > 2 ? 'Time diff: ' + formatTimeDiff(row[2])
+                : %(prefix)s + 'Lat: ' + row[0].toFixed(6) + ', Lon: ' + row[1].toFixed(6);
+        });
+        return marker;
+    };
+})()"""
+
+def add_point_layer(parent, df, color, lat_col='Lat', lon_col='Lon', popup_prefix='',
+                    with_t_diff=False, weight=2, **cluster_options):
+    """
+    Add points as one array-backed, client-side clustered layer of canvas circle markers.
+    Popups show the coordinates (prefixed by popup_prefix) or, with_t_diff, the latency.
+    Extra keyword arguments are passed to FastMarkerCluster (name, control,
+    disableClusteringAtZoom, ...).
+    """
+    columns = [lat_col, lon_col]
+    data = df[columns].astype(np.float64).round(6)
+    if with_t_diff:
+        data['t_diff_s'] = df['t_diff'].dt.total_seconds().round()
+    data = data.dropna()
+    
+    callback = POINT_MARKER_CALLBACK % {
+        'color': json.dumps(color),
+        'prefix': json.dumps(popup_prefix),
+        'weight': weight
+    }
+    layer = FastMarkerCluster(data.values.tolist(), callback=callback, **cluster_options)
+    layer.add_to(parent)
+    return layer
+
 def plot_gps_heatmap(df, lat_col='Lat', lon_col='Lon', zoom_start=2, 
                      radius=15, 
                      show_markers=False,
-                     gradient={0.4: 'blue', 0.65: 'lime', 1: 'red'}):
+                     gradient={0.4: 'blue', 0.65: 'lime', 1: 'red'},
+                     bin_zoom=None):
     
     # Calculate center point for initial view
     center_lat = df[lat_col].mean()
@@ -30,8 +120,8 @@ def plot_gps_heatmap(df, lat_col='Lat', lon_col='Lon', zoom_start=2,
                   zoom_start=zoom_start,
                   tiles='OpenStreetMap')
     
-    # Prepare data for heatmap
-    heat_data = [[row[lat_col], row[lon_col]] for _, row in df.iterrows()]
+    # Prepare data for heatmap (binned into weighted cells if bin_zoom is set)
+    heat_data = get_heat_data(df, lat_col, lon_col, bin_zoom)
     
     # Add heatmap layer
     HeatMap(heat_data,
@@ -39,45 +129,50 @@ def plot_gps_heatmap(df, lat_col='Lat', lon_col='Lon', zoom_start=2,
             radius=radius,
             blur=15,
             max_zoom=1,
-            gradient=gradient).add_to(m)
+            gradient={str(k): v for k, v in gradient.items()}).add_to(m)
     
     # Optionally add marker clusters
     if show_markers:
-        marker_cluster = MarkerCluster().add_to(m)
-        for idx, row in df.iterrows():
-            folium.CircleMarker(
-                location=[row[lat_col], row[lon_col]],
-                radius=3,
-                weight=2,
-                color='red',
-                fill=True,
-                popup=f"Lat: {row[lat_col]:.6f}, Lon: {row[lon_col]:.6f}"
-            ).add_to(marker_cluster)
+        add_point_layer(m, df, 'red', lat_col, lon_col)
     
     # Add layer control
     folium.LayerControl().add_to(m)
     
     return m
 
-def get_color(severity: float, max_severity: float) -> str:
-    if severity == 0:
-        return 'limegreen'
-    
-    cmap = mcolors.LinearSegmentedColormap.from_list("", [
-        (0.0, 'limegreen'),
-        (0.1, 'gold'),     
-        (0.3, 'darkorange'),
-        (1.0, 'crimson')
-    ])
+# Severity colormap stops: limegreen, gold, darkorange, crimson
+SEVERITY_STOPS = [0.0, 0.1, 0.3, 1.0]
+SEVERITY_RGB = [(50, 205, 50), (255, 215, 0), (255, 140, 0), (220, 20, 60)]
+
+@lru_cache(maxsize=1)
+def _severity_lut() -> np.ndarray:
+    """
+    Hex colors of the severity colormap, one per colormap bin (built once).
+    Same 256 colors as matplotlib's LinearSegmentedColormap over the stops, without importing it.
+    """
+    rgb = np.array(SEVERITY_RGB, dtype=np.float64) / 255
+    x = np.linspace(0, 1, 256)
+    values = np.round(np.column_stack([np.interp(x, SEVERITY_STOPS, rgb[:, c]) for c in range(3)]) * 255)
+    return np.array(['#' + ''.join(f'{int(v):02x}' for v in row) for row in values])
+
+def severity_colors(severity) -> np.ndarray:
+    """Vectorized get_color: hex color per severity score (0-100), 'limegreen' for 0."""
+    severity = np.asarray(severity, dtype=np.float64)
+    lut = _severity_lut()
     
     # scale_by = max_severity * 2/3 + 100/3
     # scaled_severity = severity / scale_by
+    
+    scaled_severity = severity / 100
+    idx = np.clip((scaled_severity * len(lut)).astype(np.int64), 0, len(lut) - 1)
+    return np.where(severity == 0, 'limegreen', lut[idx])
 
-    scaled_severity = severity/100
-    return mcolors.rgb2hex(cmap(scaled_severity))
+def get_color(severity: float, max_severity: float) -> str:
+    return str(severity_colors([severity])[0])
 
 def see_color():
     # See the choice of the gradient for Severity Score
+    import matplotlib.pyplot as plt
     ratios = np.arange(0, 101, 5) 
     colors = [get_color(r,100) for r in ratios]
 
@@ -91,19 +186,26 @@ def see_color():
     plt.show()
 
 def plot_gps_per_polygon(polygons_df, geofence_name, gps_df,customer_name='Zim', base_zoom=16, 
-                        late_H = 24):
-    """Plot single polygon with its GPS points"""
+                        late_H = 24, polygon_dict=None):
+    """
+    Plot single polygon with its GPS points.
+    gps_df may be the whole month or only the geofence's rows (see load_geofence_points).
+    Pass the saved polygon_dict to avoid rebuilding it from polygons_df.
+    """
     polygon_data = polygons_df[polygons_df['LocationName'] == geofence_name].iloc[0]    
 
-    _, polygon_dict = build_spatial_index(polygons_df)
-
-    # Get the polygon index
-    polygon_idx = polygons_df[polygons_df['LocationName'] == geofence_name].index[0]
-    _, polygon = polygon_dict[polygon_idx]
+    if polygon_dict is None:
+        from data_processing import build_spatial_index
+        _, polygon_dict = build_spatial_index(polygons_df)
+        # Get the polygon index
+        polygon_idx = polygons_df[polygons_df['LocationName'] == geofence_name].index[0]
+        _, polygon = polygon_dict[polygon_idx]
+    else:
+        polygon = next(poly for name, poly in polygon_dict.values() if name == geofence_name)
     
     # Get and split points
     late_threshold = pd.Timedelta(hours=late_H)
-    points = gps_df[gps_df['in_Zim_polygon'] == geofence_name].copy()
+    points = gps_df[gps_df[f'in_{customer_name}_polygon'] == geofence_name].copy()
     late_points = points[points['t_diff'] >= late_threshold]
     normal_points = points[points['t_diff'] < late_threshold]
     
@@ -130,24 +232,11 @@ def plot_gps_per_polygon(polygons_df, geofence_name, gps_df,customer_name='Zim',
         popup=f"Location: {geofence_name}"
     ).add_to(m)
     
-    # Add points
-    for _, row in normal_points.iterrows():
-        folium.CircleMarker(
-            location=[float(row['Lat']), float(row['Lon'])],
-            radius=3,
-            color='gray',
-            fill=True,
-            popup=f"Time diff: {row['t_diff']}"
-        ).add_to(m)
-    
-    for _, row in late_points.iterrows():
-        folium.CircleMarker(
-            location=[float(row['Lat']), float(row['Lon'])],
-            radius=3,
-            color='red',
-            fill=True,
-            popup=f"Time diff: {row['t_diff']}"
-        ).add_to(m)
+    # Add points (clustered only when zoomed out beyond the geofence)
+    add_point_layer(m, normal_points, 'gray', with_t_diff=True, weight=3,
+                    control=False, disableClusteringAtZoom=base_zoom - 1)
+    add_point_layer(m, late_points, 'red', with_t_diff=True, weight=3,
+                    control=False, disableClusteringAtZoom=base_zoom - 1)
     
     # Add stats box
     title_html = f'''
@@ -167,92 +256,113 @@ def plot_gps_per_polygon(polygons_df, geofence_name, gps_df,customer_name='Zim',
     return m
 
 
+class GeofenceCircleLayer(MacroElement):
+    """
+    One GeoJSON FeatureCollection of geofence circles styled in the browser from feature
+    properties (radius, color) on a shared canvas renderer, with popups built on open.
+    """
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function () {
+            var renderer = L.canvas({padding: 0.5});
+            return L.geoJSON({{ this.data|tojson }}, {
+                pointToLayer: function (feature, latlng) {
+                    var p = feature.properties;
+                    return L.circleMarker(latlng, {renderer: renderer, radius: p.radius, color: p.color,
+                                                   weight: 2, fill: true, fillOpacity: 0.3});
+                },
+                onEachFeature: function (feature, layer) {
+                    layer.bindPopup(function () {
+                        var p = feature.properties;
+                        var body = p.total_messages === 0
+                            ? 'Total messages: 0.'
+                            : 'Total messages: ' + p.total_messages + '. Total unique devices: ' + p.total_devices + '<br>' +
+                              'Late to normal GPS-reports ratio: ' + p.latency_messages_ratio.toFixed(1) + '%<br>' +
+                              'Late to normal devices ratio: ' + p.latency_device_ratio.toFixed(1) + '%<br>' +
+                              'Severity score: ' + p.severity.toFixed(1);
+                        return "<div style='width:300px'><h4>" + p.name + "</h4><p>" + body + "</p></div>";
+                    }, {maxWidth: 350});
+                }
+            }).addTo({{ this._parent.get_name() }});
+        })();
+        {% endmacro %}
+    """)
+    
+    def __init__(self, data):
+        super().__init__()
+        self._name = 'GeofenceCircleLayer'
+        self.data = data
+
+# Geofence circle sizes on the global latency map
+MIN_RADIUS = 3
+MAX_RADIUS = 30
+ZERO_RADIUS = 5
+THRESHOLD = 1000  # number of messages where growth slows significantly
+
+def calculate_radii(messages, max_messages) -> np.ndarray:
+    """Circle radius per geofence: linear 3-25 up to THRESHOLD messages, logarithmic 25-30 beyond."""
+    messages = np.asarray(messages, dtype=np.float64)
+    linear = MIN_RADIUS + 22 * (messages / THRESHOLD)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_scale = np.log1p(messages - THRESHOLD) / np.log1p(max_messages - THRESHOLD)
+    logarithmic = 25 + (MAX_RADIUS - 25) * log_scale
+    return np.where(messages == 0, ZERO_RADIUS, np.where(messages <= THRESHOLD, linear, logarithmic))
+
 def plot_latency(polygon_dict, polygons_df, center_lat=0, center_lon=0, severe_on_top=False):
-    
+    """
+    Global latency map: one circle per geofence at its centroid, sized by message volume and
+    colored by severity, emitted as a single styled GeoJSON layer.
+    """
     m = folium.Map(location=[center_lat, center_lon], zoom_start=2)
     
     max_messages = polygons_df['total_messages'].max()
-    max_devices = polygons_df['total_devices'].max()
-    max_severity = polygons_df['severity'].max()
-    
-    # Adjusted sizes
-    MIN_RADIUS = 3
-    MAX_RADIUS = 30
-    ZERO_RADIUS = 5
-    THRESHOLD = 1000  # number of messages where growth slows significantly
-    
-    def calculate_radius(messages, max_messages):
-        if messages == 0:
-            return ZERO_RADIUS
-        elif messages <= THRESHOLD:
-            # Linear scaling from 3 to 25 for 0-1000 messages
-            return MIN_RADIUS + 22 * (messages / THRESHOLD)
-        else:
-            # Logarithmic scaling from 25 to 30 for 1000+ messages
-            remaining_range = MAX_RADIUS - 25
-            log_scale = np.log1p(messages - THRESHOLD) / np.log1p(max_messages - THRESHOLD)
-            return 25 + remaining_range * log_scale
-    
-    if severe_on_top:
-        polygon_data = [(
-            polygons_df.iloc[idx]['severity'],
-            idx,
-            name,
-            poly,
-            polygons_df.iloc[idx]
-        ) for idx, (name, poly) in polygon_dict.items()]
-        iterator = sorted(polygon_data, key=lambda x: x[0])
-    else:
-        iterator = [(None, idx, name, poly, polygons_df.iloc[idx]) 
-                   for idx, (name, poly) in polygon_dict.items()]
     
-    for _, idx, geofence_name, poly, poly_data in iterator:
-        total_messages = poly_data['total_messages']
-        circle_center = poly.centroid
-        
-        if total_messages == 0:
-            radius = ZERO_RADIUS
-            color = 'darkgray'
-            popup_html = f"""
-            <div style='width:300px'>
-                <h4>{geofence_name}</h4>
-                <p>Total messages: {total_messages}.</p>
-            </div>
-            """
-        else:
-            radius = calculate_radius(total_messages, max_messages)
-
-            severity = poly_data['severity']
-            color = get_color(severity, max_severity)
-            
-            popup_html = f"""
-            <div style='width:300px'>
-                <h4>{geofence_name}</h4>
-                <p>
-                Total messages: {total_messages}. Total unique devices: {poly_data['total_devices']}<br>
-                Late to normal GPS-reports ratio: {poly_data['latency_messages_ratio']:.1f}%<br>
-                Late to normal devices ratio: {poly_data['latency_device_ratio']:.1f}%<br>
-                Severity score: {poly_data['severity']:.1f}
-                </p>
-            </div>
-            """
-        
-        folium.CircleMarker(
-            location=[circle_center.x, circle_center.y],
-            radius=radius,
-            color=color,
-            weight=2,
-            fill=True,
-            fill_opacity=0.3,
-            popup=folium.Popup(popup_html, max_width=350)
-        ).add_to(m)
+    keys = np.fromiter(polygon_dict.keys(), dtype=np.int64, count=len(polygon_dict))
+    names = np.array([name for name, _ in polygon_dict.values()], dtype=object)
+    import shapely
+    centroids = shapely.centroid(np.array([poly for _, poly in polygon_dict.values()], dtype=object))
+    
+    rows = polygons_df.iloc[keys]
+    total_messages = rows['total_messages'].to_numpy()
+    severity = rows['severity'].to_numpy(dtype=np.float64)
+    
+    radius = calculate_radii(total_messages, max_messages).round(2)
+    color = np.where(total_messages == 0, 'darkgray', severity_colors(severity))
+    
+    order = np.argsort(severity, kind='stable') if severe_on_top else np.arange(len(keys))
+    
+    properties = pd.DataFrame({
+        'name': names,
+        'total_messages': total_messages,
+        'total_devices': rows['total_devices'].to_numpy(),
+        'latency_messages_ratio': rows['latency_messages_ratio'].to_numpy(dtype=np.float64),
+        'latency_device_ratio': rows['latency_device_ratio'].to_numpy(dtype=np.float64),
+        'severity': severity,
+        'radius': radius,
+        'color': color
+    }).iloc[order]
+    # Polygons are stored as (lat, lon), GeoJSON points are [lon, lat]
+    coordinates = np.column_stack([shapely.get_y(centroids), shapely.get_x(centroids)])[order].round(6).tolist()
+    
+    features = [
+        {'type': 'Feature', 'geometry': {'type': 'Point', 'coordinates': coords}, 'properties': props}
+        for coords, props in zip(coordinates, properties.to_dict('records'))
+    ]
+    GeofenceCircleLayer({'type': 'FeatureCollection', 'features': features}).add_to(m)
     
     return m
 
 def plot_dual_gps_heatmap(df, month, latency_H=24, lat_col='Lat', lon_col='Lon', zoom_start=2,
                          radius=15, show_markers=False,
                          latency_gradient = {0.4: '#DC143C', 0.65: '#FF4500',0.85: '#FFD700'},
-                         normal_gradient = {0.4: '#4169E1',  0.65: '#20B2AA', 0.85: '#00FF00'}):
+                         normal_gradient = {0.4: '#4169E1',  0.65: '#20B2AA', 0.85: '#00FF00'},
+                         bin_zoom=None, weight_col=None):
+    """
+    Heatmaps of normal and high-latency reports as separate layers.
+    With bin_zoom set, each layer is binned into weighted grid cells (see bin_points) so the
+    map size scales with occupied cells rather than with the number of reports.
+    weight_col weighs the reports, to draw the month from its stratified sample (sampling.py).
+    """
     
     # Calculate center point for initial view
     center_lat = df[lat_col].mean()
@@ -277,8 +387,8 @@ def plot_dual_gps_heatmap(df, month, latency_H=24, lat_col='Lat', lon_col='Lon',
     normal_layer = folium.FeatureGroup(name='Normal Points', overlay=True, control=True)
     
     # Prepare data for both heatmaps
-    latency_data = [[row[lat_col], row[lon_col]] for _, row in df_latency.iterrows()]
-    normal_data = [[row[lat_col], row[lon_col]] for _, row in df_normal.iterrows()]
+    latency_data = get_heat_data(df_latency, lat_col, lon_col, bin_zoom, weight_col)
+    normal_data = get_heat_data(df_normal, lat_col, lon_col, bin_zoom, weight_col)
     
     # Add normal points heatmap layer - First to render (base layer)
     if len(normal_data) > 0:
@@ -288,7 +398,7 @@ def plot_dual_gps_heatmap(df, month, latency_H=24, lat_col='Lat', lon_col='Lon',
                 radius=radius,
                 blur=15,
                 max_zoom=1,
-                gradient=normal_gradient).add_to(normal_layer)
+                gradient={str(k): v for k, v in normal_gradient.items()}).add_to(normal_layer)
     
     # Add latency points heatmap layer - Second to render (top layer)
     if len(latency_data) > 0:
@@ -298,35 +408,14 @@ def plot_dual_gps_heatmap(df, month, latency_H=24, lat_col='Lat', lon_col='Lon',
                 radius=radius,
                 blur=15,
                 max_zoom=1,
-                gradient=latency_gradient).add_to(latency_layer)
+                gradient={str(k): v for k, v in latency_gradient.items()}).add_to(latency_layer)
     
     # Optionally add marker clusters
     if show_markers:
-        # Normal points markers
-        normal_cluster = MarkerCluster(name='Normal Markers')
-        for idx, row in df_normal.iterrows():
-            folium.CircleMarker(
-                location=[row[lat_col], row[lon_col]],
-                radius=3,
-                weight=2,
-                color='green',
-                fill=True,
-                popup=f"Normal - Lat: {row[lat_col]:.6f}, Lon: {row[lon_col]:.6f}"
-            ).add_to(normal_cluster)
-        normal_cluster.add_to(m)
-            
-        # Latency points markers
-        latency_cluster = MarkerCluster(name='Latency Markers')
-        for idx, row in df_latency.iterrows():
-            folium.CircleMarker(
-                location=[row[lat_col], row[lon_col]],
-                radius=3,
-                weight=2,
-                color='red',
-                fill=True,
-                popup=f"Latency - Lat: {row[lat_col]:.6f}, Lon: {row[lon_col]:.6f}"
-            ).add_to(latency_cluster)
-        latency_cluster.add_to(m)
+        add_point_layer(m, df_normal, 'green', lat_col, lon_col,
+                        popup_prefix='Normal - ', name='Normal Markers')
+        add_point_layer(m, df_latency, 'red', lat_col, lon_col,
+                        popup_prefix='Latency - ', name='Latency Markers')
     
     # Add the layers to the map in the desired order - latency first (bottom), normal second (top)
     latency_layer.add_to(m)
@@ -365,50 +454,55 @@ def plot_dual_gps_heatmap(df, month, latency_H=24, lat_col='Lat', lon_col='Lon',
     
     return m
 
-def load_month_data(year_month, customer_name='Zim'):
+def plot_tile_heatmap(normal_tiles_url, latency_tiles_url, month, max_native_zoom, latency_H=24,
+                      center_lat=20, center_lon=0, zoom_start=2):
     """
-    Load all data files of a required month.
+    Dual heatmap backed by pre-rendered z/x/y tiles (see heatmap_tiles.py) instead of embedded points.
+    Zooming past max_native_zoom upscales the deepest rendered tiles.
     """
-    year, month = year_month.split('-')
+    m = folium.Map(location=[center_lat, center_lon],
+                   zoom_start=zoom_start,
+                   max_zoom=19,
+                   tiles='OpenStreetMap')
+    
+    for name, url in [('Normal Points', normal_tiles_url), ('Latency Points', latency_tiles_url)]:
+        folium.TileLayer(
+            tiles=url,
+            name=name,
+            attr='GPS reports',
+            overlay=True,
+            control=True,
+            max_native_zoom=max_native_zoom,
+            max_zoom=19
+        ).add_to(m)
+    
+    folium.LayerControl(collapsed=False).add_to(m)
+    
+    folium.branca.colormap.LinearColormap(
+        colors=['#4169E1', '#20B2AA', '#00FF00'],
+        vmin=0, vmax=100,
+        caption='Normal Points'
+    ).add_to(m)
+    folium.branca.colormap.LinearColormap(
+        colors=['#DC143C', '#FF4500', '#FFD700'],
+        vmin=0, vmax=100,
+        caption='Latency Points'
+    ).add_to(m)
     
-    # Construct filenames
-    gps_filename = f"processed_gps_data_{customer_name}_{year}_{month}.csv"
-    stats_filename = f"geofence_stats_{customer_name}_{year}_{month}.csv"
-    dict_filename = f"polygon_dict_{customer_name}.pkl"
-    
-    # Construct file paths
-    gps_filepath = PROCESSED_DATA_DIR / gps_filename
-    stats_filepath = PROCESSED_DATA_DIR / stats_filename
-    dict_filepath = PROCESSED_DATA_DIR / dict_filename
-    
-    # Check if files exist
-    missing_files = []
-    if not gps_filepath.exists():
-        missing_files.append(gps_filename)
-    if not stats_filepath.exists():
-        missing_files.append(stats_filename)
-    if not dict_filepath.exists():
-        missing_files.append(dict_filename)
-    
-    if missing_files:
-        print(f"Error: The following files are missing for {year_month}:")
-        for file in missing_files:
-            print(f"  - {file}")
-        print(f"Please make sure data for {year_month} has been processed.")
-        return None
-    
-    # Load the data
-    print(f"Loading data for {year_month}...")
-    gps_df = pd.read_csv(gps_filepath)
-    polygons_df = pd.read_csv(stats_filepath)
-    
-    with open(dict_filepath, 'rb') as f:
-        polygon_dict = pickle.load(f)
-    
-    # Convert t_diff to timedelta
-    gps_df['t_diff'] = pd.to_timedelta(gps_df['t_diff'])
-    
-    return gps_df, polygons_df, polygon_dict
+    title_html = f'''
+    <div style="position: fixed; 
+                top: 10px; 
+                left: 50px; 
+                width: 600px; 
+                z-index:9999; 
+                font-size:16px;
+                font-weight: bold;">
+                GPS reports - Normal vs High Latency ({latency_H}h) in {month}
+    </div>
+    '''
+    m.get_root().html.add_child(folium.Element(title_html))
+    
+    return m
 
 def main():
     CUSTOMER_NAME = 'Zim'
@@ -419,7 +513,7 @@ def main():
     month_name = datetime.strptime(month, "%m").strftime("%B") # Convert month number to month name
     
     # Load data for the specified month
-    data = load_month_data(year_month, CUSTOMER_NAME)
+    data = load_month_data(year_month, CUSTOMER_NAME, columns=['Lat', 'Lon', 't_diff', f'in_{CUSTOMER_NAME}_polygon'])
     if data is None:
         print("Some data files are missing.")
         sys.exit(1)
@@ -447,7 +541,8 @@ def main():
         gps_df=gps_df,
         customer_name=CUSTOMER_NAME,
         base_zoom=16,
-        late_H=24
+        late_H=24,
+        polygon_dict=polygon_dict
     )
     
     # Save the map
@@ -0,0 +1,141 @@
+"""
+Content-addressed cache for rendered map HTML.
+
+Entries are keyed by the map type, its parameters and a fingerprint of the month's processed
+data, so reprocessing a month makes its old maps stale automatically. The cache is capped by
+total size and entry age with least-recently-used eviction, and keeps hit/miss counters in
+MAP_CACHE_DIR/stats.json (updated under a file lock: the app and job subprocesses all count).
+"""
+from config import PROCESSED_DATA_DIR, MAP_CACHE_DIR, MAP_CACHE_MAX_MB, MAP_CACHE_MAX_AGE_DAYS
+from utils import file_lock
+
+import os
+import json
+import time
+import hashlib
+
+STATS_PATH = MAP_CACHE_DIR / "stats.json"
+STATS_LOCK_PATH = MAP_CACHE_DIR / "stats.json.lock"
+
+# Processed files the maps (and the dashboard's loaded months) are drawn from; rebuilding other
+# files of a month (visits, device stats, candidates, flushes) keeps its cached maps
+DATA_VERSION_FILES = [
+    "processed_gps_data_{customer}_{year}_{month}.csv",
+    "processed_gps_data_{customer}_{year}_{month}.arrow",
+    "geofence_points_{customer}_{year}_{month}.parquet",
+    "geofence_stats_{customer}_{year}_{month}.csv",
+    "gps_sample_{customer}_{year}_{month}.parquet",  # preview maps
+    "polygon_dict_{customer}.pkl",
+]
+
+def get_data_version(customer_name: str, year_month: str) -> str:
+    """
+    Fingerprint of the processed files maps are drawn from (name, size, modification time).
+    Changes whenever the month is reprocessed.
+    """
+    year, month = year_month.split('-')
+    parts = []
+    for name in DATA_VERSION_FILES:
+        path = PROCESSED_DATA_DIR / name.format(customer=customer_name, year=year, month=month)
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        parts.append(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}")
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:12]
+
+def map_cache_key(map_type: str, customer_name: str, year_month: str, **params) -> str:
+    """
+    Cache key '<map>__<data version>'. <map> identifies the map type and parameters,
+    <data version> the processed data it was rendered from.
+    """
+    logical = json.dumps({'map_type': map_type, 'customer': customer_name, 'month': year_month, **params},
+                         sort_keys=True, default=str)
+    logical_hash = hashlib.sha1(logical.encode()).hexdigest()[:16]
+    return f"{logical_hash}__{get_data_version(customer_name, year_month)}"
+
+def _update_stats(**increments):
+    with file_lock(STATS_LOCK_PATH):
+        stats = get_cache_stats()
+        for name, value in increments.items():
+            stats[name] = stats.get(name, 0) + value
+        tmp_path = STATS_PATH.with_name(f"{STATS_PATH.name}.{os.getpid()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(stats, f)
+        os.replace(tmp_path, STATS_PATH)
+
+def get_cache_stats() -> dict:
+    """Counters of hits, misses, stale entries and evictions since the cache was created."""
+    if not STATS_PATH.exists():
+        return {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0}
+    try:
+        with open(STATS_PATH, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0}
+
+def get_cached_map(key: str):
+    """
+    Return cached map HTML for a key, or None on a miss.
+    Entries of the same map rendered from another data version are removed as stale.
+    """
+    path = MAP_CACHE_DIR / f"{key}.html"
+    if path.exists():
+        os.utime(path)  # mark as recently used for LRU eviction
+        with open(path, 'r') as f:
+            html = f.read()
+        _update_stats(hits=1)
+        return html
+
+    logical_hash = key.split('__')[0]
+    stale = [p for p in MAP_CACHE_DIR.glob(f"{logical_hash}__*.html") if p != path]
+    for stale_path in stale:
+        stale_path.unlink(missing_ok=True)
+    _update_stats(misses=1, stale=len(stale))
+    return None
+
+def put_cached_map(key: str, html: str, evict: bool = True):
+    """
+    Store map HTML under a key and evict entries beyond the size and age limits. Batches of
+    maps pass evict=False and call evict_cached_maps once when done (each eviction scans the cache).
+    """
+    path = MAP_CACHE_DIR / f"{key}.html"
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as f:
+        f.write(html)
+    os.replace(tmp_path, path)
+    if evict:
+        evict_cached_maps()
+    return path
+
+def evict_cached_maps(max_mb: float = MAP_CACHE_MAX_MB, max_age_days: float = MAP_CACHE_MAX_AGE_DAYS,
+                      keep=()) -> int:
+    """
+    Remove entries unused for max_age_days, then least recently used ones until under max_mb.
+    Paths in keep (a batch of maps just pre-rendered) are never evicted for size.
+    """
+    keep = set(keep)
+    entries = []
+    for path in MAP_CACHE_DIR.glob("*.html"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+    entries.sort()  # least recently used first
+
+    now = time.time()
+    total_bytes = sum(size for _, size, _ in entries)
+    evicted = 0
+    for last_used, size, path in entries:
+        too_old = now - last_used > max_age_days * 86400
+        too_big = total_bytes > max_mb * 1024**2 and path not in keep
+        if not (too_old or too_big):
+            continue
+        path.unlink(missing_ok=True)
+        total_bytes -= size
+        evicted += 1
+
+    if evicted:
+        _update_stats(evictions=evicted)
+    return evicted
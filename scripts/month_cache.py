@@ -0,0 +1,103 @@
+"""
+Process-wide cache of loaded months for the dashboard.
+
+Streamlit reruns the app script on every interaction, but imported modules persist, so the
+months loaded here are shared by all reruns and sessions of the app process. Concurrent
+requests for the same month wait for a single load (single-flight), and the least recently
+used months are evicted once the cache exceeds MONTH_CACHE_MAX_MB.
+
+Entries are keyed by the month's data version (map_cache.get_data_version), so a reprocessed
+month is reloaded instead of served stale. Every view needs the geofence stats and polygons,
+loaded without the GPS data (load_gps=False); the GPS data is only loaded for the statistics
+of months processed before month summaries existed. Maps are rendered by job subprocesses
+(jobs.py), which read the processed files themselves.
+"""
+from config import MONTH_CACHE_MAX_MB
+from month_data import load_month_data
+from map_cache import get_data_version
+
+import threading
+from collections import OrderedDict
+
+_cache = OrderedDict()  # (customer, month, data version, load_gps) -> entry dict, least recently used first
+_cache_lock = threading.Lock()
+_load_locks = {}        # same keys -> lock held while that month loads
+_stats = {'hits': 0, 'loads': 0, 'evictions': 0}
+
+def _entry_size(gps_df, polygons_df) -> int:
+    """Approximate in-memory size of a loaded month in bytes."""
+    gps_bytes = gps_df.memory_usage(deep=True).sum() if gps_df is not None else 0
+    return int(gps_bytes + polygons_df.memory_usage(deep=True).sum())
+
+def _lookup(key):
+    """Cached entry for a key (a full month also serves geofence-only requests), or None."""
+    for candidate in (key[:3] + (True,), key):
+        if candidate in _cache:
+            _cache.move_to_end(candidate)
+            _stats['hits'] += 1
+            return _cache[candidate]
+    return None
+
+def _evict(max_mb: float):
+    """Drop least recently used months until the cache fits max_mb (the newest always stays)."""
+    total = sum(entry['size'] for entry in _cache.values())
+    while len(_cache) > 1 and total > max_mb * 1024**2:
+        _, entry = _cache.popitem(last=False)
+        total -= entry['size']
+        _stats['evictions'] += 1
+
+def _get_entry(year_month: str, customer_name: str, max_mb: float, load_gps: bool = True):
+    key = (customer_name, year_month, get_data_version(customer_name, year_month), load_gps)
+
+    with _cache_lock:
+        entry = _lookup(key)
+        if entry is not None:
+            return entry
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+
+    # Only one thread loads a given month; the others wait here and then find it cached
+    with load_lock:
+        with _cache_lock:
+            entry = _lookup(key)
+            if entry is not None:
+                return entry
+
+        data = load_month_data(year_month, customer_name, load_gps=load_gps)
+
+        with _cache_lock:
+            _load_locks.pop(key, None)
+            if data is None:
+                return None
+            gps_df, polygons_df, polygon_dict = data
+            # Older versions of this month are unreachable once it has been reprocessed,
+            # and a full load supersedes a geofence-only one
+            for old_key in [k for k in _cache if k[:2] == key[:2] and (k[2] != key[2] or load_gps)]:
+                del _cache[old_key]
+            _cache[key] = {'data': data, 'size': _entry_size(gps_df, polygons_df)}
+            _stats['loads'] += 1
+            _evict(max_mb)
+            return _cache[key]
+
+def get_month_data(year_month: str, customer_name: str = 'Zim', max_mb: float = MONTH_CACHE_MAX_MB):
+    """
+    Cached load_month_data: (gps_df, polygons_df, polygon_dict), or None if files are missing.
+    The returned frames are shared between sessions and must not be modified in place.
+    """
+    entry = _get_entry(year_month, customer_name, max_mb)
+    return None if entry is None else entry['data']
+
+def get_month_geofences(year_month: str, customer_name: str = 'Zim', max_mb: float = MONTH_CACHE_MAX_MB):
+    """
+    Cached load_month_data without the GPS data: (None, polygons_df, polygon_dict), or None
+    if files are missing. Served from the full month when it is already loaded.
+    """
+    entry = _get_entry(year_month, customer_name, max_mb, load_gps=False)
+    return None if entry is None else (None,) + entry['data'][1:]
+
+def get_month_cache_stats() -> dict:
+    """Cached months, their total size in MB and hit/load/eviction counters."""
+    with _cache_lock:
+        return {'months': [f"{customer} {month}" + ("" if load_gps else " (geofences)")
+                           for customer, month, _, load_gps in _cache],
+                'size_mb': sum(entry['size'] for entry in _cache.values()) / 1024**2,
+                **_stats}
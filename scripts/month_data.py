@@ -0,0 +1,196 @@
+"""
+Loaders of processed month data (GPS reports, geofence stats, polygon dict, summary and
+per-geofence points). Kept free of map and geo-processing dependencies so the dashboard
+and jobs can load data without importing them.
+
+Processed GPS reports are also saved as an uncompressed Arrow IPC (Feather v2) file,
+data/processed/processed_gps_data_<customer>_<year>_<month>.arrow, with typed timestamps and
+t_diff and dictionary-encoded names. It is memory-mapped on load: only the requested columns
+are read, numeric columns are used in place, and the pages are shared through the OS page
+cache by every process that opens the month. The CSV is the fallback for months without it.
+
+TO RUN (Arrow files of months processed before they existed):
+    python ./scripts/month_data.py --convert
+"""
+from config import PROCESSED_DATA_DIR
+
+import os
+import re
+import json
+import pickle
+import argparse
+import pandas as pd
+
+# Low-cardinality string columns stored dictionary-encoded (loaded as categoricals)
+DICTIONARY_COLUMNS = ['CustomerName', 'DeviceID', 'DeviceName']
+
+# Timestamp columns (parsed when a month is read from its CSV)
+TIME_COLUMNS = ['ReceiveTimeUTC', 'EventTimeUTC']
+
+# Columns read by the land heatmaps (dual heatmap and heatmap tiles)
+HEATMAP_COLUMNS = ['Lat', 'Lon', 't_diff', 'in_Sea']
+
+def get_month_arrow_path(customer_name: str, year_month: str):
+    year, month = year_month.split('-')
+    return PROCESSED_DATA_DIR / f"processed_gps_data_{customer_name}_{year}_{month}.arrow"
+
+def save_month_arrow(processed_gps: pd.DataFrame, customer_name: str, year_month: str):
+    """Save processed GPS reports as an uncompressed (memory-mappable) Arrow IPC file."""
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    filepath = get_month_arrow_path(customer_name, year_month)
+    
+    categories = {col: 'category' for col in DICTIONARY_COLUMNS + [f'in_{customer_name}_polygon']
+                  if col in processed_gps.columns}
+    table = pa.Table.from_pandas(processed_gps.astype(categories), preserve_index=False)
+    
+    # Write next to the file and swap it in: processes that have the old file mapped keep
+    # reading it instead of a file truncated under them
+    tmp_filepath = filepath.with_name(f".{filepath.name}.tmp")
+    feather.write_feather(table, tmp_filepath, compression='uncompressed')
+    os.replace(tmp_filepath, filepath)
+    return filepath
+
+def read_month_arrow(filepath, columns=None) -> pd.DataFrame:
+    """
+    Memory-map an Arrow month file and read only the given columns. Numeric and timestamp
+    columns without nulls are not copied (read-only views of the mapped file).
+    """
+    import pyarrow.feather as feather
+    table = feather.read_table(filepath, columns=columns, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+def read_month_csv(filepath, columns=None) -> pd.DataFrame:
+    time_columns = [c for c in TIME_COLUMNS if columns is None or c in columns]
+    gps_df = pd.read_csv(filepath, usecols=columns, parse_dates=time_columns)
+    
+    # Convert t_diff to timedelta
+    if 't_diff' in gps_df.columns:
+        gps_df['t_diff'] = pd.to_timedelta(gps_df['t_diff'])
+    return gps_df[columns] if columns is not None else gps_df
+
+def read_processed_month(customer_name: str, year_month: str, columns=None) -> pd.DataFrame:
+    """Processed GPS data of a month from its Arrow file, or from the CSV of months without one."""
+    arrow_filepath = get_month_arrow_path(customer_name, year_month)
+    if arrow_filepath.exists():
+        return read_month_arrow(arrow_filepath, columns)
+    year, month = year_month.split('-')
+    return read_month_csv(PROCESSED_DATA_DIR / f"processed_gps_data_{customer_name}_{year}_{month}.csv", columns)
+
+def iter_processed_months(customer_name: str = None):
+    """(customer, year_month, processed GPS CSV path) of every processed month, of one customer if given."""
+    for path in sorted(PROCESSED_DATA_DIR.glob("processed_gps_data_*.csv")):
+        match = re.fullmatch(r"processed_gps_data_(.+)_(\d{4})_(\d{2})\.csv", path.name)
+        if not match or (customer_name and match.group(1) != customer_name):
+            continue
+        yield match.group(1), f"{match.group(2)}-{match.group(3)}", path
+
+def load_month_data(year_month, customer_name='Zim', load_gps=True, columns=None):
+    """
+    Load all data files of a required month.
+    With load_gps=False only the geofence stats and polygon dict are loaded and gps_df is None.
+    columns limits the GPS data to the columns a view needs (all by default).
+    """
+    year, month = year_month.split('-')
+    
+    # Construct filenames
+    arrow_filepath = get_month_arrow_path(customer_name, year_month)
+    gps_filename = f"processed_gps_data_{customer_name}_{year}_{month}.csv"
+    stats_filename = f"geofence_stats_{customer_name}_{year}_{month}.csv"
+    dict_filename = f"polygon_dict_{customer_name}.pkl"
+    
+    # Construct file paths
+    gps_filepath = PROCESSED_DATA_DIR / gps_filename
+    stats_filepath = PROCESSED_DATA_DIR / stats_filename
+    dict_filepath = PROCESSED_DATA_DIR / dict_filename
+    
+    # Check if files exist
+    missing_files = []
+    if load_gps and not arrow_filepath.exists() and not gps_filepath.exists():
+        missing_files.append(gps_filename)
+    if not stats_filepath.exists():
+        missing_files.append(stats_filename)
+    if not dict_filepath.exists():
+        missing_files.append(dict_filename)
+    
+    if missing_files:
+        print(f"Error: The following files are missing for {year_month}:")
+        for file in missing_files:
+            print(f"  - {file}")
+        print(f"Please make sure data for {year_month} has been processed.")
+        return None
+    
+    # Load the data
+    print(f"Loading data for {year_month}...")
+    polygons_df = pd.read_csv(stats_filepath)
+    
+    with open(dict_filepath, 'rb') as f:
+        polygon_dict = pickle.load(f)
+    
+    if not load_gps:
+        return None, polygons_df, polygon_dict
+    
+    gps_df = read_processed_month(customer_name, year_month, columns)
+    
+    return gps_df, polygons_df, polygon_dict
+
+def load_month_summary(year_month, customer_name='Zim'):
+    """
+    Load the month summary written by data_processing.py (headline metrics, land/sea and
+    per-country breakdowns, latency percentiles). Returns None if the month has no summary.
+    """
+    year, month = year_month.split('-')
+    filepath = PROCESSED_DATA_DIR / f"month_summary_{customer_name}_{year}_{month}.json"
+    if not filepath.exists():
+        return None
+    
+    with open(filepath, 'r') as f:
+        return json.load(f)
+
+def load_geofence_points(year_month, geofence_name, customer_name='Zim'):
+    """
+    Load only one geofence's processed GPS points from the per-geofence store.
+    Returns None if the month has no per-geofence store (processed before it existed).
+    """
+    year, month = year_month.split('-')
+    filepath = PROCESSED_DATA_DIR / f"geofence_points_{customer_name}_{year}_{month}.parquet"
+    if not filepath.exists():
+        return None
+    
+    import pyarrow.parquet as pq
+    table = pq.read_table(filepath, filters=[(f'in_{customer_name}_polygon', '==', geofence_name)])
+    return table.to_pandas()
+
+def convert_months_to_arrow(customer_name: str = None, overwrite: bool = False) -> list:
+    """Write the Arrow file of every processed month that only has the CSV."""
+    saved = []
+    for customer, year_month, path in iter_processed_months(customer_name):
+        if get_month_arrow_path(customer, year_month).exists() and not overwrite:
+            continue
+        print(f"Converting {customer} {year_month} to Arrow...")
+        processed_gps = read_month_csv(path)
+        saved.append(save_month_arrow(processed_gps, customer, year_month))
+    return saved
+
+def main():
+    """Main function to convert processed months to memory-mappable Arrow files."""
+    
+    print("\n=== Arrow month files ===")
+    
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--convert", action="store_true", help="Convert every processed month without an Arrow file")
+    parser.add_argument("--customer", default=None, help="Only this customer (default: all)")
+    parser.add_argument("--overwrite", action="store_true", help="Also rewrite existing Arrow files")
+    
+    args = parser.parse_args()
+    
+    if not args.convert:
+        parser.print_help()
+        return 1
+    
+    saved = convert_months_to_arrow(args.customer, args.overwrite)
+    print(f"Saved Arrow files of {len(saved)} months")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,128 @@
+"""
+Batch rendering of single-geofence maps (plot_gps_per_polygon) for a processed month.
+
+The month's geofence points are loaded and partitioned by geofence once in the parent
+process; worker processes inherit the partitions and render one map per geofence into the map cache.
+
+TO RUN:
+    python ./scripts/render_geofence_maps.py --manual
+    python ./scripts/render_geofence_maps.py --manual --top 50
+"""
+from utils import get_default_month, prompt_for_month
+from config import MAP_CACHE_DIR, PROCESSED_DATA_DIR, DEFAULT_CUSTOMER, LATENCY_THRESHOLD_HOURS
+from month_data import load_month_data
+from latency_maps import plot_gps_per_polygon
+from map_cache import put_cached_map, evict_cached_maps
+from dashboard_maps import get_map_key
+
+import os
+import time
+import argparse
+import multiprocessing
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+
+# Month data shared with worker processes (set once per worker by _init_worker)
+_shared = {}
+
+def _init_worker(polygons_df, polygon_dict, partitions, customer_name, year_month, late_H):
+    _shared.update(polygons_df=polygons_df, polygon_dict=polygon_dict, partitions=partitions,
+                   customer_name=customer_name, year_month=year_month, late_H=late_H)
+
+def _render_geofence(geofence_name: str):
+    customer_name = _shared['customer_name']
+    map = plot_gps_per_polygon(
+        polygons_df=_shared['polygons_df'],
+        geofence_name=geofence_name,
+        gps_df=_shared['partitions'][geofence_name],
+        customer_name=customer_name,
+        base_zoom=16,
+        late_H=_shared['late_H'],
+        polygon_dict=_shared['polygon_dict']
+    )
+    # Same key as the dashboard's Single Geofence View, so it is served from the cache
+    cache_key = get_map_key("geofence", customer_name, _shared['year_month'],
+                            geofence=geofence_name, threshold=_shared['late_H'])
+    return put_cached_map(cache_key, map.get_root().render(), evict=False)
+
+def load_geofence_partitions(year_month: str, customer_name: str = DEFAULT_CUSTOMER):
+    """
+    Load the month's points inside geofences and split them by geofence in one pass.
+    Returns (partitions dict, polygons_df, polygon_dict) or None if the month is missing.
+    """
+    col = f'in_{customer_name}_polygon'
+    year, month = year_month.split('-')
+    points_filepath = PROCESSED_DATA_DIR / f"geofence_points_{customer_name}_{year}_{month}.parquet"
+
+    # Prefer the per-geofence store: it holds only geofence rows, already sorted by geofence
+    data = load_month_data(year_month, customer_name, load_gps=not points_filepath.exists())
+    if data is None:
+        return None
+    gps_df, polygons_df, polygon_dict = data
+    if gps_df is None:
+        import pyarrow.parquet as pq
+        gps_df = pq.read_table(points_filepath).to_pandas()
+
+    partitions = {name: group for name, group in gps_df[gps_df[col].notna()].groupby(col, observed=True, sort=False)}
+    return partitions, polygons_df, polygon_dict
+
+def render_geofence_maps(year_month: str, customer_name: str = DEFAULT_CUSTOMER, top_n: int = None,
+                         workers: int = None, late_H: int = LATENCY_THRESHOLD_HOURS, progress_callback=None):
+    """
+    Render single-geofence maps for every geofence with data (or the top_n by severity)
+    across a process pool. Returns the list of saved map paths.
+    progress_callback(done, total) is called as maps complete.
+    """
+    loaded = load_geofence_partitions(year_month, customer_name)
+    if loaded is None:
+        return []
+    partitions, polygons_df, polygon_dict = loaded
+
+    with_data = polygons_df[polygons_df['total_messages'] > 0].sort_values('severity', ascending=False)
+    geofences = [name for name in with_data['LocationName'] if name in partitions]
+    if top_n is not None:
+        geofences = geofences[:top_n]
+
+    workers = min(workers or os.cpu_count(), max(len(geofences), 1))
+    print(f"Rendering {len(geofences)} geofence maps with {workers} workers...")
+    start = time.perf_counter()
+
+    # Fork lets workers share the partitions copy-on-write instead of pickling them
+    context = multiprocessing.get_context('fork') if 'fork' in multiprocessing.get_all_start_methods() else None
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(polygons_df, polygon_dict, partitions, customer_name, year_month, late_H)) as executor:
+        map_paths = []
+        for map_path in executor.map(_render_geofence, geofences, chunksize=8):
+            map_paths.append(map_path)
+            if progress_callback is not None:
+                progress_callback(len(map_paths), len(geofences))
+
+    # One eviction pass for the whole batch, after it: the batch's own maps are kept even if
+    # they alone exceed MAP_CACHE_MAX_MB, so every geofence map stays pre-rendered
+    evict_cached_maps(keep=map_paths)
+    print(f"Saved {len(map_paths)} geofence maps to {MAP_CACHE_DIR} in {time.perf_counter() - start:.1f}s")
+    return map_paths
+
+def main():
+    """Main function to render all single-geofence maps of a month."""
+
+    print("\n=== Render single-geofence maps ===")
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--manual", action="store_true", help="Manually select month")
+    parser.add_argument("--customer", default=DEFAULT_CUSTOMER, help="Customer name (default: Zim)")
+    parser.add_argument("--top", type=int, default=None,
+                        help="Only render the N geofences with the highest severity")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: all cores)")
+
+    args = parser.parse_args()
+
+    year_month = prompt_for_month() if args.manual else get_default_month()
+    month_name = datetime.strptime(year_month.split('-')[1], "%m").strftime("%B")
+    print(f"Rendering geofence maps for {args.customer} in {month_name} {year_month.split('-')[0]}...")
+
+    map_paths = render_geofence_maps(year_month, args.customer, top_n=args.top, workers=args.workers)
+    return 0 if map_paths else 1
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,190 @@
+"""
+Stratified sample of a processed month for the dashboard preview mode.
+
+Reports are split into strata by geofence (or none), land/sea and late/normal at the latency
+threshold. Each stratum contributes rows in proportion to its size (about SAMPLE_ROWS in total)
+but at least SAMPLE_MIN_STRATUM_ROWS, so small geofences and the rare late reports stay
+represented. Every sampled row carries weight = stratum size / sampled rows: weighted counts
+of a stratum equal its exact counts, so land/sea, geofence and late totals are preserved and
+the sample's heatmaps keep the month's late/normal balance.
+
+Other figures (late reports at another threshold, latency percentiles) are estimated with 95%
+bounds: stratified variance for counts, Woodruff intervals for percentiles. Distinct devices
+cannot be estimated from a sample; the preview shows those seen in it as a lower bound.
+
+data_processing.py saves the sample as data/processed/gps_sample_<customer>_<year>_<month>.parquet.
+
+TO RUN (samples of months processed before they existed):
+    python ./scripts/sampling.py --rebuild
+"""
+from config import (
+    PROCESSED_DATA_DIR,
+    DEFAULT_CUSTOMER,
+    LATENCY_THRESHOLD_HOURS,
+    SAMPLE_ROWS,
+    SAMPLE_MIN_STRATUM_ROWS
+)
+from month_data import iter_processed_months, read_processed_month
+
+import argparse
+import numpy as np
+import pandas as pd
+
+Z_95 = 1.96
+PERCENTILES = [50, 75, 90, 95, 99]
+
+def get_sample_path(customer_name: str, year_month: str):
+    year, month = year_month.split('-')
+    return PROCESSED_DATA_DIR / f"gps_sample_{customer_name}_{year}_{month}.parquet"
+
+def stratified_sample(processed_gps: pd.DataFrame, customer_name: str = DEFAULT_CUSTOMER,
+                      latency_threshold: int = LATENCY_THRESHOLD_HOURS, sample_rows: int = SAMPLE_ROWS,
+                      min_stratum_rows: int = SAMPLE_MIN_STRATUM_ROWS, seed: int = 0) -> pd.DataFrame:
+    """Sampled reports (without PayloadData) with their stratum and weight columns."""
+    geofence_codes, _ = pd.factorize(processed_gps[f'in_{customer_name}_polygon'])  # -1 outside geofences
+    in_sea = processed_gps['in_Sea'].values.astype(np.int64)
+    late = (processed_gps['t_diff'] >= pd.Timedelta(hours=latency_threshold)).values.astype(np.int64)
+    _, stratum, stratum_size = np.unique((geofence_codes + 1) * 4 + in_sea * 2 + late,
+                                         return_inverse=True, return_counts=True)
+
+    # Proportional allocation with a floor per stratum, capped at the stratum size
+    total = max(len(processed_gps), 1)
+    stratum_rows = np.minimum(stratum_size, np.maximum(min_stratum_rows,
+                                                       np.ceil(stratum_size * sample_rows / total))).astype(np.int64)
+
+    # Rows in random order within each stratum; keep the first stratum_rows of each
+    order = np.lexsort((np.random.default_rng(seed).random(len(stratum)), stratum))
+    starts = np.concatenate([[0], np.cumsum(stratum_size)[:-1]])
+    rank = np.arange(len(order)) - starts[stratum[order]]
+    keep = np.sort(order[rank < stratum_rows[stratum[order]]])
+
+    sample = processed_gps.iloc[keep].drop(columns=['PayloadData'], errors='ignore').reset_index(drop=True)
+    sample['stratum'] = stratum[keep].astype(np.int32)
+    sample['weight'] = (stratum_size / stratum_rows)[stratum[keep]]
+    return sample
+
+def save_gps_sample(sample: pd.DataFrame, customer_name: str, year_month: str):
+    filepath = get_sample_path(customer_name, year_month)
+    sample.to_parquet(filepath, index=False)
+    return filepath
+
+def load_gps_sample(year_month: str, customer_name: str = DEFAULT_CUSTOMER):
+    """Stratified sample of a month, or None if it was not computed."""
+    filepath = get_sample_path(customer_name, year_month)
+    return pd.read_parquet(filepath) if filepath.exists() else None
+
+def estimate_total(sample: pd.DataFrame, values) -> tuple:
+    """Estimated sum of values over the month and its 95% margin (stratified variance)."""
+    values = np.asarray(values, dtype=np.float64)
+    strata = pd.DataFrame({'stratum': sample['stratum'].values, 'y': values, 'y2': values**2,
+                           'weight': sample['weight'].values}).groupby('stratum')
+    n = strata['y'].size()
+    stratum_size = strata['weight'].sum()
+    y_sum, y2_sum = strata['y'].sum(), strata['y2'].sum()
+    variance_within = ((y2_sum - y_sum**2 / n) / (n - 1).where(n > 1)).fillna(0).clip(lower=0)
+    variance = (stratum_size**2 * (1 - n / stratum_size) * variance_within / n).sum()
+    return float((sample['weight'].values * values).sum()), float(Z_95 * np.sqrt(max(variance, 0)))
+
+def _weighted_quantiles(values: np.ndarray, weights: np.ndarray, q: np.ndarray) -> np.ndarray:
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    pos = np.searchsorted(cumulative, np.clip(q, 0, 1) * cumulative[-1])
+    return values[order][np.minimum(pos, len(values) - 1)]
+
+def estimate_percentiles(values: np.ndarray, weights: np.ndarray, percentiles=PERCENTILES) -> dict:
+    """Weighted percentiles with 95% Woodruff bounds: {'p50': [estimate, low, high], ...}."""
+    known = ~np.isnan(values)
+    values, weights = values[known], weights[known]
+    if len(values) == 0:
+        return {f"p{p}": [np.nan, np.nan, np.nan] for p in percentiles}
+    q = np.asarray(percentiles) / 100
+    effective_rows = weights.sum()**2 / (weights**2).sum()
+    spread = Z_95 * np.sqrt(q * (1 - q) / effective_rows)
+    estimate, low, high = (_weighted_quantiles(values, weights, x) for x in (q, q - spread, q + spread))
+    return {f"p{p}": [round(float(e), 2), round(float(lo), 2), round(float(hi), 2)]
+            for p, e, lo, hi in zip(percentiles, estimate, low, high)}
+
+def _estimated_counts(sample: pd.DataFrame, rows: np.ndarray, latency: np.ndarray) -> tuple:
+    reports, reports_margin = estimate_total(sample, rows)
+    latency_reports, latency_margin = estimate_total(sample, rows & latency)
+    counts = {'reports': int(round(reports)), 'devices': int(sample.loc[rows, 'DeviceID'].nunique()),
+              'latency_reports': int(round(latency_reports))}
+    return counts, {'reports': round(reports_margin), 'latency_reports': round(latency_margin)}
+
+def estimate_month_summary(sample: pd.DataFrame, polygon_stats: pd.DataFrame,
+                           customer_name: str = DEFAULT_CUSTOMER,
+                           latency_threshold: int = LATENCY_THRESHOLD_HOURS) -> dict:
+    """
+    Month summary (see data_processing.compute_month_summary) estimated from the sample, with
+    the sample size and 95% margins under 'preview'. Devices are those seen in the sample.
+    """
+    col = f'in_{customer_name}_polygon'
+    in_sea = sample['in_Sea'].values.astype(bool)
+    in_geofence = sample[col].notna().values
+    latency = (sample['t_diff'] >= pd.Timedelta(hours=latency_threshold)).values
+    everything = np.ones(len(sample), dtype=bool)
+
+    areas, margins = {}, {}
+    for area, rows in [('total', everything), ('land', ~in_sea), ('sea', in_sea), ('in_geofences', in_geofence)]:
+        areas[area], margins[area] = _estimated_counts(sample, rows, latency)
+
+    geofence_country = polygon_stats.drop_duplicates('LocationName').set_index('LocationName')['Country']
+    countries = sample.loc[in_geofence, col].astype(str).map(geofence_country).fillna('Unknown').values
+    weights = sample['weight'].values[in_geofence]
+    by_country = pd.DataFrame({
+        'reports': weights, 'latency_reports': weights * latency[in_geofence],
+        'DeviceID': sample['DeviceID'].values[in_geofence],
+    }).groupby(countries, sort=True).agg(reports=('reports', 'sum'), devices=('DeviceID', 'nunique'),
+                                         latency_reports=('latency_reports', 'sum'))
+    by_country = by_country.round().astype(int).to_dict('index')
+
+    land_hours = sample.loc[~in_sea, 't_diff'].dt.total_seconds().values / 3600
+    land_percentiles = estimate_percentiles(land_hours, sample['weight'].values[~in_sea])
+
+    return {
+        'customer': customer_name,
+        'latency_threshold_hours': latency_threshold,
+        **areas,
+        'total_geofences': int(len(polygon_stats)),
+        'geofences_with_data': int((polygon_stats['total_messages'] > 0).sum()),
+        'land_latency_percentiles_hours': {p: values[0] for p, values in land_percentiles.items()},
+        'by_country': by_country,
+        'deduplication': None,
+        'backlog_flushes': None,
+        'preview': {
+            'sample_reports': int(len(sample)),
+            'margins': margins,
+            'land_latency_percentile_bounds_hours': {p: values[1:] for p, values in land_percentiles.items()},
+        },
+    }
+
+def rebuild_gps_samples(customer_name: str = None) -> list:
+    """Draw the sample of every processed month from its processed GPS data."""
+    saved = []
+    for customer, year_month, _ in iter_processed_months(customer_name):
+        print(f"Sampling {customer} {year_month}...")
+        processed_gps = read_processed_month(customer, year_month)
+        saved.append(save_gps_sample(stratified_sample(processed_gps, customer), customer, year_month))
+    return saved
+
+def main():
+    """Main function to draw the preview samples of processed months."""
+
+    print("\n=== Preview samples ===")
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rebuild", action="store_true", help="Draw the sample of every processed month")
+    parser.add_argument("--customer", default=None, help="Only this customer (default: all)")
+
+    args = parser.parse_args()
+
+    if not args.rebuild:
+        parser.print_help()
+        return 1
+
+    saved = rebuild_gps_samples(args.customer)
+    print(f"Saved samples of {len(saved)} months")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,340 @@
+"""
+Local read-only HTTP/JSON API over the processed month statistics, for tools that only need
+a few numbers (no Streamlit, no parsing of the stats CSVs).
+
+Months are loaded once into memory (geofence stats, month summary, device aggregates) and
+shared by all request threads. The files a month is loaded from are checked on each request
+(one stat call each): when one of them is rewritten (reprocessing or a --rebuild), the month
+is reloaded. Responses carry an ETag (from the files' names, sizes and modification times) and
+Last-Modified (newest file), so clients revalidate with If-None-Match / If-Modified-Since and
+get 304 Not Modified.
+
+Endpoints (all GET):
+    /months                                      processed months in the catalog
+    /<customer>/<YYYY-MM>/summary                month summary
+    /<customer>/<YYYY-MM>/geofences              geofence stats; ?country=, ?country_code=,
+                                                 ?min_severity=, ?max_severity=, ?min_messages=,
+                                                 ?sort=severity, ?order=desc, ?limit=100, ?offset=0
+    /<customer>/<YYYY-MM>/geofences/<name>       one geofence, with its polygon
+    /<customer>/<YYYY-MM>/devices                device aggregates; ?min_reports=, ?sort=late_reports,
+                                                 ?order=desc, ?limit=100, ?offset=0
+    /<customer>/<YYYY-MM>/devices/<DeviceID>     one device, with its geofences
+
+TO RUN:
+    python ./scripts/stats_api.py [--port 8766]
+    curl "http://localhost:8766/Zim/2025-01/geofences?country=Spain&min_severity=20&limit=10"
+"""
+from config import PROCESSED_DATA_DIR, STATS_API_PORT, STATS_API_MAX_MONTHS
+from catalog import CATALOG_PATH, load_catalog
+from month_data import load_month_summary
+from device_stats import get_device_stats_path
+
+import json
+import hashlib
+import argparse
+import threading
+import pandas as pd
+from datetime import datetime, timezone
+from collections import OrderedDict
+from email.utils import format_datetime, parsedate_to_datetime
+from urllib.parse import urlsplit, parse_qs, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+GEOFENCE_COLUMNS = ['LocationName', 'CountryCode', 'Country', 'total_messages', 'total_devices', 'latency_messages',
+                    'latency_devices', 'latency_messages_ratio', 'latency_device_ratio', 'severity']
+# Months processed before backlog flush detection have no flush columns
+FLUSH_COLUMNS = ['flush_messages', 'flush_latency_messages', 'steady_latency_messages', 'flush_latency_share']
+DEVICE_LIST_COLUMNS = ['geofences', 'late_geofences']
+MAX_PAGE_SIZE = 1000
+
+_months = OrderedDict()  # (customer, month) -> loaded month, least recently used first
+_months_lock = threading.Lock()
+_catalog = {'mtime_ns': None, 'entries': {}}
+
+class ApiError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+def get_catalog() -> dict:
+    """Catalog entries, reloaded only when catalog.json changes."""
+    mtime_ns = CATALOG_PATH.stat().st_mtime_ns if CATALOG_PATH.exists() else None
+    with _months_lock:
+        if mtime_ns != _catalog['mtime_ns']:
+            _catalog.update(mtime_ns=mtime_ns, entries=load_catalog())
+        return _catalog['entries']
+
+def get_entry_version(entry: dict) -> str:
+    """Version of a catalog entry: changes when any of the month's files changes."""
+    checksums = "|".join(f"{name}:{info['sha256']}" for name, info in sorted(entry['files'].items()))
+    return hashlib.sha1(checksums.encode()).hexdigest()[:16]
+
+def get_month_paths(customer_name: str, year_month: str) -> list:
+    """Files a month is loaded from: geofence stats, month summary and device aggregates."""
+    year, month = year_month.split('-')
+    return [PROCESSED_DATA_DIR / f"geofence_stats_{customer_name}_{year}_{month}.csv",
+            PROCESSED_DATA_DIR / f"month_summary_{customer_name}_{year}_{month}.json",
+            get_device_stats_path(customer_name, year_month)]
+
+def get_month_version(customer_name: str, year_month: str) -> tuple:
+    """
+    Version (name, size, modification time of the month's files, as map_cache.get_data_version)
+    and modification time (newest file) of a month, or (None, None) if it has no geofence stats.
+    """
+    parts, mtimes = [], []
+    for path in get_month_paths(customer_name, year_month):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        parts.append(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}")
+        mtimes.append(stat.st_mtime)
+    if not parts or not parts[0].startswith("geofence_stats_"):
+        return None, None
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16], datetime.fromtimestamp(max(mtimes), timezone.utc)
+
+def _load_month(customer_name: str, year_month: str) -> dict:
+    stats_path = get_month_paths(customer_name, year_month)[0]
+    geofences = pd.read_csv(stats_path, usecols=lambda c: c in GEOFENCE_COLUMNS + FLUSH_COLUMNS + ['Polygon_coords'],
+                            keep_default_na=False, na_values=[''])
+    device_stats_path = get_device_stats_path(customer_name, year_month)
+    devices = pd.read_parquet(device_stats_path) if device_stats_path.exists() else None
+    if devices is not None:
+        devices['late_ratio'] = (devices['late_reports'] / devices['reports'] * 100).round(2)
+        devices['mean_latency_hours'] = (devices['latency_sum_hours'] / devices['latency_count']).round(2)
+    return {
+        'geofences': geofences.set_index('LocationName', drop=False),
+        'geofence_columns': [c for c in GEOFENCE_COLUMNS + FLUSH_COLUMNS if c in geofences.columns],
+        'summary': load_month_summary(year_month, customer_name),
+        'devices': devices.set_index('DeviceID', drop=False) if devices is not None else None,
+    }
+
+def get_month(customer_name: str, year_month: str) -> dict:
+    """Loaded month with its version and modification time (cached in memory)."""
+    version, last_modified = get_month_version(customer_name, year_month)
+    if version is None:
+        raise ApiError(404, f"Month {year_month} of {customer_name} has not been processed")
+
+    key = (customer_name, year_month)
+    with _months_lock:
+        month = _months.get(key)
+        if month is None or month['version'] != version:
+            month = _months[key] = {'version': version, 'lock': threading.Lock(), 'data': None,
+                                    'last_modified': last_modified}
+        _months.move_to_end(key)
+        while len(_months) > STATS_API_MAX_MONTHS:
+            _months.popitem(last=False)
+
+    # One thread loads the month, concurrent requests for it wait here
+    with month['lock']:
+        if month['data'] is None:
+            month['data'] = _load_month(customer_name, year_month)
+    return month
+
+def _records(df: pd.DataFrame) -> list:
+    """JSON-ready records of a frame (NaN as null, numpy types as Python types)."""
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
+def _paginate(df: pd.DataFrame, params: dict, sort_columns: list, default_sort: str) -> dict:
+    sort = params.get('sort', default_sort)
+    if sort not in sort_columns:
+        raise ApiError(400, f"Unknown sort column {sort!r} (one of {', '.join(sort_columns)})")
+    order = params.get('order', 'desc')
+    if order not in ('asc', 'desc'):
+        raise ApiError(400, "order must be 'asc' or 'desc'")
+    limit = min(_int_param(params, 'limit', 100), MAX_PAGE_SIZE)
+    offset = _int_param(params, 'offset', 0)
+
+    df = df.sort_values(sort, ascending=(order == 'asc'), kind='stable')
+    return {'total': int(len(df)), 'offset': offset, 'limit': limit, 'sort': sort, 'order': order,
+            'items': _records(df.iloc[offset:offset + limit])}
+
+def _int_param(params: dict, name: str, default: int) -> int:
+    try:
+        value = int(params.get(name, default))
+    except ValueError:
+        raise ApiError(400, f"{name} must be an integer")
+    if value < 0:
+        raise ApiError(400, f"{name} must not be negative")
+    return value
+
+def _float_param(params: dict, name: str):
+    if name not in params:
+        return None
+    try:
+        return float(params[name])
+    except ValueError:
+        raise ApiError(400, f"{name} must be a number")
+
+def list_geofences(month: dict, params: dict) -> dict:
+    geofences = month['data']['geofences']
+    mask = pd.Series(True, index=geofences.index)
+    if 'country' in params:
+        mask &= geofences['Country'].str.lower() == params['country'].lower()
+    if 'country_code' in params:
+        mask &= geofences['CountryCode'].str.upper() == params['country_code'].upper()
+    for name, column, compare in [('min_severity', 'severity', 'ge'), ('max_severity', 'severity', 'le'),
+                                  ('min_messages', 'total_messages', 'ge')]:
+        value = _float_param(params, name)
+        if value is not None:
+            mask &= getattr(geofences[column], compare)(value)
+    columns = month['data']['geofence_columns']
+    return _paginate(geofences.loc[mask, columns], params, columns, 'severity')
+
+def get_geofence(month: dict, name: str) -> dict:
+    geofences = month['data']['geofences']
+    if name not in geofences.index:
+        raise ApiError(404, f"Unknown geofence {name!r}")
+    record = _records(geofences.loc[[name], month['data']['geofence_columns']])[0]
+    record['polygon'] = json.loads(geofences.at[name, 'Polygon_coords'])
+    return record
+
+def _devices(month: dict) -> pd.DataFrame:
+    devices = month['data']['devices']
+    if devices is None:
+        raise ApiError(404, "No device aggregates for this month (run device_stats.py --rebuild)")
+    return devices
+
+def list_devices(month: dict, params: dict) -> dict:
+    devices = _devices(month)
+    devices = devices[devices['reports'] >= _int_param(params, 'min_reports', 0)]
+    columns = [c for c in devices.columns if c not in DEVICE_LIST_COLUMNS]
+    return _paginate(devices[columns], params, columns, 'late_reports')
+
+def get_device(month: dict, device_id: str) -> dict:
+    devices = _devices(month)
+    if device_id not in devices.index:
+        raise ApiError(404, f"Unknown device {device_id!r}")
+    record = _records(devices.loc[[device_id]].drop(columns=DEVICE_LIST_COLUMNS))[0]
+    for column in DEVICE_LIST_COLUMNS:
+        record[column] = [str(name) for name in devices.at[device_id, column]]
+    return record
+
+def handle_request(path: str, params: dict):
+    """
+    Route a GET request. Returns (body, version, last_modified): the JSON-ready body, and the
+    data version and modification time used for the caching headers.
+    """
+    parts = [unquote(part) for part in path.strip('/').split('/') if part]
+    if parts == ['months']:
+        catalog = get_catalog()
+        months = [{key: entry[key] for key in ['customer', 'month', 'rows', 'geofence_rows', 'first_event',
+                                                'last_event', 'processed_at']} for _, entry in sorted(catalog.items())]
+        version = hashlib.sha1("|".join(get_entry_version(e) for _, e in sorted(catalog.items())).encode()).hexdigest()[:16]
+        last_modified = max((datetime.fromisoformat(m['processed_at']).astimezone(timezone.utc) for m in months),
+                            default=None)
+        return {'months': months}, version, last_modified
+
+    if len(parts) < 3:
+        raise ApiError(404, "Not found")
+    customer_name, year_month, resource = parts[:3]
+    month = get_month(customer_name, year_month)
+
+    if resource == 'summary' and len(parts) == 3:
+        if month['data']['summary'] is None:
+            raise ApiError(404, "No summary for this month")
+        body = month['data']['summary']
+    elif resource == 'geofences' and len(parts) == 3:
+        body = list_geofences(month, params)
+    elif resource == 'geofences' and len(parts) == 4:
+        body = get_geofence(month, parts[3])
+    elif resource == 'devices' and len(parts) == 3:
+        body = list_devices(month, params)
+    elif resource == 'devices' and len(parts) == 4:
+        body = get_device(month, parts[3])
+    else:
+        raise ApiError(404, "Not found")
+    return body, month['version'], month['last_modified']
+
+class _StatsHandler(BaseHTTPRequestHandler):
+    quiet = False
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            body, version, last_modified = handle_request(url.path, params)
+        except ApiError as e:
+            return self._send_json(e.status, {'error': str(e)})
+        except Exception as e:
+            return self._send_json(500, {'error': f"{type(e).__name__}: {e}"})
+
+        # The representation depends on the data version and on the request (path and parameters)
+        etag = '"' + hashlib.sha1(f"{version}|{self.path}".encode()).hexdigest()[:20] + '"'
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if last_modified is not None:
+            headers['Last-Modified'] = format_datetime(last_modified.replace(microsecond=0), usegmt=True)
+        if self._not_modified(etag, last_modified):
+            return self._send(304, b'', headers)
+        self._send_json(200, body, headers)
+
+    do_HEAD = do_GET
+
+    def _not_modified(self, etag: str, last_modified) -> bool:
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        if_modified_since = self.headers.get('If-Modified-Since')
+        if if_modified_since and last_modified is not None:
+            try:
+                return last_modified.replace(microsecond=0) <= parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def _send_json(self, status: int, body, headers: dict = None):
+        payload = json.dumps(body, default=str).encode()
+        self._send(status, payload, {'Content-Type': 'application/json', **(headers or {})})
+
+    def _send(self, status: int, payload: bytes, headers: dict):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status != 304:
+            self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if self.command != 'HEAD' and status != 304:
+            self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        if not self.quiet:
+            super().log_message(format, *args)
+
+def _make_server(port: int, host: str, quiet: bool) -> ThreadingHTTPServer:
+    return ThreadingHTTPServer((host, port), type('StatsHandler', (_StatsHandler,), {'quiet': quiet}))
+
+def start_stats_api(port: int = STATS_API_PORT, host: str = "localhost", quiet: bool = False) -> ThreadingHTTPServer:
+    """Serve the stats API from a daemon thread."""
+    server = _make_server(port, host, quiet)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"Serving processed stats on http://{host}:{port}")
+    return server
+
+def main():
+    """Main function to serve the processed stats API until interrupted."""
+
+    print("\n=== Processed stats API ===")
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=STATS_API_PORT, help=f"Port (default: {STATS_API_PORT})")
+    parser.add_argument("--host", default="localhost", help="Interface to listen on (default: localhost)")
+    parser.add_argument("--quiet", action="store_true", help="Do not log requests")
+
+    args = parser.parse_args()
+
+    if not CATALOG_PATH.exists():
+        print(f"No catalog found at {CATALOG_PATH} (run catalog.py --rebuild)")
+        return 1
+
+    server = _make_server(args.port, args.host, args.quiet)
+    print(f"Serving processed stats on http://{args.host}:{args.port} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -2,14 +2,25 @@ import streamlit as st
 import pandas as pd
 from datetime import datetime
 
-from latency_maps import (
-    load_month_data, 
-    plot_latency, 
-    plot_dual_gps_heatmap, 
-    plot_gps_per_polygon
+from month_data import load_month_summary
+from catalog import load_catalog, get_catalog_customers, get_catalog_months
+from month_cache import get_month_data, get_month_geofences, get_month_cache_stats
+from map_cache import get_data_version, get_cached_map, get_cache_stats
+from dashboard_maps import get_map_key, render_map
+from sampling import get_sample_path, load_gps_sample, estimate_month_summary
+from device_stats import top_devices, get_device_stats_months, SORT_COLUMNS
+from visits import load_geofence_visits, summarize_visits
+from candidate_geofences import load_candidate_geofences
+from device_sets import devices_in_all_months
+from jobs import submit_job, find_job, get_job, list_jobs, describe_job, STEP_NAMES, ACTIVE_STATUSES
+from heatmap_tiles import (
+    load_tiles_info,
+    start_tile_server,
+    tile_url
 )
+from utils import get_default_month
 
-from config import BASE_DIR, PROCESSED_DATA_DIR, MAPS_DIR, LATENCY_THRESHOLD_HOURS
+from config import BASE_DIR, PROCESSED_DATA_DIR, DEFAULT_CUSTOMER, LATENCY_THRESHOLD_HOURS, PREVIEW_DEFAULT_MIN_ROWS
 
 # TO RUN:
 # streamlit run ./scripts/streamlit_app.py    
@@ -21,6 +32,101 @@ st.set_page_config(
     layout="wide"
 )
 
+@st.cache_resource
+def get_tile_server():
+    """Start the local heatmap tile server once per app process."""
+    try:
+        return start_tile_server()
+    except OSError:
+        # Port already bound, e.g. by another app process serving the same tiles
+        return None
+
+def get_gps_data(year_month, customer_name):
+    """Processed GPS data of a month, loaded into the shared month cache on first use."""
+    data = get_month_data(year_month, customer_name)
+    if data is None:
+        raise FileNotFoundError(f"Processed GPS data for {year_month} is missing. Please process this month's data first.")
+    return data[0]
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def get_preview_summary(year_month, customer_name, data_version):
+    """Month summary estimated from the month's sample (data_version keys out reprocessed months)."""
+    _, polygons_df, _ = get_month_geofences(year_month, customer_name)
+    return estimate_month_summary(load_gps_sample(year_month, customer_name), polygons_df,
+                                  customer_name, LATENCY_THRESHOLD_HOURS)
+
+def show_preview_map(map_type, customer_name, year_month, force_recreate=False, **params):
+    """Map drawn from the month's sample: rendered in the app (seconds) instead of by a background job."""
+    cache_key = get_map_key(map_type, customer_name, year_month, preview=True, **params)
+    map_html = None if force_recreate else get_cached_map(cache_key)
+    if map_html is None:
+        with st.spinner("Rendering preview from the sample..."):
+            render_map(map_type, customer_name, year_month, preview=True, **params)
+        map_html = get_cached_map(cache_key)
+    st.components.v1.html(map_html, height=600)
+
+@st.fragment(run_every=2)
+def show_job_progress(job_id):
+    """Progress of a background job; reruns the app once it is done so its artifact shows up."""
+    job = get_job(job_id)
+    if job is None or job['status'] == 'done':
+        st.rerun()
+    elif job['status'] == 'failed':
+        st.error(f"{describe_job(job)} failed: {job['error']}. Press 'Refresh Map' to retry.")
+    else:
+        st.progress(job['progress'], text=f"{job['message']}...")
+
+def wait_for_artifact(steps, customer_name, year_month, retry=False, **params):
+    """
+    Start a background job producing a missing artifact (or attach to the one already running)
+    and show its progress instead of blocking the page. A failed job is only retried on request
+    or once the month has been reprocessed.
+    """
+    params['data_version'] = get_data_version(customer_name, year_month)
+    job = find_job(steps, customer_name, year_month, **params)
+    if job is None or job['status'] == 'done' or (job['status'] == 'failed' and retry):
+        job = get_job(submit_job(steps, customer_name, year_month, **params))
+    show_job_progress(job['id'])
+
+@st.fragment(run_every=3)
+def show_jobs_panel():
+    """Recent background jobs. Reruns the app when a job finishes so new data and maps are picked up."""
+    jobs = list_jobs(limit=8)
+    finished = {job['id'] for job in jobs if job['status'] not in ACTIVE_STATUSES}
+    if 'finished_jobs' not in st.session_state:
+        st.session_state['finished_jobs'] = finished
+    elif finished - st.session_state['finished_jobs']:
+        st.session_state['finished_jobs'] |= finished
+        st.rerun()
+    
+    with st.expander("Jobs", expanded=any(job['status'] in ACTIVE_STATUSES for job in jobs)):
+        if not jobs:
+            st.caption("No jobs yet.")
+        for job in jobs:
+            st.caption(f"**{job['status'].capitalize()}** · {describe_job(job)}")
+            if job['status'] in ACTIVE_STATUSES:
+                st.progress(job['progress'], text=job['message'])
+            elif job['status'] == 'failed':
+                st.caption(f":red[{job['error']}]")
+
+def show_pipeline_controls():
+    """Start query -> process -> map pre-rendering for a month as a background job."""
+    with st.sidebar.expander("Run pipeline", expanded=False):
+        run_customer = st.text_input("Customer", value=DEFAULT_CUSTOMER)
+        run_month = st.text_input("Month [YYYY-MM]", value=get_default_month())
+        run_steps = [step for step in ['query', 'process', 'render_maps']
+                     if st.checkbox(STEP_NAMES[step], value=True, key=f"run_{step}")]
+        low_memory = st.checkbox("Low-memory processing", value=False)
+        
+        if st.button("Start", disabled=not run_steps):
+            try:
+                datetime.strptime(run_month, "%Y-%m")
+            except ValueError:
+                st.error("Invalid month! Please use YYYY-MM format (e.g., 2025-01)")
+                return
+            submit_job(run_steps, run_customer, run_month, low_memory=low_memory)
+            st.success("Job started.")
+
 def main():
     # Title and description
     st.title("GPS Latency Monthly Analysis Dashboard")
@@ -29,43 +135,86 @@ def main():
     # Sidebar with controls
     st.sidebar.header("Controls")
     
-    # Available months
-    available_months = ["2024-11", "2024-12", "2025-01", "2025-02", "2025-03"]
+    # Background pipeline runs and their progress
+    show_pipeline_controls()
+    with st.sidebar:
+        show_jobs_panel()
     
-    # Month selection
+    # Processed customers and months, as recorded by data_processing.py
+    catalog = load_catalog()
+    if not catalog:
+        st.error("No processed months found. Process a month with data_processing.py "
+                 "(or run catalog.py --rebuild for months processed earlier).")
+        return
+    
+    # Customer selection
+    customer_name = st.sidebar.selectbox(
+        "Select Customer",
+        get_catalog_customers(catalog),
+        index=0
+    )
+    
+    # Month selection (most recent first)
     selected_month = st.sidebar.selectbox(
         "Select Month",
-        available_months,
+        get_catalog_months(catalog, customer_name),
         index=0
     )
     
     year, month = selected_month.split('-')
     month_name = datetime.strptime(month, "%m").strftime("%B")
     
-    # Customer selection (for future expansion)
-    customer_name = st.sidebar.selectbox(
-        "Select Customer",
-        ["Zim"],
-        index=0
+    # Month metadata straight from the catalog, no data loaded
+    month_info = catalog[f"{customer_name}/{selected_month}"]
+    st.sidebar.caption(
+        f"{month_info['rows']:,} GPS reports ({month_info['geofence_rows']:,} in geofences, "
+        f"{month_info['sea_rows']:,} at sea)  \n"
+        f"Events {month_info['first_event'][:10]} to {month_info['last_event'][:10]}  \n"
+        f"{month_info['total_bytes'] / 1024**2:,.1f} MB on disk, processed {month_info['processed_at'][:10]}  \n"
+        f"Geofence version {month_info['geofence_version']}"
+    )
+    
+    # Preview mode: views and statistics from the month's stratified sample (sampling.py)
+    has_sample = get_sample_path(customer_name, selected_month).exists()
+    preview = st.sidebar.toggle(
+        "Preview mode (sample)",
+        value=has_sample and month_info['rows'] >= PREVIEW_DEFAULT_MIN_ROWS,
+        disabled=not has_sample,
+        help="Render the maps and statistics from a stratified sample of the month in seconds, "
+             "with 95% error bounds. Switch off for exact figures." if has_sample else
+             "This month has no sample (python ./scripts/sampling.py --rebuild)."
     )
     
     # Map type selection
     map_type = st.sidebar.radio(
         "Select Map Type",
-        ["GPS Latency in Geofences", "GPS Heatmap (dual)", "Single Geofence View"]
+        ["GPS Latency in Geofences", "GPS Heatmap (dual)", "GPS Heatmap (tiles)", "Single Geofence View"]
     )
 
     # Add force recreate button
     force_recreate = st.sidebar.button("Refresh Map")
     
+    # Map cache counters for monitoring
+    with st.sidebar.expander("Map cache", expanded=False):
+        cache_stats = get_cache_stats()
+        lookups = cache_stats['hits'] + cache_stats['misses']
+        st.caption(f"Hits: {cache_stats['hits']:,} / Misses: {cache_stats['misses']:,}"
+                   f" ({cache_stats['hits'] / lookups * 100 if lookups else 0:.0f}% hit rate)")
+        st.caption(f"Stale: {cache_stats['stale']:,} / Evicted: {cache_stats['evictions']:,}")
+        month_stats = get_month_cache_stats()
+        st.caption(f"Months in memory: {', '.join(month_stats['months']) or 'none'}"
+                   f" ({month_stats['size_mb']:,.0f} MB, {month_stats['evictions']:,} evicted)")
+    
     # Load data or display error
     try:
-        data = load_month_data(selected_month, customer_name)
+        # Shared across reruns and sessions; only the first request for a month reads disk.
+        # The GPS data itself is loaded only by the views that need it (get_gps_data)
+        data = get_month_geofences(selected_month, customer_name)
         if data is None:
             st.error(f"Data files for {selected_month} are missing. Please process this month's data first.")
             return
         
-        gps_df, polygons_df, polygon_dict = data
+        _, polygons_df, polygon_dict = data
         
         # # Display basic stats
         # with st.expander("Dataset Statistics", expanded=False):
@@ -83,65 +232,75 @@ def main():
         with st.container():
             # Add a title for the statistics section
             st.subheader(f"Monthly Statistics: {month_name} {year}")
-            display_dashboard_statistics(gps_df, polygons_df, customer_name, LATENCY_THRESHOLD_HOURS)
+            summary = None if preview else load_month_summary(selected_month, customer_name)
+            if preview:
+                summary = get_preview_summary(selected_month, customer_name,
+                                              get_data_version(customer_name, selected_month))
+            elif summary is None or summary['latency_threshold_hours'] != LATENCY_THRESHOLD_HOURS:
+                # Months processed before summaries existed: compute from the GPS data
+                from data_processing import compute_month_summary
+                summary = compute_month_summary(get_gps_data(selected_month, customer_name), polygons_df,
+                                                customer_name, LATENCY_THRESHOLD_HOURS)
+            display_dashboard_statistics(summary, customer_name)
+            display_worst_devices(customer_name, selected_month)
         
-        # Based on map type, create the appropriate map
+        # Based on map type, show the map or render it in the background
         if map_type == "GPS Latency in Geofences":
             st.subheader(f"GPS Latency in Geofences - {month_name} {year}")
             
-            # Check if map already exists
-            map_filename = f"{customer_name}_global_latency_{year}_{month}.html"
-            map_filepath = MAPS_DIR / map_filename
+            # Check if map for this data version and parameters is cached
+            map_html = None if force_recreate else get_cached_map(get_map_key("global_latency", customer_name, selected_month))
             
-            if map_filepath.exists() and not force_recreate:
-                # Load existing map
-                with open(map_filepath, 'r') as f:
-                    map_html = f.read()
+            if map_html is None:
+                wait_for_artifact(['map'], customer_name, selected_month, retry=force_recreate,
+                                  map_type="global_latency")
             else:
-                # Create new map
-                st.info("Generating map, please wait...")
-                map = plot_latency(
-                    polygon_dict=polygon_dict,
-                    polygons_df=polygons_df,
-                    severe_on_top=True
-                )
-                map_html = map.get_root().render()
-                
-                # Save the map
-                with open(map_filepath, 'w') as f:
-                    f.write(map_html)
+                st.components.v1.html(map_html, height=600)
             
-            # Display the map
-            st.components.v1.html(map_html, height=600)
+            display_candidate_geofences(selected_month, customer_name)
             
         elif map_type == "GPS Heatmap (dual)":
             st.subheader(f"GPS Heatmap. Latency vs. Normal Reports - {month_name} {year}")
             
-            # Check if map already exists
-            map_filename = f"{customer_name}_dual_heatmap_{year}_{month}.html"
-            map_filepath = MAPS_DIR / map_filename
+            # Check if map for this data version and parameters is cached
+            map_html = None if force_recreate or preview else get_cached_map(
+                get_map_key("dual_heatmap", customer_name, selected_month))
             
-            if map_filepath.exists() and not force_recreate:
-                # Load existing map
-                with open(map_filepath, 'r') as f:
-                    map_html = f.read()
+            if preview:
+                show_preview_map("dual_heatmap", customer_name, selected_month, force_recreate)
+            elif map_html is None:
+                wait_for_artifact(['map'], customer_name, selected_month, retry=force_recreate,
+                                  map_type="dual_heatmap")
             else:
-                # Create new map
-                st.info("Generating map, please wait...")
-                map = plot_dual_gps_heatmap(
-                    df=gps_df[~gps_df['in_Sea']],
+                st.components.v1.html(map_html, height=600)
+            
+        elif map_type == "GPS Heatmap (tiles)":
+            st.subheader(f"GPS Heatmap (tiles). Latency vs. Normal Reports - {month_name} {year}")
+            
+            # Check if tiles already exist
+            tiles_info = None if force_recreate else load_tiles_info(customer_name, selected_month)
+            
+            if preview:
+                # Tiles are rendered from every report; the preview shows the sample's heatmap
+                st.caption("Preview: heatmap of the sample. Switch off preview mode for the tile heatmap.")
+                show_preview_map("dual_heatmap", customer_name, selected_month, force_recreate)
+            elif tiles_info is None:
+                wait_for_artifact(['tiles'], customer_name, selected_month, retry=force_recreate,
+                                  latency_H=LATENCY_THRESHOLD_HOURS)
+            else:
+                # folium is only imported by views that build a map in the app
+                from latency_maps import plot_tile_heatmap
+                get_tile_server()
+                map = plot_tile_heatmap(
+                    normal_tiles_url=tile_url(customer_name, selected_month, 'normal'),
+                    latency_tiles_url=tile_url(customer_name, selected_month, 'latency'),
                     month=f"{month_name} {year}",
-                    latency_H=24,
-                    zoom_start=2
+                    max_native_zoom=tiles_info['max_zoom'],
+                    latency_H=tiles_info['latency_H']
                 )
-                map_html = map.get_root().render()
                 
-                # Save the map
-                with open(map_filepath, 'w') as f:
-                    f.write(map_html)
-            
-            # Display the map
-            st.components.v1.html(map_html, height=600)
+                # Display the map
+                st.components.v1.html(map.get_root().render(), height=600)
             
         elif map_type == "Single Geofence View":
             st.subheader(f"Single Geofence View - {month_name} {year}")
@@ -156,33 +315,18 @@ def main():
                 index=0
             )
             
-            # Check if map already exists
-            map_filename = f"{customer_name}_geofence_{selected_geofence}_{year}_{month}.html"
-            map_filepath = MAPS_DIR / map_filename
+            # Check if map for this data version and parameters is cached
+            cache_key = get_map_key("geofence", customer_name, selected_month, geofence=selected_geofence)
+            map_html = None if force_recreate or preview else get_cached_map(cache_key)
             
-            if map_filepath.exists() and not force_recreate:
-                # Load existing map
-                with open(map_filepath, 'r') as f:
-                    map_html = f.read()
+            if preview:
+                st.caption("Preview: sampled points of this geofence; the statistics below are exact.")
+                show_preview_map("geofence", customer_name, selected_month, force_recreate, geofence=selected_geofence)
+            elif map_html is None:
+                wait_for_artifact(['map'], customer_name, selected_month, retry=force_recreate,
+                                  map_type="geofence", geofence=selected_geofence)
             else:
-                # Create new map
-                st.info("Generating map, please wait...")
-                map = plot_gps_per_polygon(
-                    polygons_df=polygons_df,
-                    geofence_name=selected_geofence,
-                    gps_df=gps_df,
-                    customer_name=customer_name,
-                    base_zoom=16,
-                    late_H=24
-                )
-                map_html = map.get_root().render()
-                
-                # Save the map
-                with open(map_filepath, 'w') as f:
-                    f.write(map_html)
-            
-            # Display the map
-            st.components.v1.html(map_html, height=600)
+                st.components.v1.html(map_html, height=600)
             
             # Display geofence stats
             geofence_data = polygons_df[polygons_df['LocationName'] == selected_geofence].iloc[0]
@@ -197,38 +341,57 @@ def main():
                 st.metric("Late Messages Ratio", f"{geofence_data['latency_messages_ratio']:.1f}%")
             with col4:
                 st.metric("Severity Score", f"{geofence_data['severity']:.1f}")
+            if 'flush_latency_messages' in geofence_data and geofence_data['latency_messages'] > 0:
+                st.caption(f"{geofence_data['flush_latency_messages']:,} of {geofence_data['latency_messages']:,} "
+                           f"late reports ({geofence_data['flush_latency_share']:.1f}%) arrived in backlog flushes "
+                           f"(buffered reports sent at once), {geofence_data['steady_latency_messages']:,} steadily.")
+            
+            previous_month = next((m for m in get_catalog_months(catalog, customer_name) if m < selected_month), None)
+            if previous_month and geofence_data['latency_devices'] > 0:
+                try:
+                    repeat_devices = devices_in_all_months(customer_name, [previous_month, selected_month],
+                                                           [selected_geofence])
+                    st.caption(f"{len(repeat_devices):,} of {geofence_data['latency_devices']:,} late devices were "
+                               f"also late here in {previous_month}.")
+                except FileNotFoundError:
+                    pass  # months processed before device sets existed
+            
+            display_geofence_visits(selected_month, customer_name, selected_geofence)
     
     except Exception as e:
         st.error(f"An error occurred: {str(e)}")
         st.exception(e)
 
 
-def display_dashboard_statistics(gps_df, polygons_df, customer_name, latency_threshold_hours):
+def display_dashboard_statistics(summary, customer_name):
     """
     Display consistent statistics across all dashboard pages
     
     Args:
-        gps_df: Processed GPS DataFrame
-        polygons_df: Geofence statistics DataFrame
+        summary: Month summary (see data_processing.compute_month_summary)
         customer_name: Name of the customer
-        latency_threshold_hours: Threshold in hours to consider high latency
     """
-    # Calculate key statistics
-    total_gps = len(gps_df)
-    unique_devices = gps_df['DeviceID'].nunique()
-    total_geofences = len(polygons_df)
+    # Key statistics, precomputed when the month was processed
+    total_gps = summary['total']['reports']
+    unique_devices = summary['total']['devices']
+    total_geofences = summary['total_geofences']
+    latency_threshold_hours = summary['latency_threshold_hours']
     
-    # Calculate land-based stats
-    land_gps = gps_df[~gps_df['in_Sea']]
-    total_land_gps = len(land_gps)
+    # Land-based stats
+    total_land_gps = summary['land']['reports']
     land_pct = (total_land_gps / total_gps) * 100 if total_gps > 0 else 0
     
-    # Calculate latency stats for land-based points only
-    latency_threshold = pd.Timedelta(hours=latency_threshold_hours)
-    land_latency = land_gps[land_gps['t_diff'] >= latency_threshold]
-    latency_count = len(land_latency)
+    # Latency stats for land-based points only
+    latency_count = summary['land']['latency_reports']
     latency_pct = (latency_count / total_land_gps) * 100 if total_land_gps > 0 else 0
     
+    # Preview summaries are estimated from the sample: 95% bounds, devices seen in the sample
+    preview = summary.get('preview')
+    devices_prefix = "≥" if preview else ""
+    latency_bound = ""
+    if preview and total_land_gps > 0:
+        latency_bound = f" ± {preview['margins']['land']['latency_reports'] / total_land_gps * 100:.1f}"
+    
     # Create stat cards with an f-string
     html = f"""
     <style>
@@ -275,7 +438,7 @@ def display_dashboard_statistics(gps_df, polygons_df, customer_name, latency_thr
         <div class="stat-card">
             <div class="stat-title">GPS Reports</div>
             <div class="stat-value">{total_gps:,}</div>
-            <div class="stat-subvalue">From {unique_devices:,} unique devices</div>
+            <div class="stat-subvalue">From {devices_prefix}{unique_devices:,} unique devices</div>
         </div>
         <div class="stat-card land-card">
             <div class="stat-title">GPS on Land</div>
@@ -288,13 +451,127 @@ def display_dashboard_statistics(gps_df, polygons_df, customer_name, latency_thr
         </div>
         <div class="stat-card latency-card">
             <div class="stat-title">High Latency (≥{latency_threshold_hours}h)</div>
-            <div class="stat-value">~{latency_pct:.1f}%</div>
+            <div class="stat-value">~{latency_pct:.1f}{latency_bound}%</div>
             <div class="stat-subvalue">{round(latency_count/1000)}K of {round(total_land_gps/1000)}K reports on land</div>
         </div>
     </div>
     """
     
     st.markdown(html, unsafe_allow_html=True)
+    if preview:
+        st.caption(f"Preview: estimated from a stratified sample of {preview['sample_reports']:,} reports, "
+                   f"± are 95% bounds. Report and late counts on land, at sea and per geofence are exact; "
+                   f"devices are those seen in the sample. Switch off preview mode for exact figures.")
+    
+    # Breakdowns from the summary
+    with st.expander("Breakdown by area and country", expanded=False):
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("**Land / sea / geofences**")
+            areas = pd.DataFrame({area: summary[area] for area in ['land', 'sea', 'in_geofences']}).T
+            st.dataframe(areas, use_container_width=True)
+            st.markdown("**Latency percentiles on land (hours)**")
+            percentiles = pd.DataFrame([summary['land_latency_percentiles_hours']])
+            if preview:
+                bounds = preview['land_latency_percentile_bounds_hours']
+                percentiles = pd.DataFrame({'estimate': summary['land_latency_percentiles_hours'],
+                                            '95% low': {p: low for p, (low, _) in bounds.items()},
+                                            '95% high': {p: high for p, (_, high) in bounds.items()}}).T
+            st.dataframe(percentiles, hide_index=not preview, use_container_width=True)
+        with col2:
+            st.markdown("**Reports in geofences by country**")
+            if summary['by_country']:
+                countries = pd.DataFrame(summary['by_country']).T.sort_values('reports', ascending=False)
+                countries['latency_ratio'] = (countries['latency_reports'] / countries['reports'] * 100).round(1)
+                st.dataframe(countries, use_container_width=True)
+            else:
+                st.caption("No reports inside geofences this month.")
+        flushes = summary.get('backlog_flushes')
+        if flushes:
+            st.caption(f"Backlog flushes: {flushes['flushes']:,} ({flushes['reports']:,} reports, "
+                       f"{flushes['latency_reports']:,} of {summary['total']['latency_reports']:,} late reports)")
+        dedup = summary.get('deduplication')
+        if dedup:
+            # Summaries saved before ingest counts were kept only count the processing step
+            where = "at ingest and processing" if dedup.get('ingest') else "at processing"
+            st.caption(f"Duplicates dropped {where}: {dedup['exact_duplicates']:,} exact, "
+                       f"{dedup['near_duplicates']:,} near ({dedup['rows_in']:,} raw reports, {dedup['rows_out']:,} unique)")
+
+def display_geofence_visits(selected_month, customer_name, geofence_name):
+    """Dwell and latency per device visit of one geofence."""
+    visits = load_geofence_visits(selected_month, customer_name, geofence_name)
+    st.subheader("Visits")
+    if visits is None:
+        st.caption("No visits for this month. Run visits.py --rebuild for months processed earlier.")
+        return
+    if visits.empty:
+        st.caption("No device visited this geofence this month.")
+        return
+    
+    summary = summarize_visits(visits, LATENCY_THRESHOLD_HOURS)
+    multi = summary['multi_report_visits']
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Visits", f"{summary['visits']:,}", help=f"by {summary['devices']:,} devices")
+    with col2:
+        st.metric("Median Dwell", f"{summary['median_dwell_hours']:.1f} h" if multi else "n/a",
+                  help="Visits with more than one report")
+    with col3:
+        st.metric("Late Arrivals", f"{summary['late_arrivals'] / multi * 100:.1f}%" if multi else "n/a",
+                  help=f"First report of the visit ≥{LATENCY_THRESHOLD_HOURS}h late")
+    with col4:
+        st.metric("Late Departures", f"{summary['late_departures'] / multi * 100:.1f}%" if multi else "n/a",
+                  help=f"Last report of the visit ≥{LATENCY_THRESHOLD_HOURS}h late")
+    
+    with st.expander(f"All visits ({summary['visits_with_late_reports']:,} with late reports)", expanded=False):
+        st.dataframe(visits.drop(columns='LocationName').sort_values('arrival').round(2), hide_index=True,
+                     use_container_width=True)
+
+def display_candidate_geofences(selected_month, customer_name):
+    """Clusters of land reports outside all geofences, ranked by devices."""
+    candidates = load_candidate_geofences(selected_month, customer_name)
+    if candidates is None:
+        return
+    with st.expander(f"Candidate geofences ({len(candidates):,} clusters of land reports outside geofences)",
+                     expanded=False):
+        if candidates.empty:
+            st.caption("No dense clusters of reports outside geofences this month.")
+            return
+        st.dataframe(candidates.drop(columns='Polygon'), hide_index=True, use_container_width=True)
+        st.download_button("Download candidates (CSV, with polygons)", candidates.to_csv(index=False),
+                           file_name=f"candidate_geofences_{customer_name}_{selected_month}.csv", mime="text/csv")
+
+def display_worst_devices(customer_name, selected_month):
+    """Ranking of the devices with the worst latency over a range of months, from the device aggregates."""
+    with st.expander("Worst-latency devices", expanded=False):
+        months = get_device_stats_months(customer_name)
+        if not months:
+            st.caption("No device aggregates yet. Run device_stats.py --rebuild for months processed earlier.")
+            return
+        
+        col1, col2, col3, col4 = st.columns([3, 2, 1, 1])
+        with col1:
+            default_end = selected_month if selected_month in months else months[-1]
+            start, end = st.select_slider("Months", options=months, value=(months[0], default_end)) \
+                if len(months) > 1 else (months[0], months[0])
+        with col2:
+            sort_by = st.selectbox("Rank by", list(SORT_COLUMNS), format_func=SORT_COLUMNS.get)
+        with col3:
+            n = st.number_input("Devices", min_value=5, max_value=500, value=20, step=5)
+        with col4:
+            min_reports = st.number_input("Min reports", min_value=1, value=100, step=50)
+        
+        ranking = top_devices(customer_name, [m for m in months if start <= m <= end], n=int(n),
+                              sort_by=sort_by, min_reports=int(min_reports))
+        if ranking.empty:
+            st.caption("No devices with enough reports in this range.")
+            return
+        
+        ranking['late_geofences'] = ranking['late_geofences'].str.join(", ")
+        columns = ['DeviceID', 'DeviceName', 'reports', 'late_reports', 'late_ratio', 'late_months', 'months',
+                   'mean_latency_hours', 'max_latency_hours', 'geofence_count', 'late_geofences']
+        st.dataframe(ranking[[c for c in columns if c in ranking.columns]].round(2), hide_index=True,
+                     use_container_width=True)
 
 if __name__ == "__main__":
     main()
@@ -1,3 +1,5 @@
+import fcntl
+from contextlib import contextmanager
 from datetime import datetime
 
 def prompt_for_month():
@@ -30,4 +32,17 @@ def get_default_month():
         else:
             return f"{now.year}-{now.month-1:02d}"
     else:
-        return f"{now.year}-{now.month:02d}"
\ No newline at end of file
+        return f"{now.year}-{now.month:02d}"
+
+@contextmanager
+def file_lock(path):
+    """
+    Exclusive lock shared by all processes (flock on the given lock file), for read-modify-write
+    of files several processes update (catalog, job records, map cache stats).
+    """
+    with open(path, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
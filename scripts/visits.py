@@ -0,0 +1,135 @@
+"""
+Geofence visits: consecutive reports of a device inside the same geofence, with arrival and
+departure times, dwell, and latency per visit.
+
+Visits are derived with one run-length pass over the month sorted by device and event time: a
+visit ends when the device reports from another geofence or outside geofences, or after a gap
+of more than VISIT_MAX_GAP_HOURS without reports. data_processing.py saves them per month as
+data/processed/geofence_visits_<customer>_<year>_<month>.parquet.
+
+TO RUN (visits of months processed before they existed):
+    python ./scripts/visits.py --rebuild
+"""
+from config import PROCESSED_DATA_DIR, DEFAULT_CUSTOMER, LATENCY_THRESHOLD_HOURS, VISIT_MAX_GAP_HOURS
+from month_data import iter_processed_months, read_processed_month
+
+import argparse
+import numpy as np
+import pandas as pd
+
+VISIT_COLUMNS = ['LocationName', 'DeviceID', 'arrival', 'departure', 'dwell_hours', 'reports', 'late_reports',
+                 'mean_latency_hours', 'max_latency_hours', 'arrival_latency_hours', 'departure_latency_hours']
+
+def get_visits_path(customer_name: str, year_month: str):
+    year, month = year_month.split('-')
+    return PROCESSED_DATA_DIR / f"geofence_visits_{customer_name}_{year}_{month}.parquet"
+
+def compute_geofence_visits(processed_gps: pd.DataFrame, customer_name: str = DEFAULT_CUSTOMER,
+                            latency_threshold: int = LATENCY_THRESHOLD_HOURS,
+                            max_gap_hours: float = VISIT_MAX_GAP_HOURS) -> pd.DataFrame:
+    """One row per geofence visit, sorted by geofence and arrival time."""
+    if processed_gps.empty:
+        return pd.DataFrame(columns=VISIT_COLUMNS)
+    col = f'in_{customer_name}_polygon'
+    device_codes, devices = pd.factorize(processed_gps['DeviceID'])
+    geofence_codes, geofences = pd.factorize(processed_gps[col])  # -1 outside geofences
+    event_ns = processed_gps['EventTimeUTC'].values.astype('datetime64[ns]').view(np.int64)
+
+    # Sort by device, then event time
+    order = np.lexsort((event_ns, device_codes))
+    device_codes, geofence_codes, event_ns = device_codes[order], geofence_codes[order], event_ns[order]
+    hours = processed_gps['t_diff'].dt.total_seconds().values[order] / 3600
+
+    # A new run starts where the device or geofence changes, or after a long gap
+    new_run = np.ones(len(order), dtype=bool)
+    new_run[1:] = ((device_codes[1:] != device_codes[:-1]) | (geofence_codes[1:] != geofence_codes[:-1])
+                   | (np.diff(event_ns) > max_gap_hours * 3600 * 10**9))
+    starts = np.flatnonzero(new_run)
+    ends = np.append(starts[1:], len(order)) - 1
+
+    # Per-run aggregates over the sorted arrays, then keep the runs inside geofences
+    known = ~np.isnan(hours)
+    reports = ends - starts + 1
+    late_reports = np.add.reduceat((hours >= latency_threshold).astype(np.int64), starts)
+    latency_count = np.add.reduceat(known.astype(np.int64), starts)
+    latency_sum = np.add.reduceat(np.where(known, hours, 0.0), starts)
+    latency_max = np.fmax.reduceat(hours, starts)
+
+    visit = geofence_codes[starts] >= 0
+    starts, ends = starts[visit], ends[visit]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_latency = latency_sum[visit] / latency_count[visit]
+
+    visits = pd.DataFrame({
+        'LocationName': np.asarray(geofences, dtype=object)[geofence_codes[starts]].astype(str),
+        'DeviceID': np.asarray(devices, dtype=object)[device_codes[starts]].astype(str),
+        'arrival': event_ns[starts].view('datetime64[ns]'),
+        'departure': event_ns[ends].view('datetime64[ns]'),
+        'dwell_hours': (event_ns[ends] - event_ns[starts]) / (3600 * 10**9),
+        'reports': reports[visit],
+        'late_reports': late_reports[visit],
+        'mean_latency_hours': mean_latency,
+        'max_latency_hours': latency_max[visit],
+        'arrival_latency_hours': hours[starts],
+        'departure_latency_hours': hours[ends],
+    })
+    return visits.sort_values(['LocationName', 'arrival'], kind='stable').reset_index(drop=True)
+
+def save_geofence_visits(visits: pd.DataFrame, customer_name: str, year_month: str):
+    filepath = get_visits_path(customer_name, year_month)
+    visits.to_parquet(filepath, index=False)
+    return filepath
+
+def load_geofence_visits(year_month: str, customer_name: str = DEFAULT_CUSTOMER, geofence_name: str = None):
+    """Visits of a month (of one geofence if given), or None if the month has no visits file."""
+    filepath = get_visits_path(customer_name, year_month)
+    if not filepath.exists():
+        return None
+    filters = [('LocationName', '==', geofence_name)] if geofence_name is not None else None
+    return pd.read_parquet(filepath, filters=filters)
+
+def summarize_visits(visits: pd.DataFrame, latency_threshold: int = LATENCY_THRESHOLD_HOURS) -> dict:
+    """Dwell and arrival/departure latency figures of a set of visits."""
+    multi = visits[visits['reports'] > 1]
+    return {
+        'visits': int(len(visits)),
+        'devices': int(visits['DeviceID'].nunique()),
+        'median_dwell_hours': float(multi['dwell_hours'].median()) if len(multi) else np.nan,
+        'visits_with_late_reports': int((visits['late_reports'] > 0).sum()),
+        # Only visits with several reports have distinct arrival and departure reports
+        'late_arrivals': int((multi['arrival_latency_hours'] >= latency_threshold).sum()),
+        'late_departures': int((multi['departure_latency_hours'] >= latency_threshold).sum()),
+        'multi_report_visits': int(len(multi)),
+    }
+
+def rebuild_geofence_visits(customer_name: str = None) -> list:
+    """Compute the visits of every processed month from its processed GPS file."""
+    saved = []
+    for customer, year_month, _ in iter_processed_months(customer_name):
+        print(f"Deriving geofence visits of {customer} {year_month}...")
+        processed_gps = read_processed_month(customer, year_month,
+                                             ['DeviceID', 'EventTimeUTC', 't_diff', f'in_{customer}_polygon'])
+        saved.append(save_geofence_visits(compute_geofence_visits(processed_gps, customer), customer, year_month))
+    return saved
+
+def main():
+    """Main function to derive the geofence visits of processed months."""
+
+    print("\n=== Geofence visits ===")
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rebuild", action="store_true", help="Derive the visits of every processed month")
+    parser.add_argument("--customer", default=None, help="Only this customer (default: all)")
+
+    args = parser.parse_args()
+
+    if not args.rebuild:
+        parser.print_help()
+        return 1
+
+    saved = rebuild_geofence_visits(args.customer)
+    print(f"Saved geofence visits of {len(saved)} months")
+    return 0
+
+if __name__ == "__main__":
+    exit(main())